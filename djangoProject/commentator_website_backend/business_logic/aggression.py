@@ -0,0 +1,80 @@
+import numpy as np
+
+NOT_ENDED = -1
+
+
+def pair_distances(xyz_a, xyz_b):
+    """Distances between the positions of every pair, (..., a, n, 3) and (..., b, n, 3) to (..., a, b, n).
+    Same order of operations as Position.distance_between."""
+    delta = xyz_a[..., :, None, :, :] - xyz_b[..., None, :, :, :]
+    return np.sqrt(delta[..., 0]**2 + delta[..., 1]**2 + delta[..., 2]**2)
+
+
+class AggressionTracker():
+    """Aggression intervals of every (teamA player, teamB player) pair, in (len(teamA), len(teamB)) arrays.
+    Pair (a, b) is teamA[a] and teamB[b]. Only the last interval of each pair is kept, the previous ones
+    have all been reported already.
+
+    It follows the rules of the per pair loop it replaced: for each of the recent positions, oldest first,
+    a pair that is close enough (with one of them close to the ball) starts an interval, unless its last one
+    is still open or ended at that same time. A pair that stops being close in the same frame ends its
+    last interval, and intervals are reported once, when they end, in the order their pairs first had one."""
+    def __init__(self, teamA, teamB):
+        self.teamA = teamA
+        self.teamB = teamB
+        shape = (len(teamA), len(teamB))
+        self.exists = np.zeros(shape, dtype=bool)
+        self.order = np.zeros(shape, dtype=np.int64)  # when the pair had its first aggression, (update, pair)
+        self.start = np.zeros(shape)
+        self.end = np.full(shape, float(NOT_ENDED))
+        self.printed = np.zeros(shape, dtype=bool)
+        self.n_updates = 0
+        self.tracks_a = [player.track for player in teamA]
+        self.tracks_b = [player.track for player in teamB]
+
+    def update(self, store, near_a, near_b, distance_margin, n_positions):
+        """Updates the intervals with the last n_positions of the players and returns the (a, b, start, end)
+        of the intervals that ended. near_a and near_b tell which players are close to the ball."""
+        near = near_a[:, None] | near_b[None, :]
+        if not near.any():
+            return []
+
+        times, xyz_a = store.recent(self.tracks_a, n_positions)
+        _, xyz_b = store.recent(self.tracks_b, n_positions)
+        return self.update_close(times, (pair_distances(xyz_a, xyz_b) < distance_margin) & near[:, :, None])
+
+    def update_close(self, times, close):
+        """update, for pairs already known to be close or not. close is (a, b, position) and times is
+        (a, position), the times of the recent positions of the teamA players."""
+        self.n_updates += 1
+        first_order = self.n_updates * close[:, :, 0].size  # pairs that are new in this update are sorted by (a, b)
+
+        waiting_end = np.zeros(close.shape[:2], dtype=bool)  # close in an earlier position of this frame
+        reported = []  # (order, a, b, start, end), with more than 2 positions an interval can end and restart
+        for i in range(close.shape[2]):
+            timestamp = times[:, i][:, None]  # of the teamA player, like the loop did
+            close_i = close[:, :, i]
+
+            new_keys = close_i & ~self.exists
+            if new_keys.any():
+                a, b = np.nonzero(new_keys)
+                self.order[a, b] = first_order + a * close.shape[1] + b
+                self.exists |= new_keys
+
+            restart = close_i & (new_keys | ((self.end != NOT_ENDED) & (self.end < timestamp)))
+            for a, b in zip(*np.nonzero(restart & ~new_keys & ~self.printed)):
+                reported.append((self.order[a, b], int(a), int(b), float(self.start[a, b]), float(self.end[a, b])))
+            self.start = np.where(restart, timestamp, self.start)
+            self.end[restart] = NOT_ENDED
+            self.printed[restart] = False
+
+            ending = ~close_i & waiting_end
+            self.end = np.where(ending, timestamp, self.end)
+            waiting_end = (waiting_end & ~ending) | close_i
+
+        ended = (self.end != NOT_ENDED) & ~self.printed
+        self.printed |= ended
+        for a, b in zip(*np.nonzero(ended)):
+            reported.append((self.order[a, b], int(a), int(b), float(self.start[a, b]), float(self.end[a, b])))
+        reported.sort(key=lambda interval: interval[0])  # stable, so a pair keeps its intervals in order
+        return [interval[1:] for interval in reported]
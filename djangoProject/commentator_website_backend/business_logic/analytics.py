@@ -61,26 +61,33 @@ def update_analytics(analysis, team_analysis, entities, update_poss=True):
 
     return ret
 
-def get_analytics(events : list, entities : list):
-    analytics_log = dict() # timestamp -> analytics dict
-
-    last_ball_owner = None
-
-    team_analysis = dict()
-    team_analysis["A"] = team_analytics() # Left
-    team_analysis["B"] = team_analytics() # Right
-
-    analysis = dict()
-    for player in entities[1:]:
-        analysis[player.id] = analytics()
-
-    #events.sort(key= lambda x: x.start)
-    for event in events:
+class MatchAnalytics():
+    """Analytics of a match, updated one event at a time. `log` is what get_analytics returns for the
+    events added so far."""
+    def __init__(self, entities : list):
+        self.entities = entities
+        self.log = dict() # timestamp -> analytics dict
+        self.last_ball_owner = None
+
+        self.team_analysis = dict()
+        self.team_analysis["A"] = team_analytics() # Left
+        self.team_analysis["B"] = team_analytics() # Right
+
+        self.analysis = dict()
+        for player in entities[1:]:
+            self.analysis[player.id] = analytics()
+
+    def add(self, event):
+        """Updates the analytics with the next event, returns the timestamp of the log entry it wrote or None."""
+        analysis = self.analysis
+        team_analysis = self.team_analysis
+        entities = self.entities
+        analytics_log = self.log
         timestamp = event.end
         if event.event in ["short_pass", "long_pass"]:
             from_player = event.fromPlayer
-            last_ball_owner = event.toPlayer
-            if from_player.isTeamRight == last_ball_owner.isTeamRight:
+            self.last_ball_owner = event.toPlayer
+            if from_player.isTeamRight == self.last_ball_owner.isTeamRight:
                 # successful pass
                 if event.event == "short_pass":
                     analysis[from_player.id].s_passes += 1
@@ -89,18 +96,19 @@ def get_analytics(events : list, entities : list):
             analysis[from_player.id].ball_time += event.end - event.start
             analytics_log[timestamp] = update_analytics(analysis, team_analysis, entities)
         elif event.event in ["dribble", "goal_shot", "kick_off", "defense", "intersect"]: # event with one player involved
-            last_ball_owner = event.player
+            self.last_ball_owner = event.player
             if event.event == "goal_shot":
-                analysis[last_ball_owner.id].shots += 1
+                analysis[self.last_ball_owner.id].shots += 1
             elif event.event == "defense":
-                analysis[last_ball_owner.id].defenses += 1
+                analysis[self.last_ball_owner.id].defenses += 1
             if event.event not in ["kick_off", "defense", "intersect"]: # instantaneous events
-                analysis[last_ball_owner.id].ball_time += event.end - event.start
+                analysis[self.last_ball_owner.id].ball_time += event.end - event.start
             if event.event not in ["kick_off", "intersect"]: # irrelevant for team statistics
                 analytics_log[timestamp] = update_analytics(analysis, team_analysis, entities)
         elif event.event in ["goal"]:
-            analysis[last_ball_owner.id].goals += 1
-            last_ball_owner = None
+            if self.last_ball_owner is not None: # unknown after a kick_off timeout, or without pass detection
+                analysis[self.last_ball_owner.id].goals += 1
+            self.last_ball_owner = None
             # tmp_dict = dict()
             # tmp_dict["players"] = analysis
             # tmp_dict["teams"] = team_analysis
@@ -112,9 +120,23 @@ def get_analytics(events : list, entities : list):
             analysis[event.p2.id].aggressions += 1
             analytics_log[timestamp] = update_analytics(analysis, team_analysis, entities)
         else: 
-            continue
+            return None
 
         analytics_log[timestamp] = update_analytics(analysis, team_analysis, entities)
-    
+        return timestamp
+
+def get_analytics(events : list, entities : list):
+    match_analytics = MatchAnalytics(entities)
+
+    #events.sort(key= lambda x: x.start)
+    for event in events:
+        match_analytics.add(event)
+
+    return match_analytics.log
+
 
-    return analytics_log
\ No newline at end of file
+def analytics_to_json(analytics_log):
+    """The analytics log with the analytics objects as dicts, the stats that generate_script reads."""
+    return {timestamp: {"teams": {team: value.to_json() for team, value in entry["teams"].items()},
+                        "players": {player: value.to_json() for player, value in entry["players"].items()}}
+            for timestamp, entry in analytics_log.items()}
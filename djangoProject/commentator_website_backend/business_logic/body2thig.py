@@ -12,6 +12,13 @@ PRECISION = 1e-3
 N_FAILS = 10
 INIT_FACT = 1/15
 
+# Solvers of get_thighs
+RANDOM_SEARCH = "random"
+NEWTON = "newton"  # damped Newton steps, deterministic and with a bounded number of iterations
+NEWTON_ITERATIONS = 20
+NEWTON_PRECISION = 1e-12  # error where the Newton solver stops, the random search stops at PRECISION
+NEWTON_DAMPING = 1e-3  # starting damping of the steps, it grows when a step doesn't reduce the error
+
 
 def set_vars(fail, fact):
     global N_FAILS
@@ -37,7 +44,13 @@ def R_y(a):
 def R_z(a):
     return np.array([cos(a), -sin(a), 0, sin(a), cos(a), 0, 0, 0, 1]).reshape(3,3)
 
-def get_thighs(euler, prev,  isRight=True):
+def get_thighs(euler, prev,  isRight=True, solver=RANDOM_SEARCH):
+    """Angles (3, 1) of the hip joints that give the orientation `euler` of the thigh, starting from the angles
+    `prev` of the previous frame. The solver is RANDOM_SEARCH or NEWTON."""
+    if solver == NEWTON:
+        return newton_thighs(euler, prev, isRight)
+    if solver != RANDOM_SEARCH:
+        raise ValueError(f"{solver} isn't a solver of get_thighs, it should be {RANDOM_SEARCH} or {NEWTON}")
 
     R_roll_j1  = R_x
     R_pitch_j2 = R_y
@@ -150,3 +163,66 @@ def get_thighs(euler, prev,  isRight=True):
                     fact=fact*0.5
                 fails=0
     return q
+
+
+def _rotation(axis, a):
+    """Rotation of `a` around the unit vector `axis`, and the cross product matrix of the axis, whose product
+    with the rotation is its derivative."""
+    K = np.array([0, -axis[2], axis[1], axis[2], 0, -axis[0], -axis[1], axis[0], 0], dtype=float).reshape(3,3)
+    return np.eye(3) + np.sin(a)*K + (1-np.cos(a))*(K@K), K
+
+
+def hip_axis(isRight=True):
+    """Axis of the first hip joint, between the x and z axes of the body."""
+    sqrt_2 = np.sqrt(2)/2
+    return (-sqrt_2, 0, sqrt_2) if isRight else (-sqrt_2, 0, -sqrt_2)
+
+
+def hip_rotation(q, isRight=True):
+    """Rotation of the thigh for the angles q of the hip joints, R_lHip of get_thighs."""
+    q = np.ravel(q)
+    return _rotation(hip_axis(isRight), q[0])[0] @ _rotation((0, 1, 0), q[1])[0] @ _rotation((1, 0, 0), q[2])[0]
+
+
+def _hip_error(q, axis, fz_goal, fy_goal):
+    """Residual (6,) of the z and y axes of the hip with angles q and its jacobian (6, 3)."""
+    A, Ka = _rotation(axis, q[0])
+    B, Kb = _rotation((0, 1, 0), q[1])
+    C, Kc = _rotation((1, 0, 0), q[2])
+    BC = B @ C
+    R_lHip = A @ BC
+    derivatives = [Ka @ R_lHip, A @ Kb @ BC, A @ B @ Kc @ C]
+    residual = np.concatenate([R_lHip[:, 2] - fz_goal, R_lHip[:, 1] - fy_goal])
+    jacobian = np.array([np.concatenate([d[:, 2], d[:, 1]]) for d in derivatives]).T
+    return residual, jacobian
+
+
+def newton_thighs(euler, prev, isRight=True):
+    """NEWTON solver of get_thighs: minimizes the same error as the random search with damped Newton steps
+    (Levenberg-Marquardt), starting from `prev`. It stops after NEWTON_ITERATIONS, so the cost of a frame is
+    bounded, and gives the same angles for the same input."""
+    rpy = np.array(euler, dtype=float).ravel()
+    R_rpy = _rotation((0, 0, 1), rpy[2])[0] @ _rotation((0, 1, 0), rpy[1])[0] @ _rotation((1, 0, 0), rpy[0])[0]
+    fz_goal = R_rpy[:, 2]
+    fy_goal = R_rpy[:, 1]
+
+    axis = hip_axis(isRight)
+    q = np.array(prev, dtype=float).ravel()
+    residual, jacobian = _hip_error(q, axis, fz_goal, fy_goal)
+    err = residual @ residual
+    damping = NEWTON_DAMPING
+    for _ in range(NEWTON_ITERATIONS):
+        if err <= NEWTON_PRECISION:
+            break
+        JtJ = jacobian.T @ jacobian
+        # Damping scaled by the diagonal, and a little more so a singular hip (j2 at 90 degrees) can still be solved
+        step = np.linalg.solve(JtJ + damping*np.diag(np.diag(JtJ) + 1e-9), -jacobian.T @ residual)
+        q2 = (q + step + np.pi) % (2*np.pi) - np.pi
+        residual2, jacobian2 = _hip_error(q2, axis, fz_goal, fy_goal)
+        err2 = residual2 @ residual2
+        if err2 < err:
+            q, residual, jacobian, err = q2, residual2, jacobian2, err2
+            damping = max(damping/10, 1e-12)
+        else:
+            damping *= 10
+    return q.reshape(3,1)
@@ -63,6 +63,40 @@ def get_thighs(euler, isRight=True):
 
 
 
-
-
-
+# Rotations of get_thighs_batch, in this order: R_rotz(yaw), f_roty(pitch), f_rotx(roll), f_roty(-pi4), with the
+# angles in the columns of [roll, pitch, yaw, -pi4]. Index of the entries that are 1, cos, sin or -sin of an angle
+# in the 4 flat matrices of a row (entry [i, j] of matrix k is 9*k + 3*i + j), and the column of their angle
+_ONES = [8, 13, 18, 31]
+_COS = [0, 4, 9, 17, 22, 26, 27, 35]
+_COS_ANGLE = [2, 2, 1, 1, 0, 0, 3, 3]
+_SIN = [3, 11, 25, 29]
+_NEG_SIN = [1, 15, 23, 33]
+_SIN_ANGLE = [2, 1, 0, 3]
+
+
+def get_thighs_batch(euler, isRight=True):
+    """get_thighs of an (N, 3) array of euler angles, returns the (N, 3) angles of the hips. `isRight` is a bool
+    or one per row. Same operations as get_thighs, on arrays, so the results are the same."""
+    rpy = np.asarray(euler, dtype=float).reshape(-1, 3)
+    isRight = np.broadcast_to(np.asarray(isRight, dtype=bool), rpy.shape[:1])
+    pi4 = np.where(isRight, -np.pi/4, np.pi/4)
+
+    angles = np.column_stack([rpy, -pi4])
+    cosa = np.cos(angles)
+    sina = np.sin(angles)
+    m = np.zeros((len(rpy), 36))
+    m[:, _ONES] = 1
+    m[:, _COS] = cosa[:, _COS_ANGLE]
+    m[:, _SIN] = sina[:, _SIN_ANGLE]
+    m[:, _NEG_SIN] = -sina[:, _SIN_ANGLE]
+    rz, ry, rx, r_pi4 = np.ascontiguousarray(m.reshape(-1, 4, 3, 3).transpose(1, 0, 2, 3))
+
+    R_rpy = rz @ ry @ rx
+    RR = r_pi4 @ R_rpy
+
+    t2 = (np.arcsin(-RR[:, 2, 0]))+pi4
+    cos_t2 = np.cos(t2-pi4)
+    t1 = np.arcsin(-RR[:, 1, 0]/cos_t2)
+    t1 = np.where(isRight, -t1, t1)
+    t3 = np.pi/2-np.arccos(RR[:, 2, 1]/cos_t2)
+    return np.stack([t1, t2, t3], axis=-1)
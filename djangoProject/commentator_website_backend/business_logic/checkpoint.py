@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import os
+import pickle
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_INTERVAL = 2500  # frames between checkpoints, ~50 seconds of game
+CHECKPOINT_HISTORY = 250  # frames kept per entity in a run with checkpoints, so the file stays small
+
+
+class OffsetLines():
+    """Lines of a binary, seekable log that remember where the next line starts, so that a run can
+    continue from the last frame it processed."""
+    def __init__(self, stream):
+        if not hasattr(stream, "seek") or (hasattr(stream, "seekable") and not stream.seekable()):
+            raise ValueError("checkpoints need a log that can seek")
+        self.stream = stream
+        self.offset = stream.tell()
+
+    def seek(self, offset):
+        self.stream.seek(offset)
+        self.offset = offset
+
+    def __iter__(self):
+        for line in self.stream:
+            if isinstance(line, str):
+                raise ValueError("checkpoints need a log opened in binary mode")
+            self.offset += len(line)
+            yield line
+
+    def fingerprint(self):
+        """Size of the log file and a hash of its header line and first frame, so that a checkpoint isn't
+        used to resume a run over another log."""
+        digest = hashlib.sha1()
+        digest.update(self.stream.readline())
+        digest.update(self.stream.readline())
+        self.stream.seek(self.offset)
+        try:
+            size = os.fstat(self.stream.fileno()).st_size
+        except (AttributeError, OSError):  # not a file, like a BytesIO
+            size = None
+        return size, digest.hexdigest()
+
+    def tag(self, frames, start=0):
+        """Sets the offset after each frame and its index, counting from `start`."""
+        for index, frame in enumerate(frames, start):
+            frame.offset = self.offset
+            frame.index = index
+            yield frame
+
+
+class Checkpoint():
+    """Everything process_log needs to go on from the frame after `frame`: the MatchProcessor with the
+    entities, open events and formation counts, the events found so far and where the frame ends in the log.
+    `fingerprint` is the one of the OffsetLines of the log."""
+    def __init__(self, match, events, sampler, frame, fingerprint):
+        self.version = CHECKPOINT_VERSION
+        self.fingerprint = fingerprint
+        self.match = match
+        self.events = events
+        self.sampler = sampler
+        self.offset = frame.offset
+        self.index = frame.index
+        self.timestamp = frame.timestamp
+        self.play_mode = frame.play_mode
+
+    def save(self, path):
+        """Writes the checkpoint next to `path` first, so a run killed while saving keeps the previous one."""
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wb", compresslevel=1) as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path):
+        """Reads a checkpoint saved by save. It's a pickle, which can run any code while it's loaded, so `path`
+        must be a file this application wrote, never one a user can supply or replace."""
+        with gzip.open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+        if checkpoint.version != CHECKPOINT_VERSION:
+            raise ValueError(f"checkpoint version {checkpoint.version}, expected {CHECKPOINT_VERSION}")
+        return checkpoint
@@ -0,0 +1,71 @@
+import time
+
+# Detectors of heuristics.process and of match_detection, in the order they run
+DETECTORS = ("detect_kick_off", "detect_corner_shot", "detect_out_goal", "detect_goal_shot", "detect_aggressions",
+             "detect_pass_or_dribble", "detect_defense", "update_formation")
+
+
+def count_events(result):
+    """Events in what a detector returned, a list of messages or a dict of them per frame."""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(len(messages) for messages in result.values())
+    return 0
+
+
+class DetectorStats():
+    __slots__ = ("name", "enabled", "calls", "events", "time")
+
+    def __init__(self, name, enabled=True):
+        self.name = name
+        self.enabled = enabled
+        self.calls = 0
+        self.events = 0
+        self.time = 0.0
+
+    def to_json(self):
+        return {"enabled": self.enabled, "calls": self.calls, "events": self.events, "time": self.time}
+
+
+class DetectorRegistry():
+    """Which detectors run, and the wall time, calls and events of each one in a run.
+    A disabled detector is not called and returns `default`, no messages if it's not given."""
+    def __init__(self, disabled=()):
+        unknown = set(disabled) - set(DETECTORS)
+        if unknown:
+            raise ValueError(f"unknown detectors {sorted(unknown)}, expected some of {DETECTORS}")
+        self.stats = {name: DetectorStats(name, name not in disabled) for name in DETECTORS}
+
+    def enable(self, name):
+        self.stats[name].enabled = True
+
+    def disable(self, name):
+        self.stats[name].enabled = False
+
+    def is_enabled(self, name):
+        return self.stats[name].enabled
+
+    def run(self, name, detector, *args, default=None):
+        stats = self.stats[name]
+        if not stats.enabled:
+            return [] if default is None else default
+        tic = time.perf_counter()
+        result = detector(*args)
+        stats.time += time.perf_counter() - tic
+        stats.calls += 1
+        stats.events += count_events(result)
+        return result
+
+    def to_json(self):
+        return {name: stats.to_json() for name, stats in self.stats.items()}
+
+    def report(self):
+        """Table of the detectors, the slowest first."""
+        lines = [f"{'detector':<24}{'calls':>8}{'events':>8}{'time (s)':>10}"]
+        for stats in sorted(self.stats.values(), key=lambda stats: -stats.time):
+            if stats.enabled:
+                lines.append(f"{stats.name:<24}{stats.calls:>8}{stats.events:>8}{stats.time:>10.3f}")
+            else:
+                lines.append(f"{stats.name:<24}{'disabled':>26}")
+        return "\n".join(lines)
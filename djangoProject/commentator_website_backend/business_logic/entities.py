@@ -1,40 +1,37 @@
 import math
 import numpy as np
-from .body2thigh_analytic import get_thighs
-import time
 from scipy.spatial.transform import Rotation as R
+from .trajectory import Position, TrajectoryStore, matrix_to_position
+from .joint_angles import JointAngles
 
 POSITIONS_SIZE = 2 # TODO random choice ()
 
 
-def get_quaternion(arr):
-    r90 = np.array([[0, -1, 0, 0], [1, 0, 0, 0], [0, 0, 1, 0], [0, 0 ,0 ,1]])
-    #print(arr.pos)
-    r = np.array(arr).reshape(4,4).T
-    #print(r)
-    u0 = r[0,0:3]
-    u1 = r[1,0:3]
-    u2 = r[2,0:3]
+R90 = np.array([[0, -1, 0, 0], [1, 0, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
 
-    u1 = u1/np.linalg.norm(u1)
-    u2 = u2/np.linalg.norm(u2)
-    #print(u1, u2)
-    u01 = np.cross(u1,u2)
-    #print("u01", u01)
 
-    r[0,0:3] = u01
-    r[1,0:3] = u1
-    r[2,0:3] = u2
+def get_quaternion(arr):
+    return get_quaternions([arr])[0]
+
+def get_quaternions(matrices):
+    """Quaternions of the replay for a list of node matrices, in a single Rotation.from_matrix call."""
+    r = np.array(matrices, dtype=float).reshape(-1, 4, 4).transpose(0, 2, 1)
+    u1 = r[:, 1, 0:3]
+    u2 = r[:, 2, 0:3]
 
-    #print("V", v)
+    u1 = u1/np.linalg.norm(u1, axis=1)[:, None]
+    u2 = u2/np.linalg.norm(u2, axis=1)[:, None]
+    u01 = np.cross(u1, u2)
 
-    V1 = r90@r
+    r[:, 0, 0:3] = u01
+    r[:, 1, 0:3] = u1
+    r[:, 2, 0:3] = u2
 
-    V1[:3, 3] = 0
-    q = R.from_matrix(V1[:3, :3]).as_quat()
+    V1 = R90@r
+    q = R.from_matrix(V1[:, :3, :3]).as_quat()
 
     #return [-q[0], -q[2], q[1], -q[3]]
-    return [-q[3], -q[1], q[0], -q[2]]
+    return np.stack([-q[:, 3], -q[:, 1], q[:, 0], -q[:, 2]], axis=1)
 
 def get_euler_angles(pos, pos_r):
 
@@ -62,40 +59,30 @@ def get_euler_angles(pos, pos_r):
 
     return e
 
-class Position():
-    def __init__(self, position, timestamp):
-        self.x = position[-4]
-        self.y = position[-3]
-        self.z = position[-2]
-        
-        self.timestamp = timestamp
-        self.position = position
-
-    def distance_between(self, position):
-        """Returns the euclidian distance to given position."""
-        return math.sqrt((self.x - position.x)**2 + (self.y - position.y)**2 + (self.z - position.z)**2)
-    
-    def __str__(self):
-        return f"{self.timestamp = }, {self.x = }, {self.y = }, {self.z = }"
-
 class Entity():
-    def __init__(self, id, index, offset):
+    def __init__(self, id, index, offset, store=None):
         self.id = id
-        self.number_of_positions = 300
         self.index = index
         self.offset = offset
-        self.positions = []
+        self.store = store if store is not None else TrajectoryStore()
+        self.number_of_positions = self.store.history  # None keeps every position
+        self.track = self.store.add_track()
+        self.positions = self.store.view(self.track)
         self.cur_pos = []
-        self.quartenion = []
+        self.quartenion = None  # of cur_pos, only computed for a replay
 
     def add_position(self, position):
-        # if len(self.positions) >= self.number_of_positions:
-        #     self.positions = self.positions[1:]
-        #print(self.id)
-        
-        self.positions.append(position)
-        self.cur_pos = position.position
-        self.quartenion = get_quaternion(self.cur_pos)
+        self.store.append(self.track, position)
+
+    def tracks(self):
+        """Trajectory store tracks that belong to the entity."""
+        return [self.track]
+
+    def update(self, matrix, timestamp):
+        """Sets the current node matrix of the entity and stores its position."""
+        self.cur_pos = matrix
+        self.quartenion = None
+        self.add_position(matrix_to_position(matrix, timestamp))
 
     def get_current_velocity(self):
         if len(self.positions) < 2:
@@ -107,8 +94,7 @@ class Entity():
         return distance/time_delta
 
     def get_velocity_at(self, timestamp):
-        timestamps = [position.timestamp for position in self.positions]
-        index = timestamps.index(timestamp)
+        index = int(np.flatnonzero(self.positions.times == timestamp)[0])
 
         now = self.positions[index]
         then = self.positions[index-1]
@@ -123,6 +109,8 @@ class Entity():
         return {"id": self.id, "position": self.position}
     
     def to_replay(self):
+        if self.quartenion is None:
+            self.quartenion = get_quaternion(self.cur_pos)
         x = self.cur_pos[-4]
         y = self.cur_pos[-3]
         z = self.cur_pos[-2]
@@ -130,8 +118,8 @@ class Entity():
         return f"{x} {y} {z} {np.round(self.quartenion[0],3)} {np.round(self.quartenion[1],3)} {np.round(self.quartenion[2],3)} {np.round(self.quartenion[3],3)}"
 
 class Ball(Entity):
-    def __init__(self, id, index, offset):
-        super().__init__(id, index, offset)
+    def __init__(self, id, index, offset, store=None):
+        super().__init__(id, index, offset, store)
         self.owner = None
 
     def get_distance_from(self, player):
@@ -171,8 +159,8 @@ class Ball(Entity):
         return "b " + super().to_replay() + "\n"
 
 class Player(Entity):
-    def __init__(self, id, index, offset, team : bool):
-        super().__init__(id, index, offset)
+    def __init__(self, id, index, offset, team : bool, store=None):
+        super().__init__(id, index, offset, store)
         self.isTeamRight = team
 
         self.has_extra_foot = False
@@ -200,87 +188,17 @@ class Player(Entity):
         self.lshank_pos = []
         self.rfoot_pos = []
         self.lfoot_pos = []
-        self.positions_rfoot = []
-        self.positions_lfoot = []
+        self.rfoot_track = self.store.add_track()
+        self.lfoot_track = self.store.add_track()
+        self.positions_rfoot = self.store.view(self.rfoot_track)
+        self.positions_lfoot = self.store.view(self.lfoot_track)
         self.joints = [0]*22
 
-        self.joint_time = 0
-        self.count = 0
-        self.rthigh_time = 0
-        self.rthigh_count = 0
-        self.lthigh_time = 0
-        self.lthigh_count = 0
-
-
-
-    
     def add_joint(self, name):
-        tic = time.time()
-        if name == "head":
-            e = get_euler_angles(self.head_pos, self.cur_pos)
-            self.joints[0] = np.around(e[2]*180/np.pi,2)
-            self.joints[1] = np.around(e[0]*180/np.pi,2)
-        elif name == "rupperarm":
-            e = get_euler_angles(self.rupperarm_pos, self.cur_pos)
-            self.joints[2] = np.around(e[0]*180/np.pi,2)
-            self.joints[3] = np.around(e[1]*180/np.pi,2)
-        elif name == "rlowerarm":
-            e = get_euler_angles(self.rlowerarm_pos, self.rupperarm_pos)
-            self.joints[4] = np.around(-e[1]*180/np.pi,2)
-            self.joints[5] = np.around(-e[2]*180/np.pi,2)
-        elif name == "lupperarm":
-            e = get_euler_angles(self.lupperarm_pos, self.cur_pos)
-            self.joints[6] = np.around(e[0]*180/np.pi,2)
-            self.joints[7] = np.around(e[1]*180/np.pi,2)
-        elif name == "llowerarm":
-            e = get_euler_angles(self.rlowerarm_pos, self.rupperarm_pos)
-            self.joints[8] = np.around(-e[1]*180/np.pi,2)
-            self.joints[9] = np.around(-e[2]*180/np.pi,2)
-        elif name == "rthigh":
-            rtic = time.time()
-            e = get_euler_angles(self.rthigh_pos, self.cur_pos)
-            new_e = get_thighs(e, True)
-            self.prev_rthigh_euler = new_e
-            self.joints[10] = np.around(new_e[0]*180/np.pi,2)
-            self.joints[11] = np.around(new_e[1]*180/np.pi,2)
-            self.joints[12] = np.around(new_e[2]*180/np.pi,2)
-            rtoc = time.time()
-            self.rthigh_time += rtoc - rtic
-            self.rthigh_count += 1
-        elif name == "rshank":
-            #e = get_euler_angles(self.rshank_pos, self.cur_pos)
-            #self.joints[11] = np.around(e[1]*180/np.pi,2)
-            e = get_euler_angles(self.rshank_pos, self.rthigh_pos)
-            self.joints[13] = np.around(e[0]*180/np.pi,2)
-        elif name == "rfoot":
-            e = get_euler_angles(self.rfoot_pos, self.rshank_pos)
-            self.joints[14] = np.around(e[0]*180/np.pi,2)
-            e = get_euler_angles(self.rfoot_pos, self.rthigh_pos)
-            self.joints[15] = np.around(e[1]*180/np.pi,2)
-        elif name == "lthigh":
-            ltic = time.time()
-            e = get_euler_angles(self.lthigh_pos, self.cur_pos)
-            new_e = get_thighs(e, False)
-            self.prev_lthigh_euler = new_e
-            self.joints[16] = np.around(new_e[0]*180/np.pi,2)
-            self.joints[17] = np.around(new_e[1]*180/np.pi,2)
-            self.joints[18] = np.around(new_e[2]*180/np.pi,2)
-            ltoc = time.time()
-            self.lthigh_time += ltoc - ltic
-            self.lthigh_count += 1
-        elif name == "lshank":
-            #e = get_euler_angles(self.lshank_pos, self.cur_pos)
-            #self.joints[17] = np.around(e[1]*180/np.pi,2)
-            e = get_euler_angles(self.lshank_pos, self.lthigh_pos)
-            self.joints[19] = np.around(e[0]*180/np.pi,2)
-        elif name == "lfoot":
-            e = get_euler_angles(self.lfoot_pos, self.lshank_pos)
-            self.joints[20] = np.around(e[0]*180/np.pi,2)
-            e = get_euler_angles(self.lfoot_pos, self.lthigh_pos)
-            self.joints[21] = np.around(e[1]*180/np.pi,2)
-        toc = time.time()
-        self.joint_time += toc - tic
-        self.count += 1
+        """Computes the angles of a single joint, MatchProcessor batches them with JointAngles instead."""
+        angles = JointAngles()
+        angles.request(self, name)
+        angles.flush()
 
     def init_thigh(self, pos, isRight):
         if isRight:
@@ -288,11 +206,14 @@ class Player(Entity):
         else:
             self.prev_lthigh_euler = get_euler_angles(pos, self.cur_pos)
 
+    def tracks(self):
+        return [self.track, self.rfoot_track, self.lfoot_track]
+
     def add_position_rfoot(self, position):
-        self.positions_rfoot.append(position)
+        self.store.append(self.rfoot_track, position)
 
     def add_position_lfoot(self, position):
-        self.positions_lfoot.append(position)  
+        self.store.append(self.lfoot_track, position)
 
     def to_json(self):
         return {"id": self.id, "team":self.isTeamRight}
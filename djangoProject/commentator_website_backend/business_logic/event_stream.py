@@ -0,0 +1,75 @@
+from itertools import chain
+
+from .analytics import MatchAnalytics, analytics_to_json
+from .detectors import DetectorRegistry
+from .frame_sampler import AdaptiveSampler
+from .log_io import open_log_stream
+from .log_processing import batch_frames, decode_batches, PARSE_WORKERS
+from .log_tokenizer import tokenize_log
+from .match_processor import MatchProcessor
+
+# Kinds of MatchUpdate
+EVENT = "event"
+FORMATION = "formation"
+STATS = "stats"
+
+STREAM_HISTORY = 250  # frames kept per entity, enough for the detectors
+
+
+class MatchUpdate():
+    """One item of stream_events. `value` is the Message of an EVENT, the (formation, formation of each player)
+    of a FORMATION, or for STATS the stats entry (like the ones generate_script reads) written at `timestamp`."""
+    __slots__ = ("kind", "timestamp", "value")
+
+    def __init__(self, kind, timestamp, value):
+        self.kind = kind
+        self.timestamp = timestamp
+        self.value = value
+
+    def __repr__(self):
+        return f"MatchUpdate({self.kind}, {self.timestamp}, {self.value})"
+
+
+def stream_events(log, stats=True, formation=True, history=STREAM_HISTORY, workers=PARSE_WORKERS, detectors=None,
+                  adaptive=False):
+    """Yields MatchUpdates as the log is read, instead of returning everything at the end like process_log.
+    `log` is a path, a file or an iterable of lines. Nothing is printed and no replay is written.
+    Only the last `history` frames, the open events and the last stats are kept, so memory doesn't grow with
+    the match, and closing the generator stops the processing. Without `stats` or `formation` the analytics or
+    update_formation are not computed at all."""
+    if isinstance(log, str):
+        with open(log, "rb") as f:
+            yield from stream_events(f, stats, formation, history, workers, detectors, adaptive)
+        return
+
+    if detectors is None:
+        detectors = DetectorRegistry(disabled=() if formation else ("update_formation",))
+    frames = tokenize_log(open_log_stream(log))
+    header = next(frames, None)
+    assert header is not None, "Log has no full frame"
+    match = MatchProcessor.from_frame(header, next(frames), history=history, detectors=detectors)
+    analytics = MatchAnalytics(match.entities) if stats else None
+    sampler = AdaptiveSampler(header.play_modes) if adaptive else None
+
+    last_formation = None
+    decoded = ((frame, changed, matrices)
+               for frame_batch, batch_changes, batch_matrices in decode_batches(batch_frames(frames), match.node_indices, workers)
+               for frame, changed, matrices in zip(frame_batch, batch_changes, batch_matrices))
+    for item in chain([None], decoded):  # None is the first frame, already in match
+        if item is not None:
+            frame, changed, matrices = item
+            match.update(frame.timestamp, changed, matrices)
+            if sampler is not None and not sampler.sample(frame.play_mode, match.ball, match.players):
+                continue
+
+        for message in match.detect():
+            yield MatchUpdate(EVENT, match.timestamp, message)
+            timestamp = analytics.add(message) if analytics else None
+            if timestamp is not None:
+                # The caller keeps the entry if it needs it, the analytics log doesn't grow
+                entry = analytics.log.pop(timestamp)
+                yield MatchUpdate(STATS, timestamp, analytics_to_json({timestamp: entry})[timestamp])
+
+        if formation and match.form and (match.form, match.form_players) != last_formation:
+            last_formation = (match.form, match.form_players)
+            yield MatchUpdate(FORMATION, match.timestamp, last_formation)
@@ -0,0 +1,159 @@
+import re
+import numpy as np
+
+MATRIX_SIZE = 16  # (SLT ...) nodes hold a column-major 4x4 matrix, translation in [12:15]
+FLOAT_PATTERN = re.compile(rb"[-]?\d+[.]?\d*[eE]?[-]?\d*")
+# Everything that can't be part of a number is dropped before the bulk conversion
+NON_NUMERIC = bytes(c for c in range(256) if c not in b"0123456789.-+eE \t\r\n")
+MATRIX_START = b"(SLT "
+
+
+def decode_matrix(node):
+    """Decodes a single (nd ...) chunk into a 16 float array. Used when the bulk decoding fails."""
+    values = [float(numb) for numb in FLOAT_PATTERN.findall(node)]
+    assert len(values) >= MATRIX_SIZE, f"Node has no transformation matrix: {node[:80]}"
+    return np.array(values[:MATRIX_SIZE])
+
+
+def load_matrices(chunks, comments="#"):
+    """np.loadtxt of chunks that are the 16 numbers of a matrix, each one a line. Its C parser converts the
+    numbers like float() does. Returns None if some chunk isn't 16 numbers."""
+    try:
+        values = np.loadtxt(chunks, dtype=np.float64, ndmin=2, encoding="latin1", comments=comments)
+    except ValueError:
+        return None
+    return values if values.shape == (len(chunks), MATRIX_SIZE) else None
+
+
+def decode_matrices(chunks, numeric=False):
+    """Decodes a list of changed (nd ...) chunks into a (len(chunks), 16) float array in bulk.
+    Everything that can't be part of a number is dropped first, unless the chunks are `numeric` already.
+    If the bulk conversion fails, only the chunks that don't split in 16 numbers are decoded with the regex."""
+    if not chunks:
+        return np.empty((0, MATRIX_SIZE))
+    numbers = chunks if numeric else [chunk.translate(None, NON_NUMERIC) for chunk in chunks]
+    values = load_matrices(numbers)
+    if values is not None:
+        return values
+
+    regular = np.array([len(chunk.split()) == MATRIX_SIZE for chunk in numbers])
+    values = np.empty((len(chunks), MATRIX_SIZE))
+    if regular.any():
+        bulk = load_matrices([chunk for chunk, is_regular in zip(numbers, regular) if is_regular])
+        if bulk is None:
+            return np.array([decode_matrix(chunk) for chunk in chunks])
+        values[regular] = bulk
+    for row in np.flatnonzero(~regular):
+        values[row] = decode_matrix(chunks[row])
+    return values
+
+
+def decode_nodes(nodes, indices):
+    """Decodes the nodes of a frame at the given indices.
+    Returns a (len(indices),) mask of the nodes that changed and a (len(indices), 16) array
+    with their matrices. Rows of unchanged nodes are NaN."""
+    changed = np.array([bool(nodes[i]) for i in indices], dtype=bool)
+    matrices = np.full((len(indices), MATRIX_SIZE), np.nan)
+    matrices[changed] = decode_matrices([nodes[i] for i in indices if nodes[i]])
+    return changed, matrices
+
+
+def decode_frames(frames, indices):
+    """Same as decode_nodes, but for a batch of frames at once.
+    Returns (len(frames), len(indices)) masks and (len(frames), len(indices), 16) matrices."""
+    if all(frame.line is not None for frame in frames):
+        return decode_lines([frame.line for frame in frames], indices)
+    return decode_rows([[frame.nodes[i] for i in indices] for frame in frames])
+
+
+def pack_equal(chars, char, out):
+    """Mask of the chars equal to `char`, packed in 64 bit words. Bit i of word k is about chars[64 * k + i],
+    so len(chars) must be a multiple of 64. The unpacked mask is written to `out`, which can be reused."""
+    return np.packbits(np.equal(chars, char, out=out), bitorder="little").view(np.uint64)
+
+
+def set_bits(words):
+    """Positions of the set bits of a sparse pack_equal mask. The lowest bit of every word is taken until
+    none is left, which takes as many steps as the fullest word has bits."""
+    word = np.flatnonzero(words)
+    bits = words[word]
+    positions = []
+    while len(word):
+        lowest = bits & (~bits + np.uint64(1))
+        positions.append(word * 64 + np.bitwise_count(lowest - np.uint64(1)))
+        bits ^= lowest
+        left = bits != 0
+        word, bits = word[left], bits[left]
+    return np.sort(np.concatenate(positions)) if positions else np.empty(0, dtype=np.intp)
+
+
+def count_before(words, positions):
+    """Number of set bits of a pack_equal mask before each position: the bits of the words before its word,
+    and the bits below it in its word."""
+    counts = np.bitwise_count(words)
+    word_starts = np.cumsum(counts, dtype=np.int32)  # at most 64 per word, fits unless a batch is 2 GB
+    word_starts -= counts
+    word = positions // 64
+    below = words[word] & ((np.uint64(1) << (positions % 64).astype(np.uint64)) - np.uint64(1))
+    return word_starts[word] + np.bitwise_count(below)
+
+
+def decode_lines(lines, indices):
+    """decode_frames for the lines of the frames. Instead of splitting each line in its nodes, the "(nd"
+    and "(SLT" of the whole batch are found with array operations, and only the matrices of the nodes
+    at `indices` are read. A node is changed if it has a matrix."""
+    n = len(indices)
+    changed = np.zeros((len(lines), n), dtype=bool)
+    matrices = np.full((len(lines), n, MATRIX_SIZE), np.nan)
+    if not lines or not n:
+        return changed, matrices
+
+    lengths = [len(line) for line in lines]
+    size = sum(lengths)
+    # Room to compare the characters after the last one, and masks of whole 64 bit words
+    log = b"".join(lines + [b" " * (4 + -size % 64)])
+    chars = np.frombuffer(log, dtype=np.uint8)
+    # The masks are compared on shifted views, so bit i of each one is about the "(" at i
+    mask = np.empty(len(chars) - 4, dtype=bool)
+    opens = pack_equal(chars[:-4], ord("("), mask)
+    node_starts = opens & pack_equal(chars[1:-3], ord("n"), mask) & pack_equal(chars[2:-2], ord("d"), mask)
+    # "(S" is rare, the rest of "(SLT " is only compared where it is
+    matrix_starts = set_bits(opens & pack_equal(chars[1:-3], ord("S"), mask))
+    is_matrix = ((chars[matrix_starts + 2] == ord("L")) & (chars[matrix_starts + 3] == ord("T"))
+                 & (chars[matrix_starts + 4] == ord(" ")))
+    matrix_starts = matrix_starts[is_matrix]
+
+    # "(nd" before each line start and matrix, the nodes themselves are never listed
+    line_starts = np.cumsum([0] + lengths[:-1])
+    before = count_before(node_starts, np.concatenate((line_starts, matrix_starts)))
+    rows = np.searchsorted(line_starts, matrix_starts, side="right") - 1
+    # Like in the split line, node i is the one after the i-th "(nd" of the line
+    nodes = before[len(lines):] - before[rows]
+    # The numbers of a matrix run up to its ")". What follows until the next matrix or line is a comment for
+    # loadtxt, so the ")" are never looked for
+    line_ends = np.append(line_starts[1:], size)
+    ends = np.minimum(np.append(matrix_starts[1:], size), line_ends[rows])
+
+    columns = np.full(max(indices) + 2, -1)
+    columns[list(indices)] = np.arange(n)
+    columns = columns[np.minimum(nodes, len(columns) - 1)]
+    tracked = columns >= 0
+    rows, columns = rows[tracked], columns[tracked]
+
+    changed[rows, columns] = True
+    windows = [log[start:end] for start, end in zip((matrix_starts[tracked] + len(MATRIX_START)).tolist(),
+                                                    ends[tracked].tolist())]
+    values = load_matrices(windows, comments=")")
+    if values is None:
+        values = decode_matrices([window.partition(b")")[0] for window in windows], numeric=True)
+    matrices[rows, columns] = values
+    return changed, matrices
+
+
+def decode_rows(rows):
+    """decode_frames for frames that were already reduced to the nodes at the wanted indices."""
+    n = len(rows[0]) if rows else 0
+    changed = np.array([[bool(node) for node in row] for row in rows], dtype=bool).reshape(len(rows), n)
+    matrices = np.full((len(rows), n, MATRIX_SIZE), np.nan)
+    matrices[changed] = decode_matrices([node for row in rows for node in row if node])
+    return changed, matrices
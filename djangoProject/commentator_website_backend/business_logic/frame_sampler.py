@@ -0,0 +1,55 @@
+import math
+
+# Play modes where the game is stopped, whatever the ball and the players do
+DEAD_PLAY_MODES = ("BeforeKickOff", "Goal_Left", "Goal_Right", "GameOver")
+IDLE_FRAME_INTERVAL = 10  # frames between detector runs while nothing happens
+ACTIVE_DISTANCE = 1.2  # a foot closer than this to the ball is someone who can play it
+
+
+class AdaptiveSampler():
+    """Decides in which frames the detectors run. Every frame runs them while the ball is moving or a player
+    is close to it, one in IDLE_FRAME_INTERVAL frames while the play mode is dead or the ball is stopped away
+    from everyone. The first frame after a change of play mode and the first idle frame after an active one
+    always run, so the events that start or end there keep their timestamps.
+    Frames are still read and stored, only the detectors are skipped."""
+    def __init__(self, play_modes, interval=IDLE_FRAME_INTERVAL, active_distance=ACTIVE_DISTANCE):
+        self.dead = [mode in DEAD_PLAY_MODES for mode in play_modes]
+        self.interval = interval
+        self.active_distance = active_distance
+        self.tracks = None  # ball, then the feet of every player
+        self.play_mode = None
+        self.active = True
+        self.idle_frames = 0
+        self.frames = 0
+        self.sampled = 0
+
+    def is_active(self, play_mode, ball, players):
+        if self.dead[play_mode]:
+            return False
+        store = ball.store
+        if self.tracks is None:
+            self.tracks = [ball.track] + [track for player in players for track in (player.rfoot_track, player.lfoot_track)]
+        # Same velocity and rounding as detect_pass_or_dribble, a ball it sees as moving is never skipped
+        if store.size(ball.track) >= 2:
+            times, xyz = store.recent([ball.track], 2)
+            (t0, t1), ((x0, y0, z0), (x1, y1, z1)) = times[0].tolist(), xyz[0].tolist()
+            velocity = math.sqrt((x1 - x0)**2 + (y1 - y0)**2 + (z1 - z0)**2) / (t1 - t0)
+            if math.floor(velocity * 100) / 100.0 != 0:
+                return True
+        xyz = store.latest_xyz(self.tracks)
+        delta = xyz[1:] - xyz[0]
+        return bool(((delta**2).sum(axis=1) < self.active_distance**2).any())
+
+    def sample(self, play_mode, ball, players):
+        """True if the detectors have to run in the current frame."""
+        active = self.is_active(play_mode, ball, players)
+        run = active or self.active or play_mode != self.play_mode or self.idle_frames + 1 >= self.interval
+        self.play_mode = play_mode
+        self.active = active
+        self.idle_frames = 0 if run else self.idle_frames + 1
+        self.frames += 1
+        self.sampled += run
+        return run
+
+    def report(self):
+        return f"Detectors ran in {self.sampled} of {self.frames} frames"
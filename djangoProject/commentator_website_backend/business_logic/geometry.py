@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def distances_to(point, positions):
+    """Euclidian distance from point to each row of a (n, 3) array, in the same order of operations
+    as Position.distance_between so both give the same floats."""
+    delta = point - positions
+    return np.sqrt(delta[:, 0]**2 + delta[:, 1]**2 + delta[:, 2]**2)
+
+
+class FrameGeometry():
+    """Ball to player distances of the current frame. Built once per call of heuristics.process from the
+    last positions of the trajectory store, so the detectors don't compute them again for every query."""
+    def __init__(self, ball, teamA, teamB):
+        self.ball = ball
+        self.teamA = teamA
+        self.teamB = teamB
+        self.players = teamA + teamB
+        self.columns = {player: i for i, player in enumerate(self.players)}
+
+        # Ball, then every body, right foot and left foot, in a single read of the store
+        tracks = [ball.track] + [track for player in self.players for track in player.tracks()]
+        xyz = ball.store.latest_xyz(tracks)
+        ball_xyz = xyz[0]
+        bodies = xyz[1::3]
+        rfeet = xyz[2::3]
+        lfeet = xyz[3::3]
+
+        self.body_distances = distances_to(ball_xyz, bodies)  # what Ball.get_closest_player compares
+        self.foot_distances = np.minimum(distances_to(ball_xyz, rfeet), distances_to(ball_xyz, lfeet))  # Ball.get_distance_from
+
+    def ball_position(self):
+        return self.ball.positions[-1]
+
+    def ball_velocity(self):
+        return self.ball.get_current_velocity()
+
+    def is_in_goal_direction(self, teamRight, field, goal):
+        return self.ball.is_in_goal_direction(teamRight, field, goal)
+
+    def _columns(self, players):
+        if players is self.players:
+            return slice(None)
+        if players is self.teamA:
+            return slice(0, len(self.teamA))
+        if players is self.teamB:
+            return slice(len(self.teamA), None)
+        return [self.columns[player] for player in players]
+
+    def distance_from(self, player):
+        """Distance from the ball to the closest foot of the player."""
+        return float(self.foot_distances[self.columns[player]])
+
+    def closest_player(self, players=None):
+        """Player whose body is the closest to the ball, the first one if there's a tie."""
+        players = self.players if players is None else players
+        return players[int(np.argmin(self.body_distances[self._columns(players)]))]
+
+    def closest_per_team(self):
+        """Closest player of teamA and of teamB."""
+        return self.closest_player(self.teamA), self.closest_player(self.teamB)
+
+    def in_contact(self, distance, players=None):
+        """Players, in the given order, with a foot closer than `distance` to the ball."""
+        players = self.players if players is None else players
+        columns = np.flatnonzero(self.foot_distances[self._columns(players)] < distance)
+        return [players[i] for i in columns]
+
+    def near(self, distance, players=None):
+        """Mask of the players with a foot closer than `distance` to the ball."""
+        players = self.players if players is None else players
+        return self.foot_distances[self._columns(players)] < distance
+
+    def any_contact(self, distance, players=None):
+        players = self.players if players is None else players
+        return bool((self.foot_distances[self._columns(players)] < distance).any())
@@ -1,24 +1,82 @@
+import os
+import tempfile
+
 import numpy as np
 
-angle_cache = {}
 PRECISION = 4
+TABLE_OFFSET = 31416  # row of the angle 0, the table goes from -3.1416 to 3.1416 in steps of 10**-PRECISION
+TABLE_SIZE = 2*TABLE_OFFSET + 1
 
+# cos and sin (TABLE_SIZE, 2) of the angles of the table, built on first use
+angle_table = None
 
-def cos(a):
+
+def build_table():
+    angles = np.arange(-TABLE_OFFSET, TABLE_OFFSET + 1) / 10**PRECISION
+    return np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+
+def get_table():
+    global angle_table
+    if angle_table is None:
+        angle_table = build_table()
+    return angle_table
+
+
+def load_table(path):
+    """Uses the table saved in `path`, memory mapped so that the processes that load it share it. The table is
+    saved there first if the file doesn't exist."""
+    global angle_table
+    if not os.path.exists(path):
+        # A file of this process only, processes saving the table at the same time don't mix their writes
+        tmp = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), suffix=".npy", delete=False)
+        try:
+            with tmp:
+                np.save(tmp, build_table())
+            os.replace(tmp.name, path)
+        except BaseException:
+            os.remove(tmp.name)
+            raise
+    angle_table = np.load(path, mmap_mode="r")
+    return angle_table
+
+
+def createCache():
+    """Builds the table now instead of on the first cos or sin."""
+    get_table()
+
+
+def _row(a):
     if isinstance(a, np.ndarray):
         a = a[0]
-    a = (a+np.pi) % (2*np.pi) - np.pi    
-    #print(round(a, PRECISION), type(a))
-    return angle_cache.get(round(a, PRECISION)).get("cos") 
+    a = (a+np.pi) % (2*np.pi) - np.pi
+    x = a * 10**PRECISION
+    row = round(x)
+    if abs(abs(x - row) - 0.5) < 1e-6:
+        # Close to halfway between two rows, rounded like round(a, PRECISION)
+        row = round(round(a, PRECISION) * 10**PRECISION)
+    return int(row) + TABLE_OFFSET
+
+
+def cos(a):
+    table = angle_table if angle_table is not None else get_table()
+    return table[_row(a), 0]
 
 def sin(a):
-    if isinstance(a, np.ndarray):
-        a = a[0]
-    a = (a+np.pi) % (2*np.pi) - np.pi  
-    #print(round(a, PRECISION), type(a))
-    return angle_cache.get(round(a, PRECISION)).get("sin") 
+    table = angle_table if angle_table is not None else get_table()
+    return table[_row(a), 1]
 
-def createCache():
-    global angle_cache
-    angle_cache = {a / (10**PRECISION): \
-                  {"cos": np.cos(a / (10**PRECISION)), "sin": np.sin(a / (10**PRECISION))} for a in range(-31416, 31417, 1)}
\ No newline at end of file
+
+def lookup(a, interpolate=False):
+    """cos and sin of an array of angles, with the angles rounded to the table, or with linear interpolation
+    between its rows. Returns two arrays with the shape of `a`."""
+    table = get_table()
+    a = (np.asarray(a, dtype=float)+np.pi) % (2*np.pi) - np.pi
+    position = a * 10**PRECISION + TABLE_OFFSET
+    if not interpolate:
+        rows = table[np.rint(position).astype(np.intp)]
+        return rows[..., 0], rows[..., 1]
+    rows = np.minimum(np.floor(position).astype(np.intp), TABLE_SIZE - 2)
+    fraction = (position - rows)[..., None]
+    values = table[rows]*(1-fraction) + table[rows + 1]*fraction
+    return values[..., 0], values[..., 1]
@@ -1,6 +1,9 @@
 import math
 
-from commentator_website_backend.business_logic.entities import Ball, Position
+from commentator_website_backend.business_logic.entities import Ball, POSITIONS_SIZE
+from commentator_website_backend.business_logic.aggression import AggressionTracker
+from commentator_website_backend.business_logic.geometry import FrameGeometry
+from commentator_website_backend.business_logic.detectors import DetectorRegistry
 from commentator_website_backend.business_logic.message import Corner_Shot, GoalKeeper_Out_Shot, Message, Aggresion, Goal, Kick_Off, Out_Shot, Pass, Dribble, \
     Defense, Goal_Shot, Intersect
 
@@ -10,10 +13,19 @@ AGGRESSION_DISTANCE_MARGIN = 0.3  # Distance to be considered collision between
 AGGRESSION_DISTANCE_TO_BALL = 1.2  # Just notify aggressions at maximum that distance from ball
 MID_SIZE = 0.3
 FORWARD_OFFSET = 0.1
+FORMATION_AREA = 0.10  # part of the field length a team needs in front of it for its formation to be counted
+KICK_OFF_TIMEOUT = 15  # time of the match by which the first kick off is given
+RESTART_TIMEOUT = 18  # time after a goal or an out by which the kick off is given
 
-def process(entities: list, field: dict, goal: dict, curr_timestamp: float, events=None, formation_count=None, formation=[], formation_players={}):
+# Events that stop the detection until the ball is back in game
+OUT_OF_GAME = ("out", "corner", "goalkeeper_out", "out_shot", "corner_shot", "goalkeeper_out_shot", "goal")
+
+def process(entities: list, field: dict, goal: dict, curr_timestamp: float, events=None, formation_count=None, formation=[], formation_players={}, detectors=None):
     """If event is detected, the positions related to the event's timestamp are deleted from all entities.
-    It returns a string event"""
+    It returns a string event. `detectors` is the DetectorRegistry that picks and times the detectors."""
+    if detectors is None:
+        detectors = DetectorRegistry()
+
     if formation_count is None:
         formation_count = {}
 
@@ -23,9 +35,7 @@ def process(entities: list, field: dict, goal: dict, curr_timestamp: float, even
     ball = entities[0]
     teamA = entities[1:12]  # Left (False)
     teamB = entities[12:]  # Right (True)
-    messages = []
-    if curr_timestamp == 0.0:
-        events["start"] = None
+    geometry = FrameGeometry(ball, teamA, teamB)  # ball to player distances, shared by the detectors
 
     # print(len(formation_count))
     if len(formation_count) == 0:
@@ -35,32 +45,50 @@ def process(entities: list, field: dict, goal: dict, curr_timestamp: float, even
                 formation_count[player][i] = 0
 
     # Event detection
-    messages += detect_kick_off(ball, teamA, teamB, curr_timestamp, events)
-    messages += detect_corner_shot(ball, teamA, teamB, curr_timestamp, events)
-    # If ball is out, we have to wait for the ball to be back in game
-    if not (
-            "out" in events or "corner" in events or "goalkeeper_out" in events or "out_shot" in events or "corner_shot" in events or "goalkeeper_out_shot" in events or "goal" in events):
-        messages += detect_out_goal(ball, teamA, teamB, field, goal, curr_timestamp, events)
-        messages += detect_goal_shot(ball, field, goal, curr_timestamp, events)
-        messages += detect_aggressions(teamA, teamB, ball, events)
-        messages += detect_pass_or_dribble(ball, entities[1:], curr_timestamp, events)
-        messages += detect_defense(ball, teamA, teamB, curr_timestamp, events)
+    messages, later, in_game = detect_events(ball, teamA, teamB, field, goal, curr_timestamp, events, geometry, detectors)
+    if in_game:
+        messages += detectors.run("detect_aggressions", detect_aggressions, teamA, teamB, ball, events, geometry)
+    messages += later
 
-        formation, formation_players = update_formation(ball, teamA, teamB, field, formation_count)
+    if in_game:
+        formation, formation_players = detectors.run("update_formation", update_formation, ball, teamA, teamB, field, formation_count,
+                                                     default=(formation, formation_players))
 
     return messages, formation, formation_players
 
 
-def detect_kick_off(ball: Ball, teamA, teamB, timestamp, events):
+def detect_events(ball: Ball, teamA, teamB, field, goal, curr_timestamp, events, geometry, detectors):
+    """The detectors of a frame that change the state in `events` and the ball owner, in the order process runs
+    them. `geometry` is the FrameGeometry of the frame, or anything with the same methods, like the frames of a
+    match_detection.MatchTimeline. Returns the messages of the detectors that run before detect_aggressions, the
+    ones of the detectors after it, and whether the ball is in game (detect_aggressions and update_formation
+    only run then). Aggressions and formation don't change the state, so they can be detected apart."""
+    if curr_timestamp == 0.0:
+        events["start"] = None
+
+    messages = detectors.run("detect_kick_off", detect_kick_off, ball, teamA, teamB, curr_timestamp, events, geometry)
+    messages += detectors.run("detect_corner_shot", detect_corner_shot, ball, teamA, teamB, curr_timestamp, events, geometry)
+    # If ball is out, we have to wait for the ball to be back in game
+    if any(event in events for event in OUT_OF_GAME):
+        return messages, [], False
+
+    messages += detectors.run("detect_out_goal", detect_out_goal, ball, teamA, teamB, field, goal, curr_timestamp, events, geometry)
+    messages += detectors.run("detect_goal_shot", detect_goal_shot, ball, field, goal, curr_timestamp, events, geometry)
+    later = detectors.run("detect_pass_or_dribble", detect_pass_or_dribble, ball, geometry.players, curr_timestamp, events, geometry)
+    later += detectors.run("detect_defense", detect_defense, ball, teamA, teamB, curr_timestamp, events, geometry)
+    return messages, later, True
+
+
+def detect_kick_off(ball: Ball, teamA, teamB, timestamp, events, geometry: FrameGeometry):
     if not "start" in events and not "goal" in events and not "out" in events:
         return []
 
     elif "start" in events:  # start of game
-        if timestamp > 15:  # kick_off timeout
+        if timestamp > KICK_OFF_TIMEOUT:  # kick_off timeout
             events.pop("start")
             return [Kick_Off(timestamp, None)]
-        player = ball.get_closest_player(teamA + teamB)
-        if ball.get_distance_from(player) <= KICK_OFF_CONTACT_DISTANCE:  # kick_off!
+        player = geometry.closest_player()
+        if geometry.distance_from(player) <= KICK_OFF_CONTACT_DISTANCE:  # kick_off!
             events.pop("start")
             ball.owner = player
             return [Kick_Off(timestamp, player)]
@@ -69,11 +97,11 @@ def detect_kick_off(ball: Ball, teamA, teamB, timestamp, events):
 
     elif "goal" in events:
         goal = events["goal"]
-        if timestamp - goal.end > 18:  # kick_off timeout
+        if timestamp - goal.end > RESTART_TIMEOUT:  # kick_off timeout
             events.pop("goal")
             return [Kick_Off(timestamp, None)]
-        player = ball.get_closest_player(teamA + teamB)
-        if ball.get_distance_from(player) <= KICK_OFF_CONTACT_DISTANCE:  # kick_off!
+        player = geometry.closest_player()
+        if geometry.distance_from(player) <= KICK_OFF_CONTACT_DISTANCE:  # kick_off!
             events.pop("goal")
             ball.owner = player
             return [Kick_Off(timestamp, player)]
@@ -82,11 +110,11 @@ def detect_kick_off(ball: Ball, teamA, teamB, timestamp, events):
 
     elif "out" in events:
         out = events["out"]
-        if timestamp - out.end > 18:  # kick_off timeout
+        if timestamp - out.end > RESTART_TIMEOUT:  # kick_off timeout
             events.pop("out")
             return [Kick_Off(timestamp, None)]
-        player = ball.get_closest_player(teamA + teamB)
-        if ball.get_distance_from(player) <= KICK_OFF_CONTACT_DISTANCE:  # kick_off!
+        player = geometry.closest_player()
+        if geometry.distance_from(player) <= KICK_OFF_CONTACT_DISTANCE:  # kick_off!
             events.pop("out")
             ball.owner = player
             return [Kick_Off(timestamp, player)]
@@ -96,9 +124,9 @@ def detect_kick_off(ball: Ball, teamA, teamB, timestamp, events):
 
 # length -> x
 # width -> y
-def detect_out_goal(ball: Ball, teamA, teamB, field, goal, timestamp, events):
+def detect_out_goal(ball: Ball, teamA, teamB, field, goal, timestamp, events, geometry: FrameGeometry):
     # First things first, is it outside the field?
-    ball_pos = ball.positions[-1]
+    ball_pos = geometry.ball_position()
 
     if not (abs(ball_pos.x) > field["length"] / 2 or abs(ball_pos.y) > field["width"] / 2):
         return []
@@ -126,9 +154,8 @@ def detect_out_goal(ball: Ball, teamA, teamB, field, goal, timestamp, events):
 
     if "goal" not in events:
         # Who is the ball owner
-        pl_teamA = ball.get_closest_player(teamA)
-        pl_teamB = ball.get_closest_player(teamB)
-        if ball.get_distance_from(pl_teamA) > ball.get_distance_from(pl_teamB):
+        pl_teamA, pl_teamB = geometry.closest_per_team()
+        if geometry.distance_from(pl_teamA) > geometry.distance_from(pl_teamB):
             ball.owner = pl_teamB
         else:
             ball.owner = pl_teamA
@@ -162,46 +189,46 @@ def detect_out_goal(ball: Ball, teamA, teamB, field, goal, timestamp, events):
     return []
 
 
-def detect_corner_shot(ball: Ball, teamA: list, teamB: list, curr_timestamp: float, events):
+def detect_corner_shot(ball: Ball, teamA: list, teamB: list, curr_timestamp: float, events, geometry: FrameGeometry):
     if "corner" in events:
-        if start_outside_shot("corner", ball, teamA, teamB, curr_timestamp, events):
+        if start_outside_shot("corner", ball, teamA, teamB, curr_timestamp, events, geometry):
             return []
 
     elif "out" in events:
-        if start_outside_shot("out", ball, teamA, teamB, curr_timestamp, events):
+        if start_outside_shot("out", ball, teamA, teamB, curr_timestamp, events, geometry):
             print(f"{curr_timestamp}: Out Start")
             return []
 
     elif "goalkeeper_out" in events:
-        if start_outside_shot("goalkeeper_out", ball, teamA, teamB, curr_timestamp, events):
+        if start_outside_shot("goalkeeper_out", ball, teamA, teamB, curr_timestamp, events, geometry):
             return []
 
     elif "corner_shot" in events:
-        message = outside_shot("corner", ball, teamA, teamB, curr_timestamp, events)
+        message = outside_shot("corner", ball, teamA, teamB, curr_timestamp, events, geometry)
         if message is not None:
             return [message]
 
     elif "out_shot" in events:
-        message = outside_shot("out", ball, teamA, teamB, curr_timestamp, events)
+        message = outside_shot("out", ball, teamA, teamB, curr_timestamp, events, geometry)
         if message is not None:
             print(f"{curr_timestamp}: Out Shot")
             return [message]
 
     elif "goalkeeper_out_shot" in events:
-        message = outside_shot("goalkeeper_out", ball, teamA, teamB, curr_timestamp, events)
+        message = outside_shot("goalkeeper_out", ball, teamA, teamB, curr_timestamp, events, geometry)
         if message is not None:
             return [message]
     return []
 
 
-def start_outside_shot(event: str, ball: Ball, teamA: list, teamB: list, curr_timestamp: float, events):
+def start_outside_shot(event: str, ball: Ball, teamA: list, teamB: list, curr_timestamp: float, events, geometry: FrameGeometry):
     """If a outside shot is kicked, returns True and add to the events. Returns False otherwise"""
     atk_team = teamA if ball.owner.isTeamRight else teamB
 
     # If attacking team has a player that entered in contact with the ball
     # for player in atk_team:
-    player = ball.get_closest_player(atk_team)
-    if ball.get_distance_from(player) < KICK_OFF_CONTACT_DISTANCE:
+    player = geometry.closest_player(atk_team)
+    if geometry.distance_from(player) < KICK_OFF_CONTACT_DISTANCE:
         events.pop(event)
         events[f"{event}_shot"] = {"start": curr_timestamp, "player": player}
         # print(f"after {events[event + '_shot'] = }")
@@ -210,9 +237,9 @@ def start_outside_shot(event: str, ball: Ball, teamA: list, teamB: list, curr_ti
     return False
 
 
-def outside_shot(event: str, ball: Ball, teamA: list, teamB: list, curr_timestamp: float, events):
+def outside_shot(event: str, ball: Ball, teamA: list, teamB: list, curr_timestamp: float, events, geometry: FrameGeometry):
     # The shot ends when the ball stops moving
-    if has_ball_stopped(ball, teamA, teamB):
+    if has_ball_stopped(ball, teamA, teamB, geometry):
         message = None
         if event == "out":
             message = Out_Shot("out_shot", player=events[f"out_shot"]["player"], start=events[f"out_shot"]["start"], end=curr_timestamp)
@@ -225,19 +252,15 @@ def outside_shot(event: str, ball: Ball, teamA: list, teamB: list, curr_timestam
         return message
 
 
-def has_ball_stopped(ball: Ball, teamA: list, teamB: list):
+def has_ball_stopped(ball: Ball, teamA: list, teamB: list, geometry: FrameGeometry):
     """Returns True if the ball collides with some player of if its velocity is 0"""
-    if ball.get_current_velocity() == 0:
+    if geometry.ball_velocity() == 0:
         return True
 
-    for player in teamA + teamB:
-        if ball.get_distance_from(player) < CONTACT_DISTANCE:
-            return True
+    return geometry.any_contact(CONTACT_DISTANCE)
 
-    return False
 
-
-def detect_goal_shot(ball: Ball, field: dict, goal: dict, timestamp: float, events):
+def detect_goal_shot(ball: Ball, field: dict, goal: dict, timestamp: float, events, geometry: FrameGeometry):
     """Detects if a goal shot is currently happening"""
     # if ball doesn't have owner, skip detection, TODO confirm with Dinis if ok
 
@@ -245,12 +268,13 @@ def detect_goal_shot(ball: Ball, field: dict, goal: dict, timestamp: float, even
         return []
 
     # check if ball is in goal area and the owner is correct
-    if not (ball.positions[-1].x > field["length"] / 4 and not ball.owner.isTeamRight or ball.positions[-1].x < -field[
+    ball_x = geometry.ball_position().x
+    if not (ball_x > field["length"] / 4 and not ball.owner.isTeamRight or ball_x < -field[
         "length"] / 4 and ball.owner.isTeamRight):
         return []
     # ball velocity increases in direction of goal
 
-    if not ball.is_in_goal_direction(not ball.owner.isTeamRight, field, goal):
+    if not geometry.is_in_goal_direction(not ball.owner.isTeamRight, field, goal):
         # If ball stop moving after a goal_shot
         if "goal_shot" in events:
             events["goal_shot"].end = timestamp
@@ -263,115 +287,43 @@ def detect_goal_shot(ball: Ball, field: dict, goal: dict, timestamp: float, even
     return []
 
 
-def detect_defense(ball: Ball, teamA: list, teamB: list, timestamp: float, events):
+def detect_defense(ball: Ball, teamA: list, teamB: list, timestamp: float, events, geometry: FrameGeometry):
     if not "goal_shot" in events:
         return []
     oponent_team = teamA if ball.owner.isTeamRight else teamB
 
-    for player in oponent_team:
-        if ball.get_distance_from(player) < CONTACT_DISTANCE:
-            m1 = Defense("defense", player, start=timestamp, end=timestamp)
-            m2 = events["goal_shot"]
-            m2.end = timestamp
-            events.pop("goal_shot", None)
-            ball.owner = player
-            return [m1, m2]
+    defenders = geometry.in_contact(CONTACT_DISTANCE, oponent_team)
+    if defenders:
+        player = defenders[0]
+        m1 = Defense("defense", player, start=timestamp, end=timestamp)
+        m2 = events["goal_shot"]
+        m2.end = timestamp
+        events.pop("goal_shot", None)
+        ball.owner = player
+        return [m1, m2]
     return []
 
 
-def detect_aggressions(teamA: list, teamB: list, ball: Ball, events, distance_margin=AGGRESSION_DISTANCE_MARGIN):
-    """Given teams, returns a list of Aggressions."""
-
-    # {
-    # aggressions: {
-    # id1_id2: [
-    # {start: time, end: time, has_been_printed: bool}
-    # ]
-    # }
-    # }
+def detect_aggressions(teamA: list, teamB: list, ball: Ball, events, geometry: FrameGeometry, distance_margin=None):
+    """Given teams, returns a list of Aggressions. `distance_margin` is AGGRESSION_DISTANCE_MARGIN by default."""
+    if distance_margin is None:
+        distance_margin = AGGRESSION_DISTANCE_MARGIN
 
+    # Aggression intervals of every pair of opponents are kept in the arrays of an AggressionTracker,
+    # pair (a, b) being teamA[a] and teamB[b]
     if "aggressions" not in events:
-        events["aggressions"] = {}
-
-    aggressions = events.get("aggressions")
-
-    for entity1 in teamA:
-        key = ""
-        for entity2 in teamB:
+        events["aggressions"] = AggressionTracker(teamA, teamB)
 
-            isNewTimeStamp = True
-            positions1: list = entity1.get_recent_positions()
+    tracker = events.get("aggressions")
 
-            for i in range(len(positions1)):
-                pos1: Position = positions1[i]
-                
-                positions2: list = entity2.get_recent_positions()
-                pos2: Position = positions2[i]
+    # Only pairs with a player near the ball are checked
+    ended = tracker.update(ball.store, geometry.near(AGGRESSION_DISTANCE_TO_BALL, teamA),
+                           geometry.near(AGGRESSION_DISTANCE_TO_BALL, teamB), distance_margin, POSITIONS_SIZE)
 
-                distance = pos1.distance_between(pos2)
+    return [Aggresion(teamA[a], teamB[b], start, end) for a, b, start, end in ended]
 
-                id1 = entity1.id
-                id2 = entity2.id
-                key = f"{id1}_{id2}"
 
-                if distance < distance_margin and (ball.get_distance_from(entity1) < AGGRESSION_DISTANCE_TO_BALL \
-                                                   or ball.get_distance_from(entity2) < AGGRESSION_DISTANCE_TO_BALL):
-
-                    aggression_times = aggressions.get(key)
-
-                    if aggression_times is None:
-                        aggressions[key] = []
-
-                    # If is the first aggression on key, or the last one has ended, create a new one
-                    if len(aggressions[key]) == 0:
-                        aggressions[key].append({"start": pos1.timestamp, "end": -1, "has_been_printed": False})
-
-                    else:
-                        past = aggressions[key][-1]
-                        if past["end"] != -1 and past["end"] < pos1.timestamp:
-                            aggressions[key].append({"start": pos1.timestamp, "end": -1, "has_been_printed": False})
-
-                    # Remove useless aggressions from events array
-                    # TODO test this more
-                    if i == 0:
-                        # if it's the oldest on memory, and already surpass oldest aggression
-                        # then aggression should be removed
-                        oldest_aggression = aggressions[key][0]
-
-                        if oldest_aggression["end"] != -1 and oldest_aggression["end"] < pos1.timestamp:
-                            aggressions[key].pop(0)
-
-                    isNewTimeStamp = False
-
-                elif not isNewTimeStamp:  # end time range condition
-                    isNewTimeStamp = True
-                    aggressions.get(key)[-1]["end"] = pos1.timestamp
-
-    aggressions_list = []
-
-    # For each aggression on events, print output if hasn't been printed yet
-    for k, v in aggressions.items():
-        for aggression in v:
-
-            # If aggression had finished (!= -1) and hasn't been printed yet, then create message
-            if aggression["end"] != -1 and not aggression["has_been_printed"]:
-                ids = k.split("_")
-                p1 = None
-                p2 = None
-                for entity in teamA + teamB:
-                    if ids[0] == entity.id:
-                        p1 = entity
-                    if ids[1] == entity.id:
-                        p2 = entity
-                    if p1 and p2:
-                        break
-                aggression["has_been_printed"] = True
-                aggressions_list += [Aggresion(p1, p2, aggression["start"], aggression["end"])]
-
-    return aggressions_list
-
-
-def detect_pass_or_dribble(ball: Ball, players: list, timestamp: float, events):
+def detect_pass_or_dribble(ball: Ball, players: list, timestamp: float, events, geometry: FrameGeometry):
     """Given the entities checks if a pass or dribble is hapening"""
 
     if "goal" in events:
@@ -380,7 +332,7 @@ def detect_pass_or_dribble(ball: Ball, players: list, timestamp: float, events):
         return []
 
     # If Ball isn't moving then there isn't a pass/dribble or it finished
-    if math.floor(ball.get_current_velocity() * 100) / 100.0 == 0:
+    if math.floor(geometry.ball_velocity() * 100) / 100.0 == 0:
         if "dribble/pass" in events:
             m = events["dribble/pass"]
             message = Dribble("dribble", m["from"], m["start"], timestamp)
@@ -389,12 +341,12 @@ def detect_pass_or_dribble(ball: Ball, players: list, timestamp: float, events):
         return []
 
     # for player in players:
-    player = ball.get_closest_player(players)
+    player = geometry.closest_player(players)
     # If player touches the ball
-    if ball.get_distance_from(player) < CONTACT_DISTANCE:
+    if geometry.distance_from(player) < CONTACT_DISTANCE:
         # The dribble/pass was initialized
         if "dribble/pass" not in events:
-            events["dribble/pass"] = {"pos": ball.positions[-1], "from": player, "start": timestamp}
+            events["dribble/pass"] = {"pos": geometry.ball_position(), "from": player, "start": timestamp}
             # Pass(ball.positions[-1],  "dribble/pass", player.id, timestamp, timestamp)
             ball.owner = player
             return []
@@ -413,7 +365,7 @@ def detect_pass_or_dribble(ball: Ball, players: list, timestamp: float, events):
             message = Pass(m["pos"], "pass", m["from"], player, m["start"], timestamp)
             # message.end = timestamp
             # message.event = "pass"
-            message.final_pos = ball.positions[-1]
+            message.final_pos = geometry.ball_position()
             # message.id = player.id
             message.check_type()
             events.pop("dribble/pass")
@@ -424,7 +376,7 @@ def detect_pass_or_dribble(ball: Ball, players: list, timestamp: float, events):
             # if the closest player to the ball of the same team is the owner then dribble
             event = "dribble"
             for p in players:
-                if p.isTeamRight == ball.owner.isTeamRight and ball.get_distance_from(p) < ball.get_distance_from(
+                if p.isTeamRight == ball.owner.isTeamRight and geometry.distance_from(p) < geometry.distance_from(
                         ball.owner):
                     event = "pass"
                     break
@@ -434,7 +386,7 @@ def detect_pass_or_dribble(ball: Ball, players: list, timestamp: float, events):
                 m1 = Dribble("dribble", m["from"], m["start"], timestamp)
             else:
                 m1 = Pass(m["pos"], "pass", m["from"], player, m["start"], timestamp)
-                m1.final_pos = ball.positions[-1]
+                m1.final_pos = geometry.ball_position()
                 m1.check_type()
             # m1.end = timestamp
             # m1.event = event
@@ -459,20 +411,25 @@ def update_formation(ball: Ball, teamA: list, teamB: list, field: dict, formatio
     right, areaR = get_areas(ball, True, field)
 
     # Team A (left)
-    if areaL > field["length"]*0.10:
+    if areaL > field["length"]*FORMATION_AREA:
         for player in teamA:
             for i in range(len(left)):
                 if left[i][0] < player.positions[-1].x < left[i][1]:
                     formation_count[player][i] += 1
                     break
 
-    if areaR > field["length"]*0.10:                
+    if areaR > field["length"]*FORMATION_AREA:                
         for player in teamB:
             for i in range(len(right)):
                 if left[i][0] < player.positions[-1].x < left[i][1]:
                     formation_count[player][i] += 1
                     break
 
+    return get_formation(teamA, teamB, formation_count)
+
+
+def get_formation(teamA: list, teamB: list, formation_count):
+    """Formation of each team and place of each player, the area each player was counted the most in."""
     # def, mid, forward
     teamA_form = [0, 0, 0]
     teamB_form = [0, 0, 0]
@@ -495,8 +452,12 @@ def update_formation(ball: Ball, teamA: list, teamB: list, field: dict, formatio
 
 def get_areas(ball: Ball, isRight: bool, field: dict):
     """Returns, as a list, the X's that delimit forward, mifield and defender areas, respectively"""
+    return areas_at(ball.positions[-1].x, isRight, field)
+
+
+def areas_at(ball_line, isRight: bool, field: dict):
+    """get_areas with the ball at x = `ball_line`, which can also be an array of them."""
     goal_line = field["length"] / 2 if isRight else -field["length"] / 2
-    ball_line = ball.positions[-1].x
     rangeEnemy = abs(-goal_line - ball_line)
     start_forward = ball_line - FORWARD_OFFSET * rangeEnemy if isRight else ball_line + FORWARD_OFFSET * rangeEnemy
     rangeFriendly = abs(goal_line - start_forward)
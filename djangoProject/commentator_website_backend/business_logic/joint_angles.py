@@ -0,0 +1,91 @@
+import time
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+from .body2thigh_analytic import get_thighs_batch
+
+# For each joint of the replay, the angles computed when its node changes: the euler angles of a link
+# (attribute of the Player with its matrix) relative to another, and the slots of Player.joints they go to,
+# as (slot, euler angle, sign). The thighs go through get_thighs_batch first, with isRight.
+JOINT_ANGLES = {
+    "head": [("head_pos", "cur_pos", [(0, 2, 1), (1, 0, 1)], None)],
+    "rupperarm": [("rupperarm_pos", "cur_pos", [(2, 0, 1), (3, 1, 1)], None)],
+    "rlowerarm": [("rlowerarm_pos", "rupperarm_pos", [(4, 1, -1), (5, 2, -1)], None)],
+    "lupperarm": [("lupperarm_pos", "cur_pos", [(6, 0, 1), (7, 1, 1)], None)],
+    "llowerarm": [("rlowerarm_pos", "rupperarm_pos", [(8, 1, -1), (9, 2, -1)], None)],
+    "rthigh": [("rthigh_pos", "cur_pos", [(10, 0, 1), (11, 1, 1), (12, 2, 1)], True)],
+    "rshank": [("rshank_pos", "rthigh_pos", [(13, 0, 1)], None)],
+    "rfoot": [("rfoot_pos", "rshank_pos", [(14, 0, 1)], None), ("rfoot_pos", "rthigh_pos", [(15, 1, 1)], None)],
+    "lthigh": [("lthigh_pos", "cur_pos", [(16, 0, 1), (17, 1, 1), (18, 2, 1)], False)],
+    "lshank": [("lshank_pos", "lthigh_pos", [(19, 0, 1)], None)],
+    "lfoot": [("lfoot_pos", "lshank_pos", [(20, 0, 1)], None), ("lfoot_pos", "lthigh_pos", [(21, 1, 1)], None)],
+}
+
+
+def euler_angles(links, references):
+    """get_euler_angles of a list of link matrices, each relative to its reference matrix, as (N, 3).
+    The references are rigid transforms, so the rotation of their inverse is the transpose of theirs."""
+    h = np.array(links, dtype=float).reshape(-1, 4, 4).transpose(0, 2, 1)
+    r = np.asarray(references, dtype=float).reshape(-1, 4, 4).transpose(0, 2, 1)
+
+    u1 = h[:, 1, 0:3]/np.linalg.norm(h[:, 1, 0:3], axis=1)[:, None]
+    u2 = h[:, 2, 0:3]/np.linalg.norm(h[:, 2, 0:3], axis=1)[:, None]
+    h[:, 0, 0:3] = np.cross(u1, u2)
+    h[:, 1, 0:3] = u1
+    h[:, 2, 0:3] = u2
+
+    # Coord mundo -> coord robo, only the rotation of inv(r) @ h is used
+    T1 = r[:, :3, :3].transpose(0, 2, 1) @ h[:, :3, :3]
+    return R.from_matrix(T1).as_euler("xyz", degrees=False)
+
+
+class JointAngles():
+    """Joint angles of the replay, computed in batches. `request` takes the matrices a joint needs when its node
+    changes, `flush` computes every pending joint with a single euler_angles call and writes them in
+    Player.joints, in the order they were requested."""
+    def __init__(self):
+        self.links = []
+        self.references = []
+        self.targets = []  # (player, slots, isRight) of each pair of links
+        self.time = 0.0
+        self.thigh_time = 0.0
+        self.count = 0
+
+    def request(self, player, name):
+        if name not in JOINT_ANGLES:
+            return
+        for link, reference, slots, isRight in JOINT_ANGLES[name]:
+            self.links.append(getattr(player, link))
+            self.references.append(getattr(player, reference))
+            self.targets.append((player, slots, isRight))
+        self.count += 1
+
+    def flush(self):
+        if not self.targets:
+            return
+        tic = time.time()
+        e = euler_angles(self.links, self.references)
+
+        ttic = time.time()
+        thighs = [i for i, (_, _, isRight) in enumerate(self.targets) if isRight is not None]
+        if thighs:
+            e[thighs] = get_thighs_batch(e[thighs], [self.targets[i][2] for i in thighs])
+            for i in thighs:
+                player, _, isRight = self.targets[i]
+                setattr(player, "prev_rthigh_euler" if isRight else "prev_lthigh_euler", list(e[i]))
+        self.thigh_time += time.time() - ttic
+
+        rows = [i for i, (_, slots, _) in enumerate(self.targets) for _ in slots]
+        angles = [angle for _, slots, _ in self.targets for _, angle, _ in slots]
+        signs = np.array([sign for _, slots, _ in self.targets for _, _, sign in slots])
+        values = np.around(signs*e[rows, angles]*180/np.pi, 2).tolist()
+
+        # In the order of the requests, a joint requested again gets the angles of the last request
+        k = 0
+        for player, slots, _ in self.targets:
+            for slot, _, _ in slots:
+                player.joints[slot] = values[k]
+                k += 1
+        self.links = []
+        self.references = []
+        self.targets = []
+        self.time += time.time() - tic
@@ -0,0 +1,185 @@
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+from .analytics import MatchAnalytics, analytics_to_json
+from .frame_decoder import decode_nodes
+from .log_io import open_log_stream
+from .log_tokenizer import tokenize_log, split_header, TIME_PATTERN
+from .match_processor import MatchProcessor
+from .nl_processing import generate_script, generate_player_names
+
+# rcssserver3d sends monitors the same s-expressions a sparkmonitor log has on each line,
+# every message prefixed with its length
+MONITOR_PORT = 3200
+MESSAGE_LENGTH = struct.Struct(">I")
+LIVE_HISTORY = 250  # frames kept per entity, a live match is never all in memory
+MAX_LAG = 25  # frames waiting to be processed (0.5s of game) before the detectors skip frames to catch up
+LIVE_WINDOW = 100  # recent events and stats entries kept, the commentary only reads the last ones
+
+
+def read_messages(sock, chunk_size=1 << 16):
+    """Yields the messages of a monitor connection until it's closed."""
+    buffer = bytearray()
+    while True:
+        data = sock.recv(chunk_size)
+        if not data:
+            return
+        buffer += data
+        start = 0
+        while len(buffer) - start >= MESSAGE_LENGTH.size:
+            (length,) = MESSAGE_LENGTH.unpack_from(buffer, start)
+            end = start + MESSAGE_LENGTH.size + length
+            if end > len(buffer):
+                break
+            yield bytes(buffer[start + MESSAGE_LENGTH.size:end])
+            start = end
+        del buffer[:start]
+
+
+def connect_monitor(host="localhost", port=MONITOR_PORT):
+    """Messages of a simulator, or of serve_log, as a monitor connected to it."""
+    with socket.create_connection((host, port)) as sock:
+        yield from read_messages(sock)
+
+
+def serve_log(path, host="localhost", port=MONITOR_PORT, speed=1.0):
+    """Stand-in for the simulator: waits for a monitor to connect and sends it the lines of an existing log,
+    at the pace of their timestamps. `speed` is a multiple of real time, 0 sends them as fast as possible."""
+    with socket.create_server((host, port)) as server, open(path, "rb") as log:
+        connection, _ = server.accept()
+        with connection:
+            start = time.monotonic()
+            first = None
+            for line in open_log_stream(log):
+                line = line.rstrip(b"\r\n")
+                if not line:
+                    continue
+                time_match = TIME_PATTERN.search(split_header(line))
+                if time_match and speed:
+                    timestamp = float(time_match.group(1))
+                    if first is None:
+                        first = timestamp
+                    delay = (timestamp - first) / speed - (time.monotonic() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                connection.sendall(MESSAGE_LENGTH.pack(len(line)) + line)
+
+
+class LiveMatch():
+    """Detects the events of a match while it's played, from the messages of a monitor connection.
+    The messages are read in a thread, so the connection is never waiting for the detectors. Every frame
+    updates the entities, but while more than `max_lag` frames are waiting the detectors skip frames until
+    they catch up, which keeps the latency of a frame bounded.
+    `on_event` gets each Message as soon as it's detected and `on_commentary` the generate_script lines
+    of the new events. Only the last `window` events and stats entries are kept, like in stream_events,
+    so memory doesn't grow with the match: a caller that needs all of them collects them in on_event."""
+    def __init__(self, messages, on_event=None, on_commentary=None, history=LIVE_HISTORY, max_lag=MAX_LAG,
+                 agr_frnd_mod=0, en_calm_mod=0, bias=0, detectors=None, window=LIVE_WINDOW):
+        self.messages = messages
+        self.on_event = on_event
+        self.on_commentary = on_commentary
+        self.history = history
+        self.max_lag = max_lag
+        self.window = window
+        self.modifiers = (agr_frnd_mod, en_calm_mod, bias)
+        self.detectors = detectors
+        self.player_names = generate_player_names()  # the same names for the whole match
+
+        self.match = None
+        self.teams = None
+        self.analytics = None
+        self.events = deque(maxlen=window)
+        self.stats = {}  # analytics_to_json of the last `window` entries of the analytics
+        self.arrival = None  # when the message of the current frame was read
+
+        self.frames = 0
+        self.lagged = 0  # frames whose detectors were skipped
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def _read(self, pending):
+        try:
+            for message in self.messages:
+                pending.put((time.perf_counter(), message))
+        finally:
+            pending.put(None)
+
+    def _lines(self, pending):
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            self.arrival, line = item
+            yield line
+
+    def run(self):
+        """Processes the match until the connection is closed and returns the last `window` events."""
+        pending = queue.Queue()
+        threading.Thread(target=self._read, args=(pending,), daemon=True).start()
+
+        frames = tokenize_log(self._lines(pending))
+        header = next(frames, None)
+        if header is None:
+            return list(self.events)
+        self.teams = header.teams
+        self.match = MatchProcessor.from_frame(header, next(frames), history=self.history, detectors=self.detectors)
+        self.analytics = MatchAnalytics(self.match.entities)
+        self.publish(self.match.detect())
+
+        for frame in frames:
+            changed, matrices = decode_nodes(frame.nodes, self.match.node_indices)
+            self.match.update(frame.timestamp, changed, matrices)
+            if pending.qsize() <= self.max_lag:
+                self.publish(self.match.detect())
+            else:
+                self.lagged += 1
+
+            latency = time.perf_counter() - self.arrival
+            self.frames += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        return list(self.events)
+
+    def publish(self, messages):
+        if not messages:
+            return
+        self.events.extend(messages)
+        for message in messages:
+            timestamp = self.analytics.add(message)
+            if timestamp is not None:
+                self.stats.update(analytics_to_json({timestamp: self.analytics.log.pop(timestamp)}))
+                if len(self.stats) > self.window:
+                    del self.stats[next(iter(self.stats))]  # the oldest, timestamps only grow
+            if self.on_event:
+                self.on_event(message)
+        if self.on_commentary:
+            self.on_commentary(generate_script([message.to_json() for message in messages], self.stats,
+                                               *self.modifiers, self.teams, self.player_names))
+
+    def report(self):
+        mean = self.total_latency / self.frames if self.frames else 0.0
+        return (f"{self.frames} frames, latency mean {mean * 1000:.2f} ms max {self.max_latency * 1000:.2f} ms, "
+                f"detectors skipped in {self.lagged} frames")
+
+
+def print_commentary(lines):
+    for line in lines:
+        print("   ", line["text"])
+
+
+if __name__ == "__main__":
+    # python -m commentator_website_backend.business_logic.live serve <log> [speed]
+    # python -m commentator_website_backend.business_logic.live watch [host] [port]
+    if sys.argv[1] == "serve":
+        serve_log(sys.argv[2], speed=float(sys.argv[3]) if len(sys.argv) > 3 else 1.0)
+    else:
+        host = sys.argv[2] if len(sys.argv) > 2 else "localhost"
+        port = int(sys.argv[3]) if len(sys.argv) > 3 else MONITOR_PORT
+        live = LiveMatch(connect_monitor(host, port), on_event=print, on_commentary=print_commentary)
+        live.run()
+        print(live.report())
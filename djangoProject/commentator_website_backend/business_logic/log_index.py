@@ -0,0 +1,166 @@
+import mmap
+import numpy as np
+
+from .log_tokenizer import tokenize_log, NODE_SEPARATOR, REPLAY_PARAMS
+from .scene_graph import get_schema
+
+KEYFRAME_INTERVAL = 250  # indexed frames between two keyframes, ~10 seconds of game
+
+
+class LineReader():
+    """Iterates over the lines of a memory-mapped log and remembers where the last one starts."""
+    def __init__(self, log, start=0):
+        self.log = log
+        self.offset = start
+        self.length = 0
+
+    def __iter__(self):
+        pos = self.offset
+        size = len(self.log)
+        while pos < size:
+            end = self.log.find(b"\n", pos)
+            end = size if end < 0 else end + 1
+            self.offset = pos
+            self.length = end - pos
+            yield self.log[pos:end]
+            pos = end
+
+
+def keyframe_line(header, timestamp, play_mode, nodes):
+    """A full frame line with the given nodes."""
+    return header_line(header, timestamp, play_mode) + NODE_SEPARATOR + NODE_SEPARATOR.join(nodes[1:])
+
+
+def header_line(header, timestamp, play_mode):
+    """Rebuilds the header of a full frame, so a keyframe can be read by tokenize_log on its own."""
+    params = [("FieldLength", header.field["length"]), ("FieldWidth", header.field["width"]),
+              ("FieldHeight", header.field["height"]), ("GoalWidth", header.goal["width"]),
+              ("GoalDepth", header.goal["depth"]), ("GoalHeight", header.goal["height"])]
+    params += [(name, header.replay[name]) for name in REPLAY_PARAMS if header.replay.get(name) is not None]
+    line = "(" + "".join(f"({name} {value})" for name, value in params)
+    line += f"(play_modes {' '.join(header.play_modes)})(time {timestamp})(play_mode {play_mode})"
+    line += f"(team_left {header.teams[0]})(team_right {header.teams[1]}))(RSG 0 1)("
+    return line.encode()
+
+
+class LogIndex():
+    """Byte offset, timestamp and play mode of every frame of a stored log, plus a keyframe (the whole
+    scene graph state) every KEYFRAME_INTERVAL frames. Frames are delta encoded, so a keyframe is what
+    lets a time window be decoded without reading the log from the start."""
+    def __init__(self, path, offsets, lengths, timestamps, play_modes, keyframe_rows, keyframes):
+        self.path = path
+        self.offsets = offsets
+        self.lengths = lengths
+        self.timestamps = timestamps
+        self.play_modes = play_modes
+        self.keyframe_rows = keyframe_rows  # frame row of each keyframe
+        self.keyframes = keyframes  # full frame lines
+        self.log = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def open(self):
+        """Maps the log, once, for line. close unmaps it, or using the index in a with block."""
+        if self.log is None:
+            with open(self.path, "rb") as f:
+                self.log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # The memory map is opened again where the index is unpickled
+        state = self.__dict__.copy()
+        state["log"] = None
+        return state
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def line(self, row):
+        log = self.open()
+        return log[self.offsets[row]:self.offsets[row] + self.lengths[row]]
+
+    def window(self, start=None, end=None):
+        """Yields the lines to give to process_log to decode the frames between start and end (in seconds).
+        It starts with the last keyframe before `start`, so up to KEYFRAME_INTERVAL frames before it are
+        decoded too."""
+        first = 0 if start is None else int(np.searchsorted(self.timestamps, start, "left"))
+        last = len(self) if end is None else int(np.searchsorted(self.timestamps, end, "right"))
+        yield from self.rows(first, last)
+
+    def keyframe_before(self, row):
+        """Number of the last keyframe at or before a frame row."""
+        return max(int(np.searchsorted(self.keyframe_rows, row, "right")) - 1, 0)
+
+    def rows(self, first, last):
+        """Like window, with frame rows instead of seconds. The first line is the frame at
+        keyframe_rows[keyframe_before(first)]."""
+        k = self.keyframe_before(first)
+        yield self.keyframes[k]
+        for row in range(self.keyframe_rows[k] + 1, last):
+            yield self.line(row)
+
+    def save(self, path):
+        blob = b"".join(self.keyframes)
+        ends = np.cumsum([len(keyframe) for keyframe in self.keyframes])
+        np.savez(path, offsets=self.offsets, lengths=self.lengths, timestamps=self.timestamps,
+                 play_modes=self.play_modes, keyframe_rows=self.keyframe_rows, keyframe_ends=ends,
+                 keyframes=np.frombuffer(blob, dtype=np.uint8))
+
+    @staticmethod
+    def load(path, log_path):
+        data = np.load(path)
+        blob = data["keyframes"].tobytes()
+        starts = np.concatenate([[0], data["keyframe_ends"][:-1]])
+        keyframes = [blob[s:e] for s, e in zip(starts, data["keyframe_ends"])]
+        return LogIndex(log_path, data["offsets"], data["lengths"], data["timestamps"], data["play_modes"],
+                        data["keyframe_rows"], keyframes)
+
+
+def build_index(path, keyframe_interval=KEYFRAME_INTERVAL):
+    """Scans a stored log once and returns its LogIndex. The log is mapped again when the index reads a line."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        return scan_log(path, log, keyframe_interval)
+
+
+def scan_log(path, log, keyframe_interval=KEYFRAME_INTERVAL):
+    reader = LineReader(log)
+    frames = tokenize_log(reader)
+
+    header = next(frames, None)
+    assert header is not None, "Log has no full frame"
+    full_frame = next(frames)
+    nodes = get_schema(full_frame.nodes).tracked_nodes(createReplay=True)
+    state = list(full_frame.nodes)
+
+    offsets = [reader.offset]
+    lengths = [reader.length]
+    timestamps = [full_frame.timestamp]
+    play_modes = [full_frame.play_mode]
+    keyframe_rows = [0]
+    keyframes = [keyframe_line(header, full_frame.timestamp, full_frame.play_mode, state)]
+
+    for frame in frames:
+        offsets.append(reader.offset)
+        lengths.append(reader.length)
+        timestamps.append(frame.timestamp)
+        play_modes.append(frame.play_mode)
+        for i in nodes:
+            if frame.nodes[i]:
+                state[i] = frame.nodes[i]
+
+        if (len(offsets) - 1) % keyframe_interval == 0:
+            keyframe_rows.append(len(offsets) - 1)
+            keyframes.append(keyframe_line(header, frame.timestamp, frame.play_mode, state))
+
+    return LogIndex(path, np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64),
+                    np.array(timestamps), np.array(play_modes, dtype=np.int16),
+                    np.array(keyframe_rows, dtype=np.int64), keyframes)
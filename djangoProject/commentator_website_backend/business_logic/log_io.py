@@ -0,0 +1,72 @@
+import bz2
+import gzip
+import lzma
+
+# Compressed logs are recognized by their first bytes, not by the file name
+MAGIC_BYTES = [
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+]
+MAGIC_SIZE = max(len(magic) for magic, _ in MAGIC_BYTES)
+
+
+class PrefixedStream():
+    """Puts the bytes read to detect the compression back in front of a stream that can't seek."""
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data = self.prefix + self.stream.read()
+            self.prefix = self.prefix[:0]
+            return data
+        data = self.prefix[:size]
+        self.prefix = self.prefix[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
+def open_log_stream(log):
+    """Returns an iterable over the lines of the log, decompressing it on the fly if it's a gzip,
+    bz2 or xz file. Only a block of the compressed stream is in memory at a time.
+    Text files and lists of lines are returned as they are."""
+    if not hasattr(log, "read"):
+        return log
+
+    seekable = hasattr(log, "seek") and (not hasattr(log, "seekable") or log.seekable())
+    start = log.tell() if seekable else 0
+    prefix = log.read(MAGIC_SIZE)
+    if seekable:
+        log.seek(start)
+        stream = log
+    else:
+        stream = PrefixedStream(prefix, log)
+
+    if isinstance(prefix, bytes):
+        for magic, decompress in MAGIC_BYTES:
+            if prefix.startswith(magic):
+                return decompress(stream, "rb")
+    return stream if seekable else iter_lines(stream)
+
+
+def iter_lines(stream, chunk_size=1 << 20):
+    """Splits a stream that can only be read into lines."""
+    rest = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        newline = "\n" if isinstance(chunk, str) else b"\n"
+        lines = chunk.split(newline)
+        if rest is not None:
+            lines[0] = rest + lines[0]
+        rest = lines.pop()
+        for line in lines:
+            yield line + newline
+    if rest:
+        yield rest
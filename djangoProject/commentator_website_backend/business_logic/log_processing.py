@@ -1,99 +1,152 @@
+import logging
 import math
+import os
 import sys
-import re
-import copy
 import time
-
-from .entities import Position, Entity, Ball, Player
-from .heuristics import process
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .entities import POSITIONS_SIZE
+from .match_processor import MatchProcessor
+from .match_detection import detect_match
+from .detectors import DetectorRegistry
+from .frame_sampler import AdaptiveSampler
 from .analytics import analytics, get_analytics
-
-
-def position_to_array(position, flg=False):
-    tmp = re.findall("[-]?\d+[.]?\d*[eE]?[-]?\d*", position)
-    pos = []
-    for numb in tmp:
-        pos.append(float(numb))
-    # assert len(pos) == 16
-    return pos
-
-def process_log(log, prefix1="/djangoProject/commentator_website_backend/business_logic/prefix1.txt", prefix2="/djangoProject/commentator_website_backend/business_logic/prefix2.txt", createReplay=False, skip=1, skip_flg=False):
+from .log_tokenizer import tokenize_log, tokenize_frames
+from .log_io import open_log_stream
+from .frame_decoder import decode_frames, decode_lines
+from .trajectory_cache import TrajectoryCache
+from .checkpoint import Checkpoint, OffsetLines, CHECKPOINT_INTERVAL, CHECKPOINT_HISTORY
+
+logger = logging.getLogger(__name__)
+
+FRAME_BATCH_SIZE = 250  # ~10 seconds of game, decoded at once
+HISTORY_SIZE = None  # frames of history kept per entity, None keeps the whole match
+PARSE_WORKERS = None  # processes decoding frame batches, None decodes them in this process
+# Start of every replay file, before and after the line with the teams
+REPLAY_PREFIX1 = os.path.join(os.path.dirname(__file__), "prefix1.txt")
+REPLAY_PREFIX2 = os.path.join(os.path.dirname(__file__), "prefix2.txt")
+
+
+def batch_frames(frames, skip=1, skip_flg=False, size=FRAME_BATCH_SIZE, start=0):
+    """Groups the frames that should be processed in lists of `size` frames. `start` is the number of
+    frames before the first one, when a run is resumed."""
+    batch = []
+    for count, frame in enumerate(frames, start):
+        if skip_flg and count % skip == 0:
+            continue
+        batch.append(frame)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def decode_batches(batches, indices, workers=PARSE_WORKERS):
+    """Yields (batch, changed, matrices) for every batch, in order.
+    With `workers`, batches are decoded in a process pool while the previous ones are being processed.
+    Only the lines of the frames are sent to the workers, and at most 2 batches per worker are in flight."""
+    if not workers or workers < 2:
+        for batch in batches:
+            yield (batch, *decode_frames(batch, indices))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, executor.submit(decode_lines, [frame.line for frame in batch], indices)))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield (batch, *future.result())
+        while pending:
+            batch, future = pending.popleft()
+            yield (batch, *future.result())
+
+
+def read_match(log, workers=None):
+    """Reads the whole trajectory of a log, or of a loaded TrajectoryCache, without detecting anything.
+    Returns the MatchProcessor and the timestamps and store lengths of each frame that detect_match needs."""
+    if isinstance(log, TrajectoryCache):
+        match = MatchProcessor(log.header, log.schema, log.nodes, log.first_matrices(), log.timestamp)
+        batches = log.batches()
+    else:
+        frames = tokenize_log(open_log_stream(log))
+        header = next(frames, None)
+        assert header is not None, "Log has no full frame"
+        match = MatchProcessor.from_frame(header, next(frames))
+        batches = decode_batches(batch_frames(frames), match.node_indices, workers)
+
+    timestamps = [match.timestamp]
+    lengths = [list(match.store.lengths)]
+    for frame_batch, batch_changes, batch_matrices in batches:
+        for frame, changed, matrices in zip(frame_batch, batch_changes, batch_matrices):
+            match.update(frame.timestamp, changed, matrices)
+            timestamps.append(match.timestamp)
+            lengths.append(list(match.store.lengths))
+    return match, timestamps, lengths
+
+
+def process_log(log, prefix1=REPLAY_PREFIX1, prefix2=REPLAY_PREFIX2, createReplay=False, skip=1, skip_flg=False, history=HISTORY_SIZE, workers=PARSE_WORKERS, cache=None, batch=False, detectors=None, adaptive=False, checkpoint=None, checkpoint_every=CHECKPOINT_INTERVAL):
+    """Detects the events of a log, or of a loaded TrajectoryCache. If `cache` is an empty TrajectoryCache,
+    the frames of the log are recorded in it, to be saved by the caller. The cache only has the frames left after
+    skipping, it's processed again with the same skipping or none, see TrajectoryCache.batches.
+    With `batch`, the events are detected once the whole match is read, with detect_match, instead of
+    calling heuristics.process in every frame. `detectors` is a DetectorRegistry to turn detectors off or to
+    read their timings after the run, by default every detector runs. With `adaptive`, the detectors skip
+    most of the frames where the game is stopped or nothing happens near the ball, see AdaptiveSampler.
+    With `checkpoint`, a path, the state of the run is saved there every `checkpoint_every` frames and, if the
+    file already exists and was saved for the same log, the run goes on from it instead of the start of the log
+    (with the detectors registry of the checkpoint). The file is removed once the log is processed. It needs a
+    seekable binary log and keeps CHECKPOINT_HISTORY frames of history, not the whole match."""
     tik = time.time()
-    count = 0
-    flg = False
     events = []
 
-    fieldParams = {}
-    goalParams = {}
-    replayParams = {}
-    entities = []
-    events_dict = {}
-    formation_counts = {}
-    form = []
-    form_players = dict()
-    timestamp = 0
-    left = ""
-    right = ""
-    play_modes = []
-    curr_playmode = 0
+    if history is not None and history < POSITIONS_SIZE:
+        raise ValueError(f"history must keep at least {POSITIONS_SIZE} frames for the heuristics")
+    if batch and history is not None:
+        raise ValueError("batch detection needs the whole match, history must be None")
+    if checkpoint is not None:
+        if createReplay or batch or cache is not None or isinstance(log, TrajectoryCache):
+            raise ValueError("checkpoints only work for event detection from a log, without replay, batch or cache")
+        if history is None:
+            history = CHECKPOINT_HISTORY
+    if detectors is None:
+        detectors = DetectorRegistry()
+    timestamps = []  # of every frame, for batch detection
+    lengths = []  # of the store tracks in every frame, for batch detection
 
     output = []
 
-    # ((FieldLength 30)(FieldWidth 20)(FieldHeight 40)(GoalWidth 2.1)(GoalDepth 0.6)(GoalHeight 0.8)
-    for line in log:
-        count += 1
-        line = line.decode()
-
-        if not play_modes and "play_modes" in line:
-            modes = re.findall("\(play_modes .*?\)", line)[0]
-            play_modes = [mode for mode in modes.rstrip(")").split(" ")[1:]]
-
-        if "play_mode" in line:
-            mode = re.findall("\(play_mode \d+\)", line)[0]
-            curr_playmode = int(mode.rstrip(")").split(" ")[1])
-
-        timestamp = float(re.findall("time \d+[.]?\d*", line)[0].split(" ")[1])
+    resumed = None
+    if isinstance(log, TrajectoryCache):
+        frames = None
+        header = log.header
+    elif checkpoint is not None:
+        lines = OffsetLines(open_log_stream(log))
+        fingerprint = lines.fingerprint()
+        if os.path.exists(checkpoint):
+            resumed = Checkpoint.load(checkpoint)
+            if resumed.fingerprint != fingerprint:
+                resumed = None  # saved for another log, the run starts over and replaces it
+        if resumed is not None:
+            lines.seek(resumed.offset)
+            header = resumed.match.header
+            frames = lines.tag(tokenize_frames(lines, resumed.timestamp, resumed.play_mode), resumed.index + 1)
+        else:
+            frames = tokenize_log(lines)
+            header = next(frames, None)
+            assert header is not None, "Log has no full frame"
+    else:
+        frames = tokenize_log(open_log_stream(log))
+        header = next(frames, None)
+        assert header is not None, "Log has no full frame"
 
-
-        if not ("FieldLength" in line and "FieldWidth" in line):
-            continue
-        tmp = re.split('\s|\)', line)
-        fieldParams["length"] = float(tmp[1])
-        #print("Length:", fieldParams["length"])
-        fieldParams["width"] = float(tmp[3])
-        #print("Width:", fieldParams["width"])
-        fieldParams["height"] = float(tmp[5])
-        #print("Height:", fieldParams["height"])
-        goalParams["width"] = float(tmp[7])
-        #print("Goal Width:", goalParams["width"])
-        goalParams["depth"] = float(tmp[9])
-        #print("Goal Depth:", goalParams["depth"])
-        goalParams["height"] = float(tmp[11])
-        #print("Goal Height:", goalParams["height"])
-        replayParams["BorderSize"] = tmp[13]
-        replayParams["FreeKickDistance"] = tmp[15]
-        replayParams["WaitBeforeKickOff"] = tmp[17]
-        replayParams["AgentRadius"] = tmp[19]
-        replayParams["BallRadius"] = tmp[21]
-        replayParams["BallMass"] = tmp[23]
-        replayParams["RuleGoalPauseTime"] = tmp[25]
-        replayParams["RuleKickInPauseTime"] = tmp[27]
-        replayParams["RuleHalfTime"] = tmp[29]
-        replayParams["half"] = tmp[31]
-        replayParams["score_left"] = tmp[33]
-        replayParams["score_right"] = tmp[35]
-        break
-
-    for line in log:
-        line = line.decode()
-        tmp = re.findall("\(team_left .*?\)", line)
-        tmp2 = re.findall("\(team_right .*?\)", line)
-        if tmp:
-            left = tmp[0].split(" ")[1].rstrip(")")
-        if tmp2:
-            right = tmp2[0].split(" ")[1].rstrip(")")
-        if left and right:
-            break
+    # ((FieldLength 30)(FieldWidth 20)(FieldHeight 40)(GoalWidth 2.1)(GoalDepth 0.6)(GoalHeight 0.8)
+    fieldParams = header.field
+    goalParams = header.goal
+    play_modes = header.play_modes
+    left, right = header.teams
+    sampler = AdaptiveSampler(play_modes) if adaptive else None
 
     if createReplay:
         prefix1 = open(prefix1, "r")
@@ -104,275 +157,62 @@ def process_log(log, prefix1="/djangoProject/commentator_website_backend/busines
         output.append(prefix2.read())
         prefix2.close()
 
-    c = 0
-    for line in log:
-        count += 1
-        line = line.decode()
-        tmp = re.findall("soccerball.obj|models/naobody", line)
-        c += 1
-        if len(tmp) == 23 and not re.search("matTeam", line):
-            timestamp = float(re.findall("time \d+[.]?\d*", line)[0].split(" ")[1])
-            tmp = re.split("\(nd", line)
-            tmp2 = [(tmp[i - 1].strip(), i) for i in range(len(tmp)) if re.search("soccerball.obj", tmp[i])]
-            for pos, i in tmp2:
-                ball = Ball("ball", i, 1)
-                position_array = position_to_array(pos)
-                position = Position(position=position_array, timestamp=timestamp)
-                ball.add_position(position)
-                entities.append(ball)
-
-            pattern = "\(resetMaterials .*?\)"
-            tmp4 = [(tmp[i - 2].strip(), re.findall(pattern, tmp[i])[0], i) for i in range(len(tmp)) if
-                    re.search("naobody", tmp[i])]
-            tmp5 = [(tmp[i - 1].strip(), i - 1, tmp[i]) for i in range(len(tmp)) if re.search("rfoot|lfoot", tmp[i])]
-            
-            for pos, n, i in tmp4:
-                l = n.split(" ")
-                robotID = l[1] + l[2]
-                team = True if "Right" in robotID else False
-                position_array = position_to_array(pos)
-                position = Position(position=position_array, timestamp=timestamp)
-                robot = Player(id=robotID, index=i, offset=2, team=team)
-                robot.add_position(position)
-                entities.append(robot)
-
-            ent_idx = 0
-            n_foot = 0
+    if resumed is not None:
+        match = resumed.match
+        detectors = match.detectors
+        events = resumed.events
+        sampler = resumed.sampler
+        batches = decode_batches(batch_frames(frames, skip, skip_flg, start=resumed.index + 1), match.node_indices, workers)
+    elif frames is None:
+        match = MatchProcessor(header, log.schema, log.nodes, log.first_matrices(), log.timestamp, createReplay,
+                               history, detectors)
+        batches = log.batches(skip, skip_flg)
+    else:
+        # The cache keeps the joints too, so the replay can be generated from it
+        match = MatchProcessor.from_frame(header, next(frames), createReplay, history, detectors, cache is not None)
+        if checkpoint is not None:
+            frames = lines.tag(frames)
+        batches = decode_batches(batch_frames(frames, skip, skip_flg), match.node_indices, workers)
+        if cache is not None:
+            cache.start(header, match.schema, match.node_indices, [match.first[node] for node in match.node_indices],
+                        match.timestamp, skip, skip_flg)
+    entities = match.entities
+
+    if batch:
+        timestamps.append(match.timestamp)
+        lengths.append(list(match.store.lengths))
+    elif resumed is None:  # a resumed run processed the first frame before the checkpoint
+        events += match.detect()
+
+    last_checkpoint = resumed.index if resumed is not None else 0
+    for frame_batch, batch_changes, batch_matrices in batches:
+        if cache is not None:
+            cache.add_batch(frame_batch, batch_changes, batch_matrices)
+
+        for frame, changed, matrices in zip(frame_batch, batch_changes, batch_matrices):
+            match.update(frame.timestamp, changed, matrices)
+
+            if sampler is None or sampler.sample(frame.play_mode, match.ball, match.players):
+                if batch:
+                    timestamps.append(match.timestamp)
+                    lengths.append(list(match.store.lengths))
+                else:
+                    events += match.detect()
+
             if createReplay:
-                for i in range(len(tmp)):
-                    robot = entities[ent_idx]
-
-                    if "naobody" in tmp[i]:
-                        ent_idx += 1
-                        n_foot = 0
-                    elif "head" in tmp[i]:
-                        robot.headIndex = i-2
-                        robot.head_pos = position_to_array(tmp[i-2])
-                        robot.add_joint("head")
-                    elif "rupperarm" in tmp[i]:
-                        robot.rupperarmIndex = i-1
-                        robot.rupperarm_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("rupperarm")
-                    elif "rlowerarm" in tmp[i]:
-                        robot.rlowerarmIndex = i-1
-                        robot.rlowerarm_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("rlowerarm")
-                    elif "lupperarm" in tmp[i]:
-                        robot.lupperarmIndex = i-1
-                        robot.lupperarm_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("lupperarm")
-                    elif "llowerarm" in tmp[i]:
-                        robot.llowerarmIndex = i-1
-                        robot.llowerarm_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("llowerarm")
-                    elif "rthigh" in tmp[i]:
-                        robot.rthighIndex = i-1
-                        robot.rthigh_pos = position_to_array(tmp[i-1])
-                        robot.init_thigh(robot.rthigh_pos, True)
-                        robot.add_joint("rthigh")
-                    elif "rshank" in tmp[i]:
-                        robot.rshankIndex = i-1
-                        robot.rshank_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("rshank")
-                    elif "rfoot" in tmp[i]:
-                        n_foot += 1
-                        if n_foot > 2:
-                            robot.has_extra_foot = True
-                        robot.rfootIndex = i-1
-                        robot.rfoot_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("rfoot")
-                    elif "lthigh" in tmp[i]:
-                        robot.lthighIndex = i-1
-                        robot.lthigh_pos = position_to_array(tmp[i-1])
-                        robot.init_thigh(robot.lthigh_pos, False)
-                        robot.add_joint("lthigh")
-                    elif "lshank" in tmp[i]:
-                        robot.lshankIndex = i-1
-                        robot.lshank_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("lshank")
-                    elif "lfoot" in tmp[i]:
-                        n_foot += 1
-                        if n_foot > 2:
-                            robot.has_extra_foot = True
-                        robot.lfootIndex = i-1
-                        robot.lfoot_pos = position_to_array(tmp[i-1])
-                        robot.add_joint("lfoot")
-
-            for pos, i, foot_dir in tmp5:
-                position_array = position_to_array(pos)
-                position = Position(position=position_array, timestamp=timestamp)
-                robotID = ""
-                for j in range(i, 0, -1):
-                    if re.search("naobody", tmp[j]):
-                        id_node = re.findall(pattern, tmp[j])[0]
-                        l = id_node.split(" ")
-                        robotID = l[1] + l[2]
-                        for player in entities[1:]:
-                            if player.id == robotID:
-                                if re.search("lfoot", foot_dir):
-                                    player.add_position_lfoot(position)
-                                    player.lfootIndex = i
-                                else:
-                                    player.add_position_rfoot(position)
-                                    player.rfootIndex = i
-                                break
-                        break
-
-
-            messages, form, form_players = process(entities, fieldParams, goalParams, timestamp, events_dict, formation_counts, form, form_players)
-            events += messages
-
-            
-            break
-
-    for line in log:
-        count += 1
-        line = line.decode()
-        new_timestamp = float(re.findall("time \d+[.]?\d*", line)[0].split(" ")[1])
-        if new_timestamp != timestamp:
-            break
-
-    #output.append(f"S {timestamp} {play_modes[curr_playmode]} 0 0\n")
-    #for i in range(count):
-    #output.extend([ent.to_replay() for ent in entities])
-
-    old_timestamp = timestamp
-    count = 0
-    for line in log:
-        
-        line = line.decode()
-        new_timestamp = float(re.findall("time \d+[.]?\d*", line)[0].split(" ")[1])
-        if new_timestamp==timestamp:
-            continue
-        timestamp = float(re.findall("time \d+[.]?\d*", line)[0].split(" ")[1])
-
-        if old_timestamp == timestamp:
-            break
-        old_timestamp = timestamp
-        # print(timestamp)
-        # if timestamp > 5:
-            
-        #     # for ent in entities[1:]:
-        #     #     print(f"{ent.id}, time: {ent.joint_time/ent.count}, {ent.rthigh_time/ent.rthigh_count}, {ent.lthigh_time/ent.lthigh_count}")
-        #     #     print(f"{ent.id}, time: {ent.joint_time}, {ent.rthigh_time}, {ent.lthigh_time}")
-
-
-        #     break
-
-
-        if not skip_flg or not count % skip == 0:
-            tmp = re.split("\(nd", line)
-            had_changes = [False] * len(entities)
-            for idx in range(len(entities)):
-                entity = entities[idx]
-                i = entity.index
-                o = entity.offset
-
-                if tmp[i - o]:
-                    had_changes[idx] = True
-                    new_pos = Position(position=position_to_array(tmp[i - o].strip()), timestamp=timestamp)
-                    entity.add_position(new_pos)
-
-                if not isinstance(entity, Ball):
-                    rIndex = entity.rfootIndex
-                    lIndex = entity.lfootIndex
-
-                    if createReplay:
-
-                        headIndex = entity.headIndex
-                        rupperarmIndex = entity.rupperarmIndex
-                        rlowerarmIndex = entity.rlowerarmIndex
-                        lupperarmIndex = entity.lupperarmIndex
-                        llowerarmIndex = entity.llowerarmIndex
-                        rthighIndex = entity.rthighIndex
-                        rshankIndex = entity.rshankIndex
-                        lthighIndex = entity.lthighIndex
-                        lshankIndex = entity.lshankIndex
-
-                        rfootIndex = entity.rfootIndex
-                        lfootIndex = entity.lfootIndex
-
-                        if tmp[headIndex]:
-                            #print(tmp)
-                            #had_changes[idx] = True
-                            entity.head_pos = position_to_array(tmp[headIndex].strip())
-                            entity.add_joint("head")
-                        if tmp[rupperarmIndex]:
-                            #had_changes[idx] = True
-                            entity.rupperarm = position_to_array(tmp[rupperarmIndex].strip())
-                            entity.add_joint("rupperarm")
-                        if tmp[rlowerarmIndex]:
-                            #had_changes[idx] = True
-                            entity.rlowerarm = position_to_array(tmp[rlowerarmIndex].strip())
-                            entity.add_joint("rlowerarm")
-                        if tmp[lupperarmIndex]:
-                            #had_changes[idx] = True
-                            entity.lupperarm = position_to_array(tmp[lupperarmIndex].strip())
-                            entity.add_joint("lupperarm")
-                        if tmp[llowerarmIndex]:
-                            #had_changes[idx] = True
-                            entity.llowerarm = position_to_array(tmp[llowerarmIndex].strip())
-                            entity.add_joint("llowerarm")
-                        if tmp[rthighIndex]:
-                            #had_changes[idx] = True
-                            entity.rthigh = position_to_array(tmp[rthighIndex].strip())
-                            entity.add_joint("rthigh")
-                        if tmp[rshankIndex]:
-                            #had_changes[idx] = True
-                            entity.rshank = position_to_array(tmp[rshankIndex].strip())
-                            entity.add_joint("rshank")
-                        if tmp[lthighIndex]:
-                            had_changes[idx] = True
-                            entity.lthigh = position_to_array(tmp[lthighIndex].strip())
-                            entity.add_joint("lthigh")
-                        if tmp[lshankIndex]:
-                            #had_changes[idx] = True
-                            entity.lshank = position_to_array(tmp[lshankIndex].strip())
-                            entity.add_joint("lshank")
-
-                    if tmp[rIndex]:
-                        had_changes[idx] = True
-                        new_pos = Position(position=position_to_array(tmp[rIndex].strip()), timestamp=timestamp)
-                        entity.add_position_rfoot(new_pos)
-                        entity.rfoot = position_to_array(tmp[rIndex].strip())
-                        if createReplay:
-                            entity.add_joint("rfoot")
-                    if tmp[lIndex]:
-                        had_changes[idx] = True
-                        new_pos = Position(position=position_to_array(tmp[lIndex].strip()), timestamp=timestamp)
-                        entity.add_position_lfoot(new_pos)
-                        entity.lfoot = position_to_array(tmp[lIndex].strip())
-                        if createReplay:
-                            entity.add_joint("lfoot")
-
-            # If at least one entity has an updated value, other entities who didn't update should repeat the last position
-            if any(had_changes):
-                for idx in range(len(entities)):
-                    if not had_changes[idx]:
-                        entity = entities[idx]
-                        new_pos = copy.deepcopy(entity.positions[-1])
-                        new_pos.timestamp = timestamp
-                        entity.add_position(new_pos)
-
-                        if not isinstance(entity, Ball):
-                            new_pos = copy.deepcopy(entity.positions_rfoot[-1])
-                            new_pos.timestamp = timestamp
-                            entity.add_position_rfoot(new_pos)
-
-                            new_pos = copy.deepcopy(entity.positions_lfoot[-1])
-                            new_pos.timestamp = timestamp
-                            entity.add_position_lfoot(new_pos)
-
-
-            messages, form, form_players = process(entities, fieldParams, goalParams, timestamp, events_dict, formation_counts, form, form_players)
-            events += messages
-
-            output.append(f"S {timestamp} {play_modes[curr_playmode]} 0 0\n")
-            output.extend([ent.to_replay() for ent in entities])
-        count += 1
-
-        # if count == 1000:  # 1000 ~= 40 seg
-        #     break
+                output.extend(match.replay_frame(frame.play_mode))
+
+        if checkpoint is not None and frame_batch[-1].index - last_checkpoint >= checkpoint_every:
+            Checkpoint(match, events, sampler, frame_batch[-1], fingerprint).save(checkpoint)
+            last_checkpoint = frame_batch[-1].index
+
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    if batch:
+        events, form, form_players = detect_match(entities, fieldParams, goalParams, timestamps, lengths, detectors)
+    else:
+        form, form_players = match.form, match.form_players
 
     tik1 = time.time()
     replayfile = None
@@ -382,12 +222,18 @@ def process_log(log, prefix1="/djangoProject/commentator_website_backend/busines
         replayfile.write("".join([x for x in output]))
         replayfile.close()
     tok1 = time.time()
-    print("Writing time:", tok1 - tik1)
+    logger.debug("Writing time: %s", tok1 - tik1)
 
     #replayfile.close()
     tok = time.time()
     elapsed = tok - tik
-    print("Event detection in:", elapsed)
+    logger.debug("Event detection in: %s", elapsed)
+    if logger.isEnabledFor(logging.DEBUG):  # the tables are only built if they're logged
+        logger.debug(detectors.report())
+        if sampler is not None:
+            logger.debug(sampler.report())
+    if createReplay:
+        logger.debug("Joint angles in: %s thighs: %s", match.joint_angles.time, match.joint_angles.thigh_time)
     # Formation debug prints
     # print("Formation for teamA:", form[0])
     # print("Formation for teamB:", form[1])
@@ -409,13 +255,14 @@ def process_log(log, prefix1="/djangoProject/commentator_website_backend/busines
     # print(len(analytics_log))
     tok = time.time()
     elapsed2 = tok - tik
-    print("Analytics gathered in:", elapsed2)
-    print("Total processing time:", elapsed+elapsed2)
+    logger.debug("Analytics gathered in: %s", elapsed2)
+    logger.debug("Total processing time: %s", elapsed+elapsed2)
     
     return events, analytics_log, form, form_players, [left, right], replayfile
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)  # the timings
     log = open("test1.log", "r")
     
     skip_lines = 1
@@ -0,0 +1,161 @@
+import re
+
+# Sparkmonitor lines look like "((time 12.3)(play_mode 3)...)(RDS 0 1)((nd ...)(nd)...)".
+# Everything before the first "(nd" is the frame header, the rest is the scene graph.
+NODE_SEPARATOR = b"(nd"
+BALL_MESH = b"soccerball.obj"
+BODY_MESH = b"models/naobody"
+TEAM_MATERIAL = b"matTeam"
+N_MESHES = 23  # 1 ball + 22 robots
+
+TIME_PATTERN = re.compile(rb"\(time (\d+[.]?\d*)")
+PLAY_MODE_PATTERN = re.compile(rb"\(play_mode (\d+)\)")
+# How the lines after the first full frame start, both values are read with a single match
+FRAME_HEADER_PATTERN = re.compile(rb"\(\(time (\d+[.]?\d*)\)\(play_mode (\d+)\)")
+PLAY_MODES_PATTERN = re.compile(rb"\(play_modes ([^)]*)\)")
+TEAM_LEFT_PATTERN = re.compile(rb"\(team_left ([^)]*)\)")
+TEAM_RIGHT_PATTERN = re.compile(rb"\(team_right ([^)]*)\)")
+PARAM_PATTERN = re.compile(rb"\((\w+) ([^()]*)\)")
+
+REPLAY_PARAMS = ["BorderSize", "FreeKickDistance", "WaitBeforeKickOff", "AgentRadius", "BallRadius", "BallMass",
+                 "RuleGoalPauseTime", "RuleKickInPauseTime", "RuleHalfTime", "half", "score_left", "score_right"]
+
+
+class LogHeader():
+    """Field, goal and replay parameters, play mode names and team names of a log."""
+    def __init__(self, field, goal, replay, play_modes, teams):
+        self.field = field
+        self.goal = goal
+        self.replay = replay
+        self.play_modes = play_modes
+        self.teams = teams
+
+
+class Frame():
+    """One frame of the log. `nodes` is the line split on "(nd", so nodes[0] is the frame header
+    and an empty node means that the scene graph node didn't change since the previous frame.
+    Frames of the tokenizer keep their `line` and only split it when `nodes` is read, decode_frames
+    reads the matrices from the line."""
+    __slots__ = ("timestamp", "play_mode", "_nodes", "line", "full", "offset", "index")
+
+    def __init__(self, timestamp, play_mode, nodes, full=False, line=None):
+        self.timestamp = timestamp
+        self.play_mode = play_mode
+        self._nodes = nodes
+        self.line = line
+        self.full = full
+        # Where the next line starts in the log and number of the frame, only set in runs with checkpoints
+        self.offset = None
+        self.index = None
+
+    @property
+    def nodes(self):
+        if self._nodes is None and self.line is not None:
+            self._nodes = self.line.split(NODE_SEPARATOR)
+        return self._nodes
+
+    def __str__(self):
+        return f"Frame: {self.timestamp}, play_mode {self.play_mode}, {len(self.nodes)} nodes, full={self.full}"
+
+
+def split_header(line):
+    """Returns the header of a line, i.e. everything before the scene graph."""
+    end = line.find(NODE_SEPARATOR)
+    return line if end < 0 else line[:end]
+
+
+def parse_params(header):
+    """Parses the ((FieldLength 30)(FieldWidth 20)...) header of the log."""
+    params = {name.decode(): value.decode() for name, value in PARAM_PATTERN.findall(header)}
+
+    field = {"length": float(params["FieldLength"]), "width": float(params["FieldWidth"]),
+             "height": float(params["FieldHeight"])}
+    goal = {"width": float(params["GoalWidth"]), "depth": float(params["GoalDepth"]),
+            "height": float(params["GoalHeight"])}
+    replay = {name: params.get(name) for name in REPLAY_PARAMS}
+    return field, goal, replay
+
+
+def is_full_frame(line):
+    """A full frame describes the whole scene graph, with the ball and every robot already in its team."""
+    return line.count(BALL_MESH) + line.count(BODY_MESH) == N_MESHES and TEAM_MATERIAL not in line
+
+
+def tokenize_log(log):
+    """Reads the log once, line by line, and yields typed records.
+    The first record is the LogHeader, the second one is the first full Frame and the following
+    ones are the frames after it. Frames that repeat the timestamp of the previous one are dropped."""
+    field = None
+    play_modes = []
+    left = ""
+    right = ""
+    play_mode = 0
+
+    lines = iter(log)
+    for line in lines:
+        if isinstance(line, str):
+            line = line.encode()
+        header = split_header(line)
+
+        time_match = TIME_PATTERN.search(header) or TIME_PATTERN.search(line)
+        if time_match is None:
+            continue
+        new_timestamp = float(time_match.group(1))
+
+        mode_match = PLAY_MODE_PATTERN.search(header)
+        if mode_match:
+            play_mode = int(mode_match.group(1))
+
+        if field is None:
+            if b"FieldLength" not in header or b"FieldWidth" not in header:
+                continue
+            field, goal, replay = parse_params(header)
+
+        if not play_modes:
+            modes = PLAY_MODES_PATTERN.search(header)
+            if modes:
+                play_modes = modes.group(1).decode().split(" ")
+        team_left = TEAM_LEFT_PATTERN.search(header)
+        team_right = TEAM_RIGHT_PATTERN.search(header)
+        if team_left:
+            left = team_left.group(1).decode()
+        if team_right:
+            right = team_right.group(1).decode()
+
+        if not is_full_frame(line):
+            continue
+        yield LogHeader(field, goal, replay, play_modes, [left, right])
+        yield Frame(new_timestamp, play_mode, line.split(NODE_SEPARATOR), full=True, line=line)
+        yield from tokenize_frames(lines, new_timestamp, play_mode)
+        return
+
+
+def tokenize_frames(log, timestamp, play_mode):
+    """Yields the frames of the lines after a frame with the given timestamp and play mode,
+    the part of tokenize_log after the first full frame."""
+    for line in log:
+        if isinstance(line, str):
+            line = line.encode()
+        header_match = FRAME_HEADER_PATTERN.match(line)
+        if header_match:
+            time_text, mode_text = header_match.groups()
+            new_timestamp = float(time_text)
+            play_mode = int(mode_text)
+        else:
+            end = line.find(NODE_SEPARATOR)  # the header is searched in place, without copying it
+            if end < 0:
+                end = len(line)
+
+            time_match = TIME_PATTERN.search(line, 0, end) or TIME_PATTERN.search(line)
+            if time_match is None:
+                continue
+            new_timestamp = float(time_match.group(1))
+
+            mode_match = PLAY_MODE_PATTERN.search(line, 0, end)
+            if mode_match:
+                play_mode = int(mode_match.group(1))
+
+        if new_timestamp == timestamp:
+            continue
+        timestamp = new_timestamp
+        yield Frame(timestamp, play_mode, None, False, line)
@@ -0,0 +1,415 @@
+from bisect import bisect_right
+
+import numpy as np
+
+from . import heuristics
+from .aggression import AggressionTracker, pair_distances
+from .detectors import DetectorRegistry
+from .entities import Position, POSITIONS_SIZE
+from .message import Aggresion
+
+TIMELINE_CHUNK = 4096  # frames whose pairwise player distances are computed at once
+
+# Arrays of a MatchTimeline with a row per frame, and with a row per frame that has a close pair of opponents
+TIMELINE_ARRAYS = ("ball_x", "ball_y", "ball_z", "ball_time", "velocity", "ball_moving", "bodies", "body_distances",
+                   "foot_distances", "closest", "closest_a", "closest_b", "outside")
+CLOSE_PAIR_ARRAYS = ("close_times", "close", "close_first")
+
+
+def distances_to(points, positions):
+    """(F, 3) points to (F, n, 3) positions, with the order of operations of Position.distance_between."""
+    delta = points[:, None, :] - positions
+    return np.sqrt(delta[..., 0]**2 + delta[..., 1]**2 + delta[..., 2]**2)
+
+
+class MatchTimeline():
+    """What the detectors of heuristics read in each frame, for every frame of a match at once.
+    Frame f is the f-th call of heuristics.process, `lengths[f]` are the lengths of the trajectory store
+    tracks at that call (the positions[-1] of each entity) and `timestamps[f]` its timestamp.
+    Once built it doesn't need the entities or their store, so the timelines of consecutive parts of a match
+    can be built apart and joined with concatenate."""
+    def __init__(self, entities, field, goal, timestamps, lengths, distance_margin=None):
+        ball = entities[0]
+        players = entities[1:]
+        store = ball.store
+        assert store.history is None, "Whole match detection needs the whole trajectory of the match"
+
+        self.timestamps = list(timestamps)
+        self.n_frames = len(self.timestamps)
+        self.n_a = len(entities[1:12])
+
+        rows = np.asarray(lengths).reshape(self.n_frames, -1) - 1
+        ball_rows = rows[:, ball.track]
+        self.ball_x = store.x[ball.track, ball_rows]
+        self.ball_y = store.y[ball.track, ball_rows]
+        self.ball_z = store.z[ball.track, ball_rows]
+        self.ball_time = store.time[ball.track, ball_rows]
+        ball_xyz = np.stack([self.ball_x, self.ball_y, self.ball_z], axis=1)
+
+        # Entity.get_current_velocity, 0 until there are 2 positions
+        has_previous = ball_rows > 0
+        previous = np.maximum(ball_rows - 1, 0)
+        dx = self.ball_x - store.x[ball.track, previous]
+        dy = self.ball_y - store.y[ball.track, previous]
+        dz = self.ball_z - store.z[ball.track, previous]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocity = np.sqrt(dx**2 + dy**2 + dz**2) / (self.ball_time - store.time[ball.track, previous])
+        self.velocity = np.where(has_previous, velocity, 0.0)
+        self.ball_moving = np.floor(self.velocity * 100) / 100.0 != 0  # how detect_pass_or_dribble rounds it
+
+        self.is_in_goal_direction = {team_right: self._goal_direction(ball, previous, team_right, field, goal)
+                                     for team_right in (False, True)}
+
+        # Ball to player distances, the FrameGeometry of every frame
+        body_tracks = [player.track for player in players]
+        body_rows = rows[:, body_tracks]
+        self.bodies = np.stack([store.x[body_tracks, body_rows], store.y[body_tracks, body_rows],
+                                store.z[body_tracks, body_rows]], axis=2)
+        self.body_distances = distances_to(ball_xyz, self.bodies)
+        self.foot_distances = np.minimum(self._feet_distances(store, ball_xyz, rows, players, "rfoot_track"),
+                                         self._feet_distances(store, ball_xyz, rows, players, "lfoot_track"))
+        self.closest = np.argmin(self.body_distances, axis=1)
+        self.closest_a = np.argmin(self.body_distances[:, :self.n_a], axis=1)
+        self.closest_b = self.n_a + np.argmin(self.body_distances[:, self.n_a:], axis=1)
+
+        self.outside = (np.abs(self.ball_x) > field["length"] / 2) | (np.abs(self.ball_y) > field["width"] / 2)
+        # The thresholds are read from heuristics when the timeline is built, like a threshold sweep sets them
+        self._close_pairs(store, body_tracks, body_rows,
+                          heuristics.AGGRESSION_DISTANCE_MARGIN if distance_margin is None else distance_margin)
+
+    def _close_pairs(self, store, tracks, body_rows, distance_margin):
+        """Frames where a pair of opponents is close enough for an aggression, with one of them near the ball.
+        For each one, what detect_aggressions gives the AggressionTracker: the times of the recent positions
+        of the teamA players, which pairs are close in each of them and the first position that exists."""
+        n_a = self.n_a
+        n_b = len(tracks) - n_a
+        near = self.foot_distances < heuristics.AGGRESSION_DISTANCE_TO_BALL
+        frames = [np.zeros(0, dtype=np.int64)]
+        close_times = [np.zeros((0, n_a, POSITIONS_SIZE))]
+        close_pairs = [np.zeros((0, n_a, n_b, POSITIONS_SIZE), dtype=bool)]
+        close_first = [np.zeros(0, dtype=np.int64)]
+        for start in range(0, self.n_frames, TIMELINE_CHUNK):
+            chunk = np.arange(start, min(start + TIMELINE_CHUNK, self.n_frames))
+            # Recent positions of every player in each frame, oldest first, like Entity.get_recent_positions
+            n_recent = np.minimum(POSITIONS_SIZE, body_rows[chunk, 0] + 1)
+            window = body_rows[chunk][:, :, None] + (np.arange(POSITIONS_SIZE) - (POSITIONS_SIZE - 1))
+            window = np.maximum(window, 0)
+            rows = np.array(tracks)[None, :, None]
+            xyz = np.stack([store.x[rows, window], store.y[rows, window], store.z[rows, window]], axis=3)
+            times = store.time[rows[:, :n_a], window[:, :n_a]]
+
+            close = pair_distances(xyz[:, :n_a], xyz[:, n_a:]) < distance_margin
+            close &= (near[chunk, :n_a][:, :, None] | near[chunk, n_a:][:, None, :])[:, :, :, None]
+            # Positions that don't exist yet at the start of the match aren't looked at
+            close &= (np.arange(POSITIONS_SIZE) >= POSITIONS_SIZE - n_recent[:, None])[:, None, None, :]
+
+            # Nothing changes in a frame without a close pair: intervals only end in the frame after one
+            hits = np.flatnonzero(close.any(axis=(1, 2, 3)))
+            frames.append(chunk[hits])
+            close_times.append(times[hits])
+            close_pairs.append(close[hits])
+            close_first.append(POSITIONS_SIZE - n_recent[hits])
+        self.close_frames = np.concatenate(frames)
+        self.close_times = np.concatenate(close_times)
+        self.close = np.concatenate(close_pairs)
+        self.close_first = np.concatenate(close_first)
+
+    def slice(self, start, end):
+        """The frames from `start` to `end` as a timeline of their own."""
+        timeline = MatchTimeline.__new__(MatchTimeline)
+        timeline.timestamps = self.timestamps[start:end]
+        timeline.n_frames = len(timeline.timestamps)
+        timeline.n_a = self.n_a
+        for name in TIMELINE_ARRAYS:
+            setattr(timeline, name, getattr(self, name)[start:end])
+        timeline.is_in_goal_direction = {team_right: directions[start:end]
+                                         for team_right, directions in self.is_in_goal_direction.items()}
+        kept = (self.close_frames >= start) & (self.close_frames < end)
+        timeline.close_frames = self.close_frames[kept] - start
+        for name in CLOSE_PAIR_ARRAYS:
+            setattr(timeline, name, getattr(self, name)[kept])
+        return timeline
+
+    @staticmethod
+    def concatenate(timelines):
+        """Timeline of consecutive parts of a match, in order."""
+        timeline = MatchTimeline.__new__(MatchTimeline)
+        timeline.timestamps = [timestamp for part in timelines for timestamp in part.timestamps]
+        timeline.n_frames = len(timeline.timestamps)
+        timeline.n_a = timelines[0].n_a
+        for name in TIMELINE_ARRAYS + CLOSE_PAIR_ARRAYS:
+            setattr(timeline, name, np.concatenate([getattr(part, name) for part in timelines]))
+        timeline.is_in_goal_direction = {team_right: np.concatenate([part.is_in_goal_direction[team_right]
+                                                                     for part in timelines])
+                                         for team_right in (False, True)}
+        starts = np.cumsum([0] + [part.n_frames for part in timelines[:-1]])
+        timeline.close_frames = np.concatenate([part.close_frames + start for part, start in zip(timelines, starts)])
+        return timeline
+
+    def same_frames(self, other):
+        """True if both timelines have the same frames, with the same values."""
+        if self.timestamps != other.timestamps or self.n_a != other.n_a:
+            return False
+        for name in TIMELINE_ARRAYS + CLOSE_PAIR_ARRAYS + ("close_frames",):
+            if not np.array_equal(getattr(self, name), getattr(other, name), equal_nan=True):
+                return False
+        return all(np.array_equal(self.is_in_goal_direction[team_right], other.is_in_goal_direction[team_right])
+                   for team_right in (False, True))
+
+    def _feet_distances(self, store, ball_xyz, rows, players, name):
+        tracks = [getattr(player, name) for player in players]
+        feet_rows = rows[:, tracks]
+        feet = np.stack([store.x[tracks, feet_rows], store.y[tracks, feet_rows], store.z[tracks, feet_rows]], axis=2)
+        return distances_to(ball_xyz, feet)
+
+    def _goal_direction(self, ball, previous, teamRight, field, goal):
+        """Ball.is_in_goal_direction of every frame."""
+        store = ball.store
+        x_i = store.x[ball.track, previous]
+        y_i = store.y[ball.track, previous]
+        delta_x = self.ball_x - x_i
+        direction_right = delta_x > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m = (self.ball_y - y_i) / delta_x
+            b = y_i - (m * x_i)
+            operand = 1 if teamRight else -1
+            intersection = m * ((field["length"] / 2) * operand) + b
+            return (delta_x != 0) & (direction_right == teamRight) & (np.abs(intersection) < goal["width"] / 2)
+
+    def formation_areas(self, field):
+        """Area (0 defender, 1 midfielder, 2 forward, -1 none) that update_formation counts for each
+        player in each frame, -1 too when the team isn't counted in that frame."""
+        length = field["length"]
+        left, rangeLeft = heuristics.areas_at(self.ball_x, False, field)
+        _, rangeRight = heuristics.areas_at(self.ball_x, True, field)
+
+        # Both teams are placed with the areas of the left team, as update_formation does
+        x = self.bodies[:, :, 0]
+        areas = np.full(x.shape, -1)
+        for i in reversed(range(3)):
+            low, high = left[i]
+            low = np.broadcast_to(low, self.ball_x.shape)[:, None]
+            high = np.broadcast_to(high, self.ball_x.shape)[:, None]
+            areas[(low < x) & (x < high)] = i
+        areas[~(rangeLeft > length * heuristics.FORMATION_AREA), :self.n_a] = -1
+        areas[~(rangeRight > length * heuristics.FORMATION_AREA), self.n_a:] = -1
+        return areas
+
+
+class TimelineGeometry():
+    """The FrameGeometry of the frame `frame` of a MatchTimeline, so the detectors of heuristics can run over
+    the timeline."""
+    def __init__(self, timeline, teamA, teamB):
+        self.teamA = teamA
+        self.teamB = teamB
+        self.players = teamA + teamB
+        self.columns = {player: i for i, player in enumerate(self.players)}
+        self.frame = 0
+
+        # Python lists are much faster than NumPy scalars in the frame loop
+        self.closest = timeline.closest.tolist()
+        self.closest_a = timeline.closest_a.tolist()
+        self.closest_b = timeline.closest_b.tolist()
+        self.foot_distances = timeline.foot_distances.tolist()
+        self.velocity = timeline.velocity.tolist()
+        self.ball_x = timeline.ball_x.tolist()
+        self.ball_y = timeline.ball_y.tolist()
+        self.ball_z = timeline.ball_z.tolist()
+        self.ball_time = timeline.ball_time.tolist()
+        self.goal_direction = {team_right: directions.tolist()
+                               for team_right, directions in timeline.is_in_goal_direction.items()}
+
+    def ball_position(self):
+        frame = self.frame
+        return Position(self.ball_x[frame], self.ball_y[frame], self.ball_z[frame], self.ball_time[frame])
+
+    def ball_velocity(self):
+        return self.velocity[self.frame]
+
+    def is_in_goal_direction(self, teamRight, field, goal):
+        return self.goal_direction[teamRight][self.frame]
+
+    def distance_from(self, player):
+        return self.foot_distances[self.frame][self.columns[player]]
+
+    def closest_player(self, players=None):
+        if players is None or players is self.players:
+            return self.players[self.closest[self.frame]]
+        if players is self.teamA:
+            return self.players[self.closest_a[self.frame]]
+        if players is self.teamB:
+            return self.players[self.closest_b[self.frame]]
+        return min(players, key=self.distance_from)
+
+    def closest_per_team(self):
+        return self.closest_player(self.teamA), self.closest_player(self.teamB)
+
+    def in_contact(self, distance, players=None):
+        players = self.players if players is None else players
+        distances = self.foot_distances[self.frame]
+        return [player for player in players if distances[self.columns[player]] < distance]
+
+    def any_contact(self, distance, players=None):
+        return bool(self.in_contact(distance, players))
+
+
+class Intervals():
+    """Runs of consecutive frames where `mask` is True, as the frames where they start and end (excluded)."""
+    def __init__(self, mask):
+        edges = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+        # Python lists are much faster than NumPy scalars in the frame loop
+        self.starts = edges[::2].tolist()
+        self.ends = edges[1::2].tolist()
+        self.n_frames = len(mask)
+
+    def next(self, frame):
+        """First frame from `frame` on in some interval, n_frames if there's none."""
+        k = bisect_right(self.ends, frame)
+        return max(self.starts[k], frame) if k < len(self.starts) else self.n_frames
+
+
+class MatchDetector():
+    """Runs the detectors of heuristics.process over a MatchTimeline. The geometry of every frame is already
+    computed, so what is left in the loop is the event state machine of heuristics.detect_events.
+    The state machine only changes in the frames with a contact, with the ball out of the field, stopped or in
+    the goal shot area, or when a kick off times out. Those intervals are found for the whole timeline at once,
+    and the loop jumps from a frame to the next one that can change the current state: nothing happens
+    in the frames in between. Aggressions and the formation are detected after it, for the whole match at once."""
+    def __init__(self, entities, field, goal, timeline, detectors=None):
+        self.entities = entities
+        self.detectors = DetectorRegistry() if detectors is None else detectors
+        self.ball = entities[0]
+        self.players = entities[1:]
+        self.teamA = entities[1:12]
+        self.teamB = entities[12:]
+        self.field = field
+        self.goal = goal
+        self.timeline = timeline
+        self.events = {}
+        self.in_game = np.zeros(timeline.n_frames, dtype=bool)  # frames where process runs every detector
+        self.timeout = None  # kick off that is awaited, and the frame where it times out
+
+    def run(self):
+        """Returns the messages, in the order heuristics.process would have returned them."""
+        before = {}  # frame -> messages of the detectors that run before detect_aggressions
+        after = {}
+        self._find_intervals()
+        geometry = TimelineGeometry(self.timeline, self.teamA, self.teamB)
+        timestamps = self.timeline.timestamps
+        ball = self.ball
+        ball.owner = None
+        frame = 0
+        while frame < self.timeline.n_frames:
+            following = self._next_frame(frame)
+            # The state doesn't change until the next frame that can change it
+            self.in_game[frame:following] = not any(event in self.events for event in heuristics.OUT_OF_GAME)
+            frame = following
+            if frame == self.timeline.n_frames:
+                break
+            geometry.frame = frame
+            messages, later, self.in_game[frame] = heuristics.detect_events(
+                ball, self.teamA, self.teamB, self.field, self.goal, timestamps[frame], self.events, geometry,
+                self.detectors)
+            if messages:
+                before[frame] = messages
+            if later:
+                after[frame] = later
+            frame += 1
+
+        # Aggressions don't change the other events, so they are detected after, only in the frames where
+        # a pair is close enough
+        aggressions = self.detectors.run("detect_aggressions", self.detect_aggressions, default={})
+
+        messages = []
+        for frame in sorted(set(before) | set(aggressions) | set(after)):
+            messages += before.get(frame, []) + aggressions.get(frame, []) + after.get(frame, [])
+        return messages
+
+    def _find_intervals(self):
+        """The frames where the detectors of heuristics.detect_events can change the state. The thresholds
+        are read from heuristics now, like detect_events reads them in each frame."""
+        timeline = self.timeline
+        distances = timeline.foot_distances.min(axis=1, initial=np.inf)
+        contact = (distances < heuristics.CONTACT_DISTANCE) | (distances <= heuristics.KICK_OFF_CONTACT_DISTANCE)
+        start = np.array(timeline.timestamps) == 0.0
+        # Contacts, outs and the start of the game change the state whatever it is
+        self.changes = Intervals(contact | timeline.outside | start)
+        # A ball that stops ends a dribble or pass, and an outside shot
+        self.stops = Intervals(~timeline.ball_moving | (timeline.velocity == 0))
+        # A goal shot starts when the ball heads to the goal in the half of the field before the goal line of
+        # the opponents of its owner, and ends when it doesn't: team of the owner, goal shot -> intervals
+        quarter = self.field["length"] / 4
+        self.goal_shots = {}
+        for team_right in (False, True):
+            area = timeline.ball_x < -quarter if team_right else timeline.ball_x > quarter
+            direction = timeline.is_in_goal_direction[not team_right]
+            self.goal_shots[team_right, False] = Intervals(area & direction)
+            self.goal_shots[team_right, True] = Intervals(area & ~direction)
+
+    def _next_frame(self, frame):
+        """First frame from `frame` on where some detector can change the current state."""
+        events = self.events
+        following = self.changes.next(frame)
+        if "dribble/pass" in events or any(f"{event}_shot" in events for event in ("out", "corner", "goalkeeper_out")):
+            following = min(following, self.stops.next(frame))
+        if self.ball.owner is not None:
+            following = min(following, self.goal_shots[self.ball.owner.isTeamRight, "goal_shot" in events].next(frame))
+        if "start" in events or "goal" in events or "out" in events:
+            following = min(following, self._timeout_frame(frame))
+        return following
+
+    def _timeout_frame(self, frame):
+        """First frame from `frame` on where detect_kick_off gives up on the kick off it awaits."""
+        events = self.events
+        if "start" in events:
+            awaited = ("start", None)
+        else:
+            event = "goal" if "goal" in events else "out"
+            awaited = (event, events[event].end)
+        if self.timeout is None or self.timeout[0] != awaited or self.timeout[1] < frame:
+            # The same comparisons as detect_kick_off, the frames before the timeout are all skipped
+            timestamps = np.array(self.timeline.timestamps[frame:])
+            if awaited[0] == "start":
+                late = timestamps > heuristics.KICK_OFF_TIMEOUT
+            else:
+                late = timestamps - awaited[1] > heuristics.RESTART_TIMEOUT
+            hits = np.flatnonzero(late)
+            self.timeout = (awaited, frame + int(hits[0]) if len(hits) else self.timeline.n_frames)
+        return self.timeout[1]
+
+    def formation(self):
+        """Formations and formation of each player, like the last call of update_formation."""
+        if not self.in_game.any():
+            return [], dict()
+        areas = self.timeline.formation_areas(self.field)[self.in_game]
+        formation_count = {player: {i: int((areas[:, k] == i).sum()) for i in range(3)}
+                           for k, player in enumerate(self.players)}
+        return heuristics.get_formation(self.teamA, self.teamB, formation_count)
+
+    def detect_aggressions(self):
+        """frame -> Aggressions, for the frames where every detector ran."""
+        timeline = self.timeline
+        tracker = AggressionTracker(self.teamA, self.teamB)
+        messages = {}
+        for k in np.flatnonzero(self.in_game[timeline.close_frames]):
+            first = timeline.close_first[k]
+            ended = tracker.update_close(timeline.close_times[k, :, first:], timeline.close[k, :, :, first:])
+            if ended:
+                messages[int(timeline.close_frames[k])] = [Aggresion(self.teamA[a], self.teamB[b], start_time, end_time)
+                                                           for a, b, start_time, end_time in ended]
+        return messages
+
+
+def detect_match(entities, field, goal, timestamps, lengths, detectors=None):
+    """Whole match version of calling heuristics.process in every frame, for when every frame is known in
+    advance. Returns the messages, formation and formation of each player, like the last call of process.
+    The aggressions and the formation are a single call each of `detectors`, for the whole match."""
+    return detect_timeline(entities, field, goal, MatchTimeline(entities, field, goal, timestamps, lengths), detectors)
+
+
+def detect_timeline(entities, field, goal, timeline, detectors=None):
+    """detect_match of a MatchTimeline that is already built."""
+    detector = MatchDetector(entities, field, goal, timeline, detectors)
+    messages = detector.run()
+    formation, form_players = detector.detectors.run("update_formation", detector.formation, default=([], dict()))
+    return messages, formation, form_players
@@ -0,0 +1,127 @@
+from .entities import Ball, Player, get_quaternions
+from .trajectory import TrajectoryStore, matrix_to_position
+from .heuristics import process
+from .detectors import DetectorRegistry
+from .scene_graph import get_schema, BALL_OFFSET, BODY_OFFSET
+from .frame_decoder import decode_matrix
+from .joint_angles import JointAngles
+
+REPLAY_JOINTS = ["head", "rupperarm", "rlowerarm", "lupperarm", "llowerarm", "rthigh", "rshank", "lthigh", "lshank"]
+
+
+class MatchProcessor():
+    """Entities and detector state of a match, updated one decoded frame at a time.
+    process_log feeds it the frames of a log, live.py the frames of a monitor stream."""
+    def __init__(self, header, schema, node_indices, first, timestamp, createReplay=False, history=None, detectors=None):
+        self.header = header
+        self.schema = schema
+        self.node_indices = node_indices
+        self.slots = {node: k for k, node in enumerate(node_indices)}
+        self.createReplay = createReplay
+        self.joint_angles = JointAngles()  # of the replay, computed together for each frame
+        self.store = TrajectoryStore(history=history)
+        self.detectors = DetectorRegistry() if detectors is None else detectors
+        self.timestamp = timestamp
+        self.first = first  # node -> matrix of the first frame
+
+        # Detector state, kept between calls of heuristics.process
+        self.events = {}
+        self.formation_counts = {}
+        self.form = []
+        self.form_players = dict()
+
+        self.ball = Ball("ball", schema.ball_index, BALL_OFFSET, self.store)
+        self.ball.update(first[schema.ball], timestamp)
+        self.entities = [self.ball]
+
+        for player in schema.players:
+            robot = Player(id=player.id, index=player.index, offset=BODY_OFFSET, team=player.isTeamRight, store=self.store)
+            robot.update(first[player.body], timestamp)
+            robot.has_extra_foot = player.has_extra_foot
+            self.entities.append(robot)
+
+            if createReplay:
+                for name, node in player.joints.items():
+                    setattr(robot, f"{name}Index", node)
+                    setattr(robot, f"{name}_pos", first[node])
+                    if name in ("rthigh", "lthigh"):
+                        robot.init_thigh(getattr(robot, f"{name}_pos"), name == "rthigh")
+                    self.joint_angles.request(robot, name)
+
+            robot.rfootIndex = player.joints["rfoot"]
+            robot.lfootIndex = player.joints["lfoot"]
+            robot.add_position_rfoot(matrix_to_position(first[robot.rfootIndex], timestamp))
+            robot.add_position_lfoot(matrix_to_position(first[robot.lfootIndex], timestamp))
+        self.players = self.entities[1:]
+
+    @staticmethod
+    def from_frame(header, frame, createReplay=False, history=None, detectors=None, all_nodes=False):
+        """Starts a match from its first full Frame. With `all_nodes`, the joints are decoded even
+        without createReplay."""
+        schema = get_schema(frame.nodes)
+        node_indices = schema.tracked_nodes(createReplay or all_nodes)
+        first = {node: decode_matrix(frame.nodes[node]) for node in node_indices}
+        return MatchProcessor(header, schema, node_indices, first, frame.timestamp, createReplay, history, detectors)
+
+    def update(self, timestamp, changed, matrices):
+        """Updates the entities with a decoded frame, `changed` and `matrices` are indexed like node_indices."""
+        self.timestamp = timestamp
+        slots = self.slots
+        entities = self.entities
+        had_changes = [False] * len(entities)
+        for idx in range(len(entities)):
+            entity = entities[idx]
+            k = slots[entity.index - entity.offset]
+
+            if changed[k]:
+                had_changes[idx] = True
+                entity.update(matrices[k], timestamp)
+
+            if entity is self.ball:
+                continue
+            rIndex = slots[entity.rfootIndex]
+            lIndex = slots[entity.lfootIndex]
+
+            if self.createReplay:
+                for name in REPLAY_JOINTS:
+                    joint = slots[getattr(entity, f"{name}Index")]
+                    if changed[joint]:
+                        if name == "lthigh":
+                            had_changes[idx] = True
+                        setattr(entity, "head_pos" if name == "head" else name, matrices[joint])
+                        self.joint_angles.request(entity, name)
+
+            if changed[rIndex]:
+                had_changes[idx] = True
+                entity.add_position_rfoot(matrix_to_position(matrices[rIndex], timestamp))
+                entity.rfoot = matrices[rIndex]
+                if self.createReplay:
+                    self.joint_angles.request(entity, "rfoot")
+            if changed[lIndex]:
+                had_changes[idx] = True
+                entity.add_position_lfoot(matrix_to_position(matrices[lIndex], timestamp))
+                entity.lfoot = matrices[lIndex]
+                if self.createReplay:
+                    self.joint_angles.request(entity, "lfoot")
+
+        # If at least one entity has an updated value, other entities who didn't update should repeat the last position
+        if any(had_changes):
+            self.store.carry_forward([track for idx in range(len(entities)) if not had_changes[idx]
+                                      for track in entities[idx].tracks()], timestamp)
+
+    def detect(self):
+        """Runs the detectors on the current frame and returns the new messages."""
+        messages, self.form, self.form_players = process(self.entities, self.header.field, self.header.goal,
+                                                         self.timestamp, self.events, self.formation_counts,
+                                                         self.form, self.form_players, self.detectors)
+        return messages
+
+    def replay_frame(self, play_mode):
+        """Lines of the current frame in the replay file. The quaternions of the entities that moved since the
+        last frame are computed together, and so are the angles of the joints that changed."""
+        self.joint_angles.flush()
+        moved = [ent for ent in self.entities if ent.quartenion is None]
+        if moved:
+            for ent, quaternion in zip(moved, get_quaternions([ent.cur_pos for ent in moved])):
+                ent.quartenion = quaternion
+        return [f"S {self.timestamp} {self.header.play_modes[play_mode]} 0 0\n"] + [ent.to_replay() for ent in self.entities]
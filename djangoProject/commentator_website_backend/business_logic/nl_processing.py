@@ -1422,8 +1422,9 @@ lines = {
 }
 
 
-def generate_script(events, stats, agr_frnd_mod, en_calm_mod, bias, teams):
-    player_name_map = generate_player_names() # ran at the start and fixed for the rest of the duration
+def generate_script(events, stats, agr_frnd_mod, en_calm_mod, bias, teams, player_name_map=None):
+    if player_name_map is None:
+        player_name_map = generate_player_names() # ran at the start and fixed for the rest of the duration
     # print(f"generate_script {stats = }")
     commentary = []
     for event in events:
@@ -1472,7 +1473,7 @@ def get_stats(timestamp : float, stats : dict):
 
     # print(f"get_stats {stats = }")
 
-    if timestamp < float(timestamps[0]):
+    if not timestamps or timestamp < float(timestamps[0]):  # no stats yet, at the start of a live match
         return None
 
     last = timestamps[0]
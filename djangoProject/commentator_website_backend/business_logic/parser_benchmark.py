@@ -0,0 +1,95 @@
+import re
+import sys
+import time
+
+from .frame_decoder import decode_frames
+from .log_io import open_log_stream
+from .log_processing import batch_frames
+from .log_tokenizer import tokenize_log, is_full_frame
+from .scene_graph import get_schema
+
+BENCHMARK_REPEAT = 3
+
+
+class ParserResult():
+    """Frames per second of a parser over the frames after the first full frame of a log. `changed` is the
+    number of tracked nodes it decoded and `total` the sum of their matrices, to check both parsers read the same."""
+    def __init__(self, parser, frames, changed, total, seconds):
+        self.parser = parser
+        self.frames = frames
+        self.changed = changed
+        self.total = total
+        self.seconds = seconds
+        self.frames_per_second = frames / seconds
+
+    def __repr__(self):
+        return f"{self.parser}: {self.frames} frames, {self.frames_per_second:.0f} frames/s"
+
+
+def position_to_array(position):
+    """The float parsing of the old process_log."""
+    return [float(numb) for numb in re.findall(r"[-]?\d+[.]?\d*[eE]?[-]?\d*", position)]
+
+
+def baseline_parse(lines, indices):
+    """The per-line work of the frame loop of the old process_log: the line is decoded, its time found
+    twice with re.findall, split with re.split and the tracked nodes that changed converted to floats."""
+    frames = changed = 0
+    total = 0.0
+    timestamp = None
+    for line in lines:
+        line = line.decode()
+        new_timestamp = float(re.findall(r"time \d+[.]?\d*", line)[0].split(" ")[1])
+        if new_timestamp == timestamp:
+            continue
+        timestamp = float(re.findall(r"time \d+[.]?\d*", line)[0].split(" ")[1])
+        tmp = re.split(r"\(nd", line)
+        for i in indices:
+            if tmp[i]:
+                changed += 1
+                total += sum(position_to_array(tmp[i].strip())[:16])
+        frames += 1
+    return frames, changed, total
+
+
+def parse(lines, indices):
+    """tokenize_log and decode_frames, as process_log reads a log."""
+    frames = tokenize_log(lines)
+    next(frames)
+    next(frames)
+    n_frames = changed = 0
+    total = 0.0
+    for batch in batch_frames(frames):
+        batch_changed, matrices = decode_frames(batch, indices)
+        n_frames += len(batch)
+        changed += int(batch_changed.sum())
+        total += float(matrices[batch_changed].sum())
+    return n_frames, changed, total
+
+
+def benchmark(log, repeat=BENCHMARK_REPEAT):
+    """Parses the log in memory with the old loop and with the tokenizer and decoder, returns a ParserResult
+    per parser with the best time of `repeat` runs. The nodes are the ones process_log tracks without replay."""
+    lines = [line.encode() if isinstance(line, str) else line for line in open_log_stream(log)]
+    first = next(i for i, line in enumerate(lines) if is_full_frame(line))
+    indices = get_schema(lines[first].split(b"(nd")).tracked_nodes(False)
+
+    results = []
+    for name, parser, parser_lines in (("baseline", baseline_parse, lines[first + 1:]), ("tokenizer", parse, lines)):
+        seconds = float("inf")
+        for _ in range(repeat):
+            tic = time.perf_counter()
+            counts = parser(parser_lines, indices)
+            seconds = min(seconds, time.perf_counter() - tic)
+        results.append(ParserResult(name, *counts, seconds))
+    return results
+
+
+if __name__ == "__main__":
+    # python -m commentator_website_backend.business_logic.parser_benchmark log [repeat]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else BENCHMARK_REPEAT
+    with open(sys.argv[1], "rb") as log:
+        baseline, tokenizer = benchmark(log, repeat)
+    print(baseline)
+    print(tokenizer)
+    print(f"{tokenizer.frames_per_second / baseline.frames_per_second:.1f}x")
@@ -0,0 +1,143 @@
+import hashlib
+import re
+
+from .log_tokenizer import BALL_MESH
+
+BODY_NODE = b"naobody"
+# Order matters, a node is classified by the first name it contains
+JOINT_NAMES = ["head", "rupperarm", "rlowerarm", "lupperarm", "llowerarm", "rthigh", "rshank", "rfoot", "lthigh",
+               "lshank", "lfoot"]
+JOINT_NODES = [(name, name.encode()) for name in JOINT_NAMES]
+# How many nodes above the mesh node is the transformation of each body part
+BALL_OFFSET = 1
+BODY_OFFSET = 2
+JOINT_OFFSETS = {name: 2 if name == "head" else 1 for name in JOINT_NAMES}
+
+RESET_MATERIALS_PATTERN = re.compile(rb"\(resetMaterials .*?\)")
+MESH_NODE = b"(load "
+# Numbers that aren't part of a name (matNum1 keeps its 1), removed to get the layout of the scene
+NUMBER_PATTERN = re.compile(rb"(?<![\w.])[-+]?\d+[.]?\d*(?:[eE][-+]?\d+)?")
+SCHEMA_CACHE_SIZE = 32
+
+schema_cache = {}
+
+
+class PlayerSchema():
+    def __init__(self, id, index):
+        self.id = id
+        self.isTeamRight = True if "Right" in id else False
+        self.index = index  # node of the naobody mesh
+        self.body = index - BODY_OFFSET
+        self.joints = {}  # joint name -> node with its transformation, in scene graph order
+        self.has_extra_foot = False
+
+
+class SceneSchema():
+    """Maps scene graph node indices to (entity, body part). Built once from the first full frame
+    and reused for every frame, and every log with the same scene layout."""
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.ball_index = None  # node of the soccerball mesh
+        self.ball = None
+        self.players = []
+        self.parts = {}  # node -> (entity position, body part), the ball is entity 0
+
+    def add_part(self, node, entity, part):
+        self.parts[node] = (entity, part)
+
+    def tracked_nodes(self, createReplay=False):
+        """Returns the indices of the scene graph nodes that are read on every frame."""
+        nodes = [self.ball]
+        for player in self.players:
+            nodes.append(player.body)
+            nodes += [player.joints["rfoot"], player.joints["lfoot"]]
+            if createReplay:
+                nodes += [node for name, node in player.joints.items() if name not in ("rfoot", "lfoot")]
+        return list(dict.fromkeys(nodes))
+
+    def to_json(self):
+        return {
+            "fingerprint": self.fingerprint,
+            "ball_index": self.ball_index,
+            "players": [{"id": player.id, "index": player.index, "joints": player.joints,
+                         "has_extra_foot": player.has_extra_foot} for player in self.players],
+        }
+
+    @staticmethod
+    def from_json(data):
+        schema = SceneSchema(data["fingerprint"])
+        schema.ball_index = data["ball_index"]
+        schema.ball = schema.ball_index - BALL_OFFSET
+        schema.add_part(schema.ball, 0, "ball")
+        for player_data in data["players"]:
+            player = PlayerSchema(player_data["id"], player_data["index"])
+            player.has_extra_foot = player_data["has_extra_foot"]
+            schema.players.append(player)
+            schema.add_part(player.body, len(schema.players), "body")
+            for name, node in player_data["joints"].items():
+                player.joints[name] = node
+                schema.add_part(node, len(schema.players), name)
+        return schema
+
+
+def fingerprint(nodes):
+    """Hash of the scene layout: where the mesh nodes are and what they load, without numbers. It's all that
+    build_schema reads, so the transformation nodes between them can be the ones of a full frame or the
+    deltas in a keyframe of a LogIndex."""
+    digest = hashlib.sha1()
+    for i, node in enumerate(nodes):
+        if MESH_NODE in node:
+            digest.update(b"%d" % i)
+            digest.update(NUMBER_PATTERN.sub(b"", node))
+    return digest.hexdigest()
+
+
+def build_schema(nodes, fingerprint=None):
+    schema = SceneSchema(fingerprint)
+    player = None
+    n_foot = 0
+
+    for i, node in enumerate(nodes):
+        if BALL_MESH in node:
+            if schema.ball_index is None:
+                schema.ball_index = i
+                schema.ball = i - BALL_OFFSET
+                schema.add_part(schema.ball, 0, "ball")
+            continue
+
+        if BODY_NODE in node:
+            l = RESET_MATERIALS_PATTERN.findall(node)[0].decode().split(" ")
+            player = PlayerSchema(id=l[1] + l[2], index=i)
+            schema.players.append(player)
+            schema.add_part(player.body, len(schema.players), "body")
+            n_foot = 0
+            continue
+
+        if player is None:
+            continue
+        for name, key in JOINT_NODES:
+            if key in node:
+                if name in ("rfoot", "lfoot"):
+                    n_foot += 1
+                    if n_foot > 2:
+                        player.has_extra_foot = True
+                player.joints[name] = i - JOINT_OFFSETS[name]
+                schema.add_part(i - JOINT_OFFSETS[name], len(schema.players), name)
+                break
+
+    assert schema.ball_index is not None, "Full frame has no ball"
+    for player in schema.players:
+        assert "rfoot" in player.joints and "lfoot" in player.joints, f"Robot {player.id} has no feet"
+    return schema
+
+
+def get_schema(nodes):
+    """Returns the schema of a full frame, from the cache if a log with the same layout was seen before."""
+    key = fingerprint(nodes)
+    schema = schema_cache.get(key)
+    if schema is None:
+        schema = build_schema(nodes, key)
+        if len(schema_cache) >= SCHEMA_CACHE_SIZE:
+            schema_cache.clear()
+        schema_cache[key] = schema
+    return schema
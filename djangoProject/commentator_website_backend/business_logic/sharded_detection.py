@@ -0,0 +1,141 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .analytics import get_analytics
+from .detectors import DetectorRegistry
+from .entities import POSITIONS_SIZE
+from .log_index import build_index
+from .log_processing import read_match
+from .log_tokenizer import tokenize_log
+from .match_detection import MatchTimeline, detect_timeline
+from .match_processor import MatchProcessor
+
+logger = logging.getLogger(__name__)
+
+SHARD_WORKERS = None  # processes decoding the shards, None decodes them in this process
+SHARDS_PER_WORKER = 2  # more shards than workers, so one long shard doesn't keep the others waiting
+SHARD_OVERLAP = 50  # frames read before a shard starts, from the keyframe before them
+SHARD_CHECK = 25  # last frames of the overlap, compared with the same frames of the previous shard
+GAME_PLAY_MODES = ("PlayOn", "KickOff_Left", "KickOff_Right")  # the other play modes stop the game
+
+# LogIndex of the log, in each process of the pool
+_index = None
+
+
+def shard_rows(play_modes, n_shards, overlap=SHARD_OVERLAP, stops=None):
+    """Frame rows where the shards start, at most `n_shards` of about the same length. A shard always starts
+    in a change of play mode and is at least `overlap` frames long. `stops` tells for each play mode number if
+    it stops the game: if it's given, shards start where the game stops (a goal, the ball going out...) when
+    there are any, the frames before them are of the game going on. Before a kick off everything can be
+    stopped for seconds, and the overlap would have to go further back."""
+    play_modes = np.asarray(play_modes)
+    changes = np.flatnonzero(np.diff(play_modes) != 0) + 1
+    if stops is not None:
+        stopped = np.asarray(stops)[play_modes[changes]]
+        if stopped.any():
+            changes = changes[stopped]
+    starts = [0]
+    for k in range(1, n_shards):
+        candidates = changes[changes >= starts[-1] + overlap]
+        if not len(candidates):
+            break
+        row = int(candidates[np.argmin(np.abs(candidates - k * len(play_modes) / n_shards))])
+        if row - starts[-1] >= overlap and len(play_modes) - row >= overlap:
+            starts.append(row)
+    return starts
+
+
+def _start_worker(index):
+    global _index
+    _index = index
+
+
+def shard_timeline(start, end, overlap=SHARD_OVERLAP):
+    """MatchTimeline of the frame rows from start - SHARD_CHECK to end. The log is decoded from the last
+    keyframe `overlap` frames before `start`, a keyframe has the state of every node of the scene.
+    Only the first position of each track differs from a run from the start of the log (it has the time of the
+    keyframe, not of the frame that last moved the entity), so an earlier keyframe is used until the ball and
+    every player had POSITIONS_SIZE other positions before the frames of the timeline."""
+    index = _index
+    begin = max(start - SHARD_CHECK, 0)
+    first = min(max(start - overlap, 0), begin)
+    while True:
+        keyframe_row = int(index.keyframe_rows[index.keyframe_before(first)])
+        match, timestamps, lengths = read_match(index.rows(first, end))
+        tracks = [entity.track for entity in match.entities]
+        if keyframe_row == 0 or min(lengths[begin - keyframe_row][track] for track in tracks) > POSITIONS_SIZE:
+            break
+        first = keyframe_row - 1
+    header = match.header
+    timeline = MatchTimeline(match.entities, header.field, header.goal, timestamps, lengths)
+    return timeline.slice(begin - keyframe_row, end - keyframe_row)
+
+
+def detect_sharded(index, workers=SHARD_WORKERS, overlap=SHARD_OVERLAP, detectors=None):
+    """detect_match of a whole indexed log, with the log split in time shards that are decoded in a pool of
+    `workers` processes. Decoding the frames and the geometry of the detectors is what takes the time, so that
+    is what each process does for its shard. The first SHARD_CHECK frames of a shard are also in the
+    previous one: they are dropped once they are checked to be the same, and a shard that doesn't have the same
+    frames is decoded again from the start of the log. The detectors then run once over the joined timeline,
+    so the events are the ones of a sequential run.
+    Returns the messages, formation, formation of each player, the entities and how many shards were decoded
+    again."""
+    frames = tokenize_log([index.keyframes[0]])
+    header = next(frames)
+    match = MatchProcessor.from_frame(header, next(frames))
+    stops = [mode not in GAME_PLAY_MODES for mode in header.play_modes]
+    starts = shard_rows(index.play_modes, max(workers or 1, 1) * SHARDS_PER_WORKER, overlap, stops)
+    ends = starts[1:] + [len(index)]
+    _start_worker(index)
+    if not workers or workers < 2:
+        timelines = [shard_timeline(start, end, overlap) for start, end in zip(starts, ends)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(starts)), initializer=_start_worker,
+                                 initargs=(index,)) as executor:
+            timelines = list(executor.map(shard_timeline, starts, ends, [overlap] * len(starts)))
+
+    parts = [timelines[0]]
+    recomputed = 0
+    for start, end, timeline in zip(starts[1:], ends[1:], timelines[1:]):
+        check = min(start, SHARD_CHECK)
+        previous = parts[-1]
+        if not timeline.slice(0, check).same_frames(previous.slice(previous.n_frames - check, previous.n_frames)):
+            timeline = shard_timeline(start, end, overlap=start)
+            recomputed += 1
+        parts.append(timeline.slice(check, timeline.n_frames))
+    timeline = MatchTimeline.concatenate(parts)
+    messages, formation, form_players = detect_timeline(match.entities, header.field, header.goal, timeline,
+                                                        detectors)
+    return messages, formation, form_players, match, recomputed
+
+
+def process_log_sharded(path, workers=SHARD_WORKERS, overlap=SHARD_OVERLAP, index=None, detectors=None):
+    """process_log of a stored log with detect_sharded, for a single long match on a machine with many cores.
+    `index` is the LogIndex of the log, built if it's not given. Returns what process_log does, without a
+    replay file."""
+    tik = time.time()
+    if detectors is None:
+        detectors = DetectorRegistry()
+    built = index is None
+    if built:
+        index = build_index(path)
+    try:
+        events, form, form_players, match, recomputed = detect_sharded(index, workers, overlap, detectors)
+    finally:
+        if built:
+            index.close()  # unmaps the log, an index given by the caller is left open
+    elapsed = time.time() - tik
+    logger.debug("Event detection in: %s", elapsed)
+    logger.debug("Shards decoded again: %s", recomputed)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(detectors.report())
+
+    tik = time.time()
+    analytics_log = get_analytics(events, match.entities)
+    elapsed2 = time.time() - tik
+    logger.debug("Analytics gathered in: %s", elapsed2)
+    logger.debug("Total processing time: %s", elapsed + elapsed2)
+    return events, analytics_log, form, form_players, list(match.header.teams), None
@@ -0,0 +1,96 @@
+import sys
+import time
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+from . import body2thig, body2thigh_analytic
+
+BENCHMARK_FRAMES = 200
+BENCHMARK_SEED = 0
+ANALYTIC = "analytic"  # body2thigh_analytic, the other solvers are the ones of body2thig.get_thighs
+SOLVERS = (body2thig.RANDOM_SEARCH, body2thig.NEWTON, ANALYTIC)
+
+
+class SolverResult():
+    """Accuracy and runtime of a solver of the thigh angles over a trajectory. `error` is the error the solvers
+    minimize (of the z and y axes of the thigh) and `angle_error` is how far the angles are from the ones the
+    trajectory was made with, in radians. `deterministic` tells if a second run gave the same angles."""
+    def __init__(self, solver, angles, errors, angle_errors, seconds, deterministic):
+        self.solver = solver
+        self.angles = angles
+        self.max_error = float(np.max(errors))
+        self.mean_error = float(np.mean(errors))
+        self.max_angle_error = float(np.max(angle_errors))
+        self.seconds = seconds
+        self.frame_us = seconds / len(angles) * 1e6
+        self.deterministic = deterministic
+
+    def __repr__(self):
+        return f"{self.solver}: error max {self.max_error:.2e} mean {self.mean_error:.2e}, " \
+               f"angles max {np.degrees(self.max_angle_error):.3f} deg, {self.frame_us:.0f} us/frame, " \
+               f"deterministic {self.deterministic}"
+
+
+def thigh_trajectory(n_frames=BENCHMARK_FRAMES, isRight=True, seed=BENCHMARK_SEED):
+    """Smooth angles (n_frames, 3) of the hip joints, like a walking player, and the euler angles (n_frames, 3)
+    of the thigh they give, the input of the solvers."""
+    rng = np.random.default_rng(seed)
+    amplitudes = rng.uniform(0.2, 0.7, 3)
+    periods = rng.uniform(15, 40, 3)
+    phases = rng.uniform(0, 2*np.pi, 3)
+    t = np.arange(n_frames)[:, None]
+    angles = amplitudes*np.sin(t/periods + phases)
+    euler = np.array([R.from_matrix(body2thig.hip_rotation(q, isRight)).as_euler("xyz") for q in angles])
+    return angles, euler
+
+
+def thigh_error(q, euler, isRight=True):
+    """Error of the angles q for the euler angles of the thigh, the one of body2thig.get_thighs."""
+    R_lHip = body2thig.hip_rotation(q, isRight)
+    R_rpy = R.from_euler("xyz", euler).as_matrix()
+    return np.sum((R_lHip[:, 2] - R_rpy[:, 2])**2) + np.sum((R_lHip[:, 1] - R_rpy[:, 1])**2)
+
+
+def solve(solver, euler, isRight=True):
+    """Angles (n_frames, 3) of a solver for each frame, the iterative ones start from the angles of the previous
+    frame, as in a replay."""
+    angles = []
+    prev = np.zeros(3)
+    for e in euler:
+        if solver == ANALYTIC:
+            q = body2thigh_analytic.get_thighs(e, isRight)
+        else:
+            q = body2thig.get_thighs(e, prev, isRight, solver=solver)
+        prev = np.ravel(q)
+        angles.append(prev)
+    return np.array(angles)
+
+
+def benchmark(n_frames=BENCHMARK_FRAMES, seed=BENCHMARK_SEED, solvers=SOLVERS):
+    """Runs each solver twice over the trajectory of each thigh, returns a SolverResult per solver."""
+    trajectories = [(isRight, *thigh_trajectory(n_frames, isRight, seed + isRight)) for isRight in (True, False)]
+
+    results = []
+    for solver in solvers:
+        angles, errors, angle_errors, runs = [], [], [], []
+        seconds = 0.0
+        for isRight, true_angles, euler in trajectories:
+            tic = time.perf_counter()
+            q = solve(solver, euler, isRight)
+            seconds += time.perf_counter() - tic
+            runs.append(np.array_equal(q, solve(solver, euler, isRight)))
+            angles.extend(q)
+            errors.extend(thigh_error(qi, e, isRight) for qi, e in zip(q, euler))
+            diff = (q - true_angles + np.pi) % (2*np.pi) - np.pi
+            angle_errors.extend(np.abs(diff).max(axis=1))
+        results.append(SolverResult(solver, np.array(angles), errors, angle_errors, seconds, all(runs)))
+    return results
+
+
+if __name__ == "__main__":
+    # python -m commentator_website_backend.business_logic.thigh_benchmark [frames] [solver ...]
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else BENCHMARK_FRAMES
+    solvers = sys.argv[2:] or SOLVERS
+    for result in benchmark(n_frames, solvers=solvers):
+        print(result)
@@ -0,0 +1,111 @@
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+from . import heuristics
+from .detectors import DetectorRegistry
+from .log_processing import read_match
+from .match_detection import detect_match
+
+# Constants of heuristics that a sweep can change, match_detection reads them from heuristics too
+SWEEP_PARAMETERS = ("CONTACT_DISTANCE", "KICK_OFF_CONTACT_DISTANCE", "AGGRESSION_DISTANCE_MARGIN",
+                    "AGGRESSION_DISTANCE_TO_BALL", "MID_SIZE", "FORWARD_OFFSET")
+SWEEP_WORKERS = None  # processes running the sets of parameters, None runs them in this process
+
+# (MatchProcessor, timestamps, lengths) of read_match, in each process of the pool
+_match = None
+
+
+class SweepResult():
+    """Events found with one set of `parameters` and the seconds the detectors took."""
+    def __init__(self, parameters, events, formation, seconds):
+        self.parameters = parameters
+        self.events = events  # to_json of each Message
+        self.counts = Counter(event["event"] for event in events)
+        self.formation = formation
+        self.seconds = seconds
+
+    def __repr__(self):
+        values = " ".join(f"{name}={value}" for name, value in self.parameters.items())
+        counts = " ".join(f"{event}={count}" for event, count in sorted(self.counts.items()))
+        return f"{values}: {len(self.events)} events ({counts}), formation {self.formation}, {self.seconds:.2f}s"
+
+
+def check_parameters(names):
+    for name in names:
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError(f"{name} isn't a parameter of the heuristics, it should be one of {SWEEP_PARAMETERS}")
+
+
+def parameter_grid(**values):
+    """Every combination of the values given for each parameter, e.g.
+    parameter_grid(CONTACT_DISTANCE=[0.15, 0.2], MID_SIZE=[0.3, 0.4]) has 4 sets of parameters."""
+    check_parameters(values)
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in product(*(values[name] for name in names))]
+
+
+def set_parameters(parameters):
+    """Sets the constants of heuristics, returns the values they had."""
+    previous = {name: getattr(heuristics, name) for name in parameters}
+    for name, value in parameters.items():
+        setattr(heuristics, name, value)
+    return previous
+
+
+def _start_worker(match):
+    global _match
+    _match = match
+
+
+def run_parameters(parameters):
+    """Detects the events of the match of this process with `parameters`."""
+    match, timestamps, lengths = _match
+    header = match.header
+    previous = set_parameters(parameters)
+    try:
+        tic = time.perf_counter()
+        events, formation, _ = detect_match(match.entities, header.field, header.goal, timestamps, lengths,
+                                            DetectorRegistry())
+        seconds = time.perf_counter() - tic
+    finally:
+        set_parameters(previous)
+    return SweepResult(parameters, [event.to_json() for event in events], formation, seconds)
+
+
+def sweep(log, grid, workers=SWEEP_WORKERS):
+    """Detects the events of `log` (a file, lines or a TrajectoryCache) with each set of parameters of `grid`.
+    The log is read once, then the sets of parameters are shared by a pool of `workers` processes, each with
+    its own copy of the match. Returns a SweepResult per set of parameters, in the order of `grid`."""
+    for parameters in grid:
+        check_parameters(parameters)
+    match = read_match(log, workers)
+    if not workers or workers < 2:
+        _start_worker(match)
+        return [run_parameters(parameters) for parameters in grid]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(grid)), initializer=_start_worker,
+                             initargs=(match,)) as executor:
+        return list(executor.map(run_parameters, grid))
+
+
+if __name__ == "__main__":
+    # python -m commentator_website_backend.business_logic.threshold_sweep <log> CONTACT_DISTANCE=0.15,0.2 ...
+    # [workers=N]
+    values = {}
+    workers = SWEEP_WORKERS
+    for argument in sys.argv[2:]:
+        name, value = argument.split("=")
+        if name == "workers":
+            workers = int(value)
+        else:
+            values[name] = [float(x) for x in value.split(",")]
+
+    tic = time.time()
+    with open(sys.argv[1], "rb") as log:
+        results = sweep(log, parameter_grid(**values), workers)
+    for result in results:
+        print(result)
+    print(f"{len(results)} sets of parameters in {time.time() - tic:.2f}s")
@@ -0,0 +1,217 @@
+import math
+import numpy as np
+
+INITIAL_CAPACITY = 1024  # frames per track before the first reallocation
+INITIAL_TRACKS = 8
+
+
+class Position():
+    __slots__ = ("x", "y", "z", "timestamp")
+
+    def __init__(self, x, y, z, timestamp):
+        self.x = x
+        self.y = y
+        self.z = z
+
+        self.timestamp = timestamp
+
+    def distance_between(self, position):
+        """Returns the euclidian distance to given position."""
+        return math.sqrt((self.x - position.x)**2 + (self.y - position.y)**2 + (self.z - position.z)**2)
+
+    def __str__(self):
+        return f"{self.timestamp = }, {self.x = }, {self.y = }, {self.z = }"
+
+
+def matrix_to_position(matrix, timestamp):
+    """Position of a decoded (nd ...) node matrix, the translation is in [12:15]."""
+    return Position(float(matrix[-4]), float(matrix[-3]), float(matrix[-2]), timestamp)
+
+
+class TrajectoryStore():
+    """Keeps time, x, y and z of every track (entity body or foot) in structure-of-arrays NumPy buffers.
+    Buffers are (tracks, frames) so that each track is contiguous in time, the frames axis grows by doubling.
+    With `history` set, every track is a ring buffer of the last `history` frames instead, so memory
+    stays constant no matter how long the match is."""
+    def __init__(self, capacity=INITIAL_CAPACITY, history=None):
+        if history is not None:
+            if history < 1:
+                raise ValueError(f"history must be at least 1, got {history}")
+            capacity = history
+        self.history = history
+        self.n_tracks = 0
+        self.lengths = []
+        self.last = []  # last Position of each track, most reads only need that one. None until it's read
+        self.time = np.zeros((INITIAL_TRACKS, capacity))
+        self.x = np.zeros((INITIAL_TRACKS, capacity))
+        self.y = np.zeros((INITIAL_TRACKS, capacity))
+        self.z = np.zeros((INITIAL_TRACKS, capacity))
+
+    def _resize(self, tracks, capacity):
+        for name in ("time", "x", "y", "z"):
+            old = getattr(self, name)
+            new = np.zeros((tracks, capacity))
+            new[:old.shape[0], :old.shape[1]] = old
+            setattr(self, name, new)
+
+    def add_track(self):
+        """Adds an empty track and returns its index."""
+        if self.n_tracks == self.time.shape[0]:
+            self._resize(self.n_tracks + INITIAL_TRACKS, self.time.shape[1])
+        self.n_tracks += 1
+        self.lengths.append(0)
+        self.last.append(None)
+        return self.n_tracks - 1
+
+    def append(self, track, position):
+        n = self.lengths[track]
+        if self.history is not None:
+            i = n % self.history
+        else:
+            i = n
+            if n == self.time.shape[1]:
+                self._resize(self.time.shape[0], 2 * n)
+        self.time[track, i] = position.timestamp
+        self.x[track, i] = position.x
+        self.y[track, i] = position.y
+        self.z[track, i] = position.z
+        self.lengths[track] = n + 1
+        self.last[track] = position
+
+    def carry_forward(self, tracks, timestamp):
+        """Repeats the last position of each given track at `timestamp`.
+        It's a single copy per buffer, the Position record is only built if someone reads it."""
+        tracks = [track for track in tracks if self.lengths[track] > 0]
+        if not tracks:
+            return
+        lengths = np.array([self.lengths[track] for track in tracks])
+        if self.history is not None:
+            new = lengths % self.history
+            old = (lengths - 1) % self.history
+        else:
+            capacity = self.time.shape[1]
+            while lengths.max() >= capacity:
+                capacity *= 2
+            if capacity != self.time.shape[1]:
+                self._resize(self.time.shape[0], capacity)
+            new = lengths
+            old = lengths - 1
+
+        self.time[tracks, new] = timestamp
+        self.x[tracks, new] = self.x[tracks, old]
+        self.y[tracks, new] = self.y[tracks, old]
+        self.z[tracks, new] = self.z[tracks, old]
+        for track in tracks:
+            self.lengths[track] += 1
+            self.last[track] = None
+
+    def latest(self, track):
+        """Last position of the track."""
+        position = self.last[track]
+        if position is None:
+            position = self.get(track, self.size(track) - 1)
+            self.last[track] = position
+        return position
+
+    def latest_xyz(self, tracks):
+        """(len(tracks), 3) array with the last position of each track."""
+        lengths = np.array([self.lengths[track] for track in tracks])
+        columns = lengths - 1 if self.history is None else (lengths - 1) % self.history
+        xyz = np.empty((len(tracks), 3))
+        xyz[:, 0] = self.x[tracks, columns]
+        xyz[:, 1] = self.y[tracks, columns]
+        xyz[:, 2] = self.z[tracks, columns]
+        return xyz
+
+    def recent(self, tracks, n):
+        """Last n times (len(tracks), n) and positions (len(tracks), n, 3) of tracks with the same length,
+        oldest first. Fewer than n if the tracks are shorter, like TrackView[-n:]."""
+        n = min(n, self.size(tracks[0]))
+        lengths = np.array([self.lengths[track] for track in tracks])
+        columns = lengths[:, None] - n + np.arange(n)
+        if self.history is not None:
+            columns %= self.history
+        rows = np.array(tracks)[:, None]
+        xyz = np.empty((len(tracks), n, 3))
+        xyz[:, :, 0] = self.x[rows, columns]
+        xyz[:, :, 1] = self.y[rows, columns]
+        xyz[:, :, 2] = self.z[rows, columns]
+        return self.time[rows, columns], xyz
+
+    def size(self, track):
+        """Number of positions of the track that are still kept."""
+        n = self.lengths[track]
+        return n if self.history is None or n < self.history else self.history
+
+    def slots(self, track, indices):
+        """Buffer columns of the given chronological indices (0 is the oldest position still kept)."""
+        if self.history is None:
+            return indices
+        return (indices + self.lengths[track] - self.size(track)) % self.history
+
+    def view(self, track):
+        return TrackView(self, track)
+
+    def get(self, track, i):
+        if self.history is not None:
+            i = (i + self.lengths[track] - self.size(track)) % self.history
+        return Position(self.x[track, i].item(), self.y[track, i].item(), self.z[track, i].item(),
+                        self.time[track, i].item())
+
+    def nbytes(self):
+        return self.time.nbytes + self.x.nbytes + self.y.nbytes + self.z.nbytes
+
+
+class TrackView():
+    """List-like, read only view over one track of a TrajectoryStore.
+    Indexing returns Position records, times/xs/ys/zs return the underlying arrays."""
+    def __init__(self, store, track):
+        self.store = store
+        self.track = track
+
+    def __len__(self):
+        return self.store.size(self.track)
+
+    def __getitem__(self, key):
+        n = len(self)
+        if isinstance(key, slice):
+            columns = self._columns(key)
+            times = self.store.time[self.track, columns].tolist()
+            xs = self.store.x[self.track, columns].tolist()
+            ys = self.store.y[self.track, columns].tolist()
+            zs = self.store.z[self.track, columns].tolist()
+            return [Position(x, y, z, t) for t, x, y, z in zip(times, xs, ys, zs)]
+        if key == -1 or key == n - 1:
+            if n == 0:
+                raise IndexError("track is empty")
+            return self.store.latest(self.track)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError("track index out of range")
+        return self.store.get(self.track, key)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def _columns(self, key=slice(None)):
+        """Buffer columns of a slice, a plain slice (so numpy returns views) unless the store is a ring buffer."""
+        if self.store.history is None:
+            return slice(*key.indices(len(self)))
+        return self.store.slots(self.track, np.arange(len(self))[key])
+
+    @property
+    def times(self):
+        return self.store.time[self.track, self._columns()]
+
+    @property
+    def xs(self):
+        return self.store.x[self.track, self._columns()]
+
+    @property
+    def ys(self):
+        return self.store.y[self.track, self._columns()]
+
+    @property
+    def zs(self):
+        return self.store.z[self.track, self._columns()]
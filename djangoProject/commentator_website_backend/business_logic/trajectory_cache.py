@@ -0,0 +1,272 @@
+import errno
+import json
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+
+from .frame_decoder import MATRIX_SIZE
+from .log_tokenizer import LogHeader, Frame
+from .scene_graph import SceneSchema
+
+CACHE_VERSION = 2
+CACHE_BATCH_SIZE = 250  # frames given to process_log at once, like FRAME_BATCH_SIZE
+CACHE_ARRAYS = ["timestamps", "play_modes", "changed", "matrices", "first"]
+# The last row of column-major transformation matrices is 0 0 0 1, it's only stored if some matrix has another one
+AFFINE_COLUMNS = [0, 1, 2, 4, 5, 6, 8, 9, 10, 12, 13, 14]
+PROJECTIVE_COLUMNS = [3, 7, 11, 15]
+PROJECTIVE_ROW = np.array([0., 0., 0., 1.])
+FILL_ROWS = 1 << 16  # rows of last matrix rows written at once, when a matrix that isn't affine shows up
+
+
+class ColumnFile():
+    """A .npy file that grows by appending rows. Its header has the number of rows written so far once
+    flush is called, so it can be loaded with np.load (memory-mapped) while it's still being written."""
+    def __init__(self, path, dtype, row_shape=()):
+        self.path = path
+        self.header = {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False,
+                       "shape": (0,) + tuple(row_shape)}
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        self.file = open(path, "wb")
+        np.lib.format.write_array_header_1_0(self.file, self.header)
+        # The header has room for any number of rows, it's written again in place
+        self.data_offset = self.file.tell()
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        assert values.shape[1:] == self.row_shape, f"Rows of {self.path} are {self.row_shape}, not {values.shape[1:]}"
+        self.file.write(values.tobytes())
+        self.rows += len(values)
+
+    def flush(self):
+        end = self.file.tell()
+        self.file.seek(0)
+        self.header["shape"] = (self.rows,) + self.row_shape
+        np.lib.format.write_array_header_1_0(self.file, self.header)
+        assert self.file.tell() == self.data_offset, f"Header of {self.path} doesn't fit in its space"
+        self.file.seek(end)
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class TrajectoryCache():
+    """Columnar copy of everything process_log reads from a log, so a game can be processed again
+    without parsing it.
+
+    A cache is a directory with a meta.json (header, scene schema, node of each column) and one .npy
+    per column, which are memory-mapped when loaded:
+        timestamps (F,)        time of each processed frame
+        play_modes (F,)        play mode of each processed frame
+        changed    (F, N)      nodes (ball, bodies, feet and joints) that changed in each frame
+        matrices   (M, 12)     matrices of the changed nodes, in frame then node order, without their last row
+        projective (M, 4)      last row of those matrices, only if some matrix isn't affine
+        first      (N, 16)     matrices of the first full frame
+
+    While a log is being recorded, each batch is appended to the files of a temporary directory in
+    `directory` (the system one by default), so the matrices of the match are never held in memory.
+    save moves that directory to its place, it should be in the same file system. A cache that isn't
+    saved is removed when it's discarded or garbage collected.
+    If the frames were skipped when they were recorded, `skip` and `skip_flg` say how, like in process_log.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.header = None
+        self.schema = None
+        self.nodes = None  # scene graph node of each column
+        self.first = None
+        self.timestamp = None  # of the first full frame
+        self.skip = 1
+        self.skip_flg = False
+        self.affine = True
+
+        self.path = None  # directory with the columns
+        self.writers = None  # ColumnFile of each column, while it's being recorded
+        self.arrays = None  # memory-mapped columns, and the row in matrices where each frame starts
+        self._cleanup = None
+
+    def start(self, header, schema, nodes, first, timestamp, skip=1, skip_flg=False):
+        """Records the first full frame, `first` has the matrix of every node in `nodes`. `skip` and
+        `skip_flg` are how the frames given to add_batch were skipped."""
+        self.header = header
+        self.schema = schema
+        self.nodes = list(nodes)
+        self.first = np.array(first)
+        self.timestamp = timestamp
+        self.skip = skip if skip_flg else 1
+        self.skip_flg = bool(skip_flg)
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+        self.path = tempfile.mkdtemp(dir=self.directory, prefix="trajectories.tmp")
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+        np.save(os.path.join(self.path, "first.npy"), self.first)
+        self.writers = {
+            "timestamps": ColumnFile(os.path.join(self.path, "timestamps.npy"), np.float64),
+            "play_modes": ColumnFile(os.path.join(self.path, "play_modes.npy"), np.int16),
+            "changed": ColumnFile(os.path.join(self.path, "changed.npy"), bool, (len(self.nodes),)),
+            "matrices": ColumnFile(os.path.join(self.path, "matrices.npy"), np.float64, (len(AFFINE_COLUMNS),)),
+        }
+
+    def add_batch(self, frames, changed, matrices):
+        assert self.writers is not None, "Frames can only be added to a cache that is being recorded"
+        self.arrays = None
+        values = matrices[changed]
+        writers = self.writers
+        writers["timestamps"].append([frame.timestamp for frame in frames])
+        writers["play_modes"].append([frame.play_mode for frame in frames])
+        writers["changed"].append(changed)
+
+        last_rows = values[:, PROJECTIVE_COLUMNS]
+        if self.affine and not np.array_equal(last_rows, np.broadcast_to(PROJECTIVE_ROW, last_rows.shape)):
+            # Every matrix until now was affine
+            self.affine = False
+            writer = writers["projective"] = ColumnFile(os.path.join(self.path, "projective.npy"), np.float64, (4,))
+            for start in range(0, writers["matrices"].rows, FILL_ROWS):
+                writer.append(np.broadcast_to(PROJECTIVE_ROW, (min(FILL_ROWS, writers["matrices"].rows - start), 4)))
+        writers["matrices"].append(values[:, AFFINE_COLUMNS])
+        if not self.affine:
+            writers["projective"].append(last_rows)
+
+    def columns(self):
+        """The memory-mapped columns, and the row in matrices where each frame starts (and the number of rows)."""
+        if self.arrays is None:
+            if self.writers is not None:
+                for writer in self.writers.values():
+                    writer.flush()
+            names = CACHE_ARRAYS[:-1] + ([] if self.affine else ["projective"])
+            arrays = {name: np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r") for name in names}
+            arrays["row_starts"] = np.concatenate([[0], np.cumsum(arrays["changed"].sum(axis=1))])
+            self.arrays = arrays
+        return self.arrays
+
+    def __len__(self):
+        if self.writers is not None:
+            return self.writers["timestamps"].rows
+        return len(self.columns()["timestamps"])
+
+    def first_matrices(self):
+        """node -> matrix of the first full frame."""
+        return dict(zip(self.nodes, self.first))
+
+    def batches(self, skip=1, skip_flg=False, size=CACHE_BATCH_SIZE):
+        """Yields (frames, changed, matrices) like decode_batches, skipping the same frames as batch_frames.
+        The frames of a cache recorded with skipping are already skipped, asking for the same skipping
+        or for none gives them as they are. Raises ValueError if they're asked to be skipped otherwise."""
+        columns = self.columns()
+        n_frames = len(columns["timestamps"])
+        keep = np.ones(n_frames, dtype=bool)
+        if self.skip_flg:
+            if skip_flg and skip != self.skip:
+                raise ValueError(f"The frames of the cache were recorded skipping with {self.skip}, they can't be "
+                                 f"skipped with {skip}")
+        elif skip_flg:
+            keep[::skip] = False
+
+        for start in range(0, n_frames, size):
+            end = min(start + size, n_frames)
+            kept = keep[start:end]
+            if not kept.any():
+                continue
+            changed = np.asarray(columns["changed"][start:end])
+            first_row, last_row = columns["row_starts"][start], columns["row_starts"][end]
+            rows = np.repeat(kept, changed.sum(axis=1))
+
+            values = np.empty((int(rows.sum()), MATRIX_SIZE))
+            values[:, AFFINE_COLUMNS] = columns["matrices"][first_row:last_row][rows]
+            if self.affine:
+                values[:, PROJECTIVE_COLUMNS] = PROJECTIVE_ROW
+            else:
+                values[:, PROJECTIVE_COLUMNS] = columns["projective"][first_row:last_row][rows]
+
+            changed = changed[kept]
+            matrices = np.full(changed.shape + (MATRIX_SIZE,), np.nan)
+            matrices[changed] = values
+            timestamps = columns["timestamps"][start:end][kept]
+            play_modes = columns["play_modes"][start:end][kept]
+            frames = [Frame(float(timestamp), int(play_mode), None)
+                      for timestamp, play_mode in zip(timestamps, play_modes)]
+            yield frames, changed, matrices
+
+    def save(self, path):
+        """Finishes recording and moves the cache to `path`, so `path` is either the whole cache or doesn't
+        exist. Raises OSError if it can't be written, the cache can still be read or saved again then."""
+        assert self.path is not None and self._cleanup.alive, "Only a recorded cache that isn't saved can be saved"
+        if self.writers is not None:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers = None
+        self.arrays = None
+        self._write(self.path)
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        try:
+            os.replace(self.path, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Recorded in another file system, it's copied next to `path` first
+            tmp = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(path) + ".tmp")
+            try:
+                for name in os.listdir(self.path):
+                    shutil.copy(os.path.join(self.path, name), tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            self._cleanup()
+        self._cleanup.detach()
+        self.path = path
+
+    def discard(self):
+        """Removes the files of a cache that is being recorded, or wasn't saved."""
+        if self.writers is not None:
+            for writer in self.writers.values():
+                writer.file.close()
+            self.writers = None
+        self.arrays = None
+        if self._cleanup is not None:
+            self._cleanup()
+
+    def _write(self, path):
+        header = self.header
+        meta = {
+            "version": CACHE_VERSION,
+            "header": {"field": header.field, "goal": header.goal, "replay": header.replay,
+                       "play_modes": header.play_modes, "teams": header.teams},
+            "schema": self.schema.to_json(),
+            "nodes": self.nodes,
+            "parts": [self.schema.parts.get(node) for node in self.nodes],  # (entity, body part) of each column
+            "timestamp": self.timestamp,
+            "affine": self.affine,
+            "skip": self.skip,
+            "skip_flg": self.skip_flg,
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @staticmethod
+    def load(path):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        assert meta["version"] == CACHE_VERSION, f"Trajectory cache version {meta['version']} isn't supported"
+
+        header = meta["header"]
+        cache = TrajectoryCache()
+        cache.header = LogHeader(header["field"], header["goal"], header["replay"], header["play_modes"],
+                                 header["teams"])
+        cache.schema = SceneSchema.from_json(meta["schema"])
+        cache.nodes = meta["nodes"]
+        cache.timestamp = meta["timestamp"]
+        cache.affine = meta["affine"]
+        cache.skip = meta["skip"]
+        cache.skip_flg = meta["skip_flg"]
+        cache.first = np.load(os.path.join(path, "first.npy"))
+        cache.path = path
+        return cache
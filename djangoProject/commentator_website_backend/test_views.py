@@ -0,0 +1,79 @@
+import tempfile
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Game
+
+# These need Django and a database, run them with python manage.py test
+
+
+class GameReprocessTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="owner")
+        self.other = User.objects.create_user("other", password="other")
+        self.game = Game.objects.create(replay_file="replays/game.replay", title="Game", description="",
+                                        user=self.owner, is_public=True, processed_data={}, league="",
+                                        year=2022, round="", match_group="")
+        self.client = APIClient()
+
+    def reprocess(self, game_id):
+        return self.client.post(f"/reprocess/{game_id}")
+
+    def test_unknown_game_is_not_found(self):
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.reprocess(uuid.uuid4()).status_code, 404)
+
+    def test_malformed_id_is_not_found(self):
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.reprocess("not-a-uuid").status_code, 404)
+
+    def test_anonymous_is_forbidden(self):
+        self.assertEqual(self.reprocess(self.game.id).status_code, 403)
+
+    def test_other_user_is_forbidden(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.reprocess(self.game.id).status_code, 403)
+
+    def test_owner_reprocesses_from_the_cache(self):
+        self.client.force_authenticate(self.owner)
+        with tempfile.TemporaryDirectory() as path, \
+                mock.patch("commentator_website_backend.views.trajectory_cache_path", return_value=path), \
+                mock.patch("commentator_website_backend.views.TrajectoryCache.load") as load, \
+                mock.patch("commentator_website_backend.views.process_log",
+                           return_value=([], {}, ["10:1:0"], [], ["Left", "Right"], None)) as process:
+            response = self.reprocess(self.game.id)
+        self.assertEqual(response.status_code, 200)
+        process.assert_called_once_with(load.return_value)
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.processed_data["form"], ["10:1:0"])
+        self.assertEqual(self.game.processed_data["teams"], ["Left", "Right"])
+
+
+class FileUploadTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user", password="user")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self):
+        return self.client.post("/file_upload/", {
+            "logFile": SimpleUploadedFile("match.log", b""), "title": "Game", "description": "",
+            "isPublic": "Public", "league": "", "year": "2022", "round": "", "matchGroup": "", "has_replay": "true"})
+
+    def test_failed_processing_discards_the_cache(self):
+        for error in (AssertionError, ValueError, OSError):
+            with self.subTest(error=error.__name__), \
+                    mock.patch("commentator_website_backend.views.TrajectoryCache") as cache, \
+                    mock.patch("commentator_website_backend.views.process_log", side_effect=error):
+                if error is AssertionError:
+                    self.assertEqual(self.upload().json(), {"error": "Processing Failed"})
+                else:
+                    with self.assertRaises(error):
+                        self.upload()
+                cache.return_value.discard.assert_called()
+                cache.return_value.save.assert_not_called()
@@ -1,3 +1,1270 @@
-from django.test import TestCase
+import bz2
+import gzip
+import hashlib
+import io
+import json
+import logging
+import lzma
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+from collections import Counter
+from unittest import TestCase, mock
 
-# Create your tests here.
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from .business_logic import body2thig, body2thigh_analytic, global_var, heuristics, parser_benchmark, thigh_benchmark
+from .business_logic.aggression import AggressionTracker
+from .business_logic.analytics import analytics_to_json, get_analytics
+from .business_logic.checkpoint import Checkpoint
+from .business_logic.detectors import DetectorRegistry
+from .business_logic.geometry import FrameGeometry
+from .business_logic.joint_angles import euler_angles
+from .business_logic.live import LiveMatch
+from .business_logic.frame_decoder import (count_before, decode_frames, decode_lines, decode_matrices, decode_matrix,
+                                          decode_rows, pack_equal, set_bits, MATRIX_SIZE)
+from .business_logic.entities import Ball, Player, POSITIONS_SIZE, get_euler_angles, get_quaternion, get_quaternions
+from .business_logic.event_stream import stream_events, EVENT, FORMATION, STATS
+from .business_logic.log_index import build_index, LogIndex
+from .business_logic.log_processing import process_log, read_match, REPLAY_PREFIX1, REPLAY_PREFIX2
+from .business_logic.log_tokenizer import tokenize_log, LogHeader, Frame
+from .business_logic.match_detection import Intervals
+from .business_logic.message import Goal, Kick_Off
+from .business_logic.scene_graph import build_schema, get_schema
+from .business_logic.sharded_detection import process_log_sharded, shard_rows
+from .business_logic.threshold_sweep import parameter_grid, set_parameters, sweep
+from .business_logic.trajectory import Position, TrajectoryStore, INITIAL_TRACKS
+from .business_logic.trajectory_cache import TrajectoryCache
+
+# The business logic doesn't need Django, these tests also run with
+# python -m unittest commentator_website_backend.tests (from djangoProject)
+
+
+FIXTURE_FRAMES = 800
+FIXTURE_SEED = 36  # a match with passes, dribbles, intersections, aggressions, shots, defenses, a corner and a goal
+
+JOINTS = ["head", "rupperarm", "rlowerarm", "lupperarm", "llowerarm", "rthigh", "rshank", "rfoot", "lthigh", "lshank",
+          "lfoot"]
+PLAY_MODES = "BeforeKickOff KickOff_Left KickOff_Right PlayOn KickIn_Left KickIn_Right corner_kick_left " \
+             "corner_kick_right goal_kick_left goal_kick_right offside_left offside_right GameOver Goal_Left Goal_Right " \
+             "free_kick_left free_kick_right direct_free_kick_left direct_free_kick_right pass_left pass_right"
+JOINT_OFFSETS = {"head": (0, 0, 0.2), "rupperarm": (0, -0.1, 0.1), "rlowerarm": (0.05, -0.1, 0.05),
+                 "lupperarm": (0, 0.1, 0.1), "llowerarm": (0.05, 0.1, 0.05), "rthigh": (0, -0.05, -0.1),
+                 "rshank": (0, -0.05, -0.2), "rfoot": (0.03, -0.05, -0.3), "lthigh": (0, 0.05, -0.1),
+                 "lshank": (0, 0.05, -0.2), "lfoot": (0.03, 0.05, -0.3)}
+FIELD_LENGTH = 12  # a small field, so there are shots and goals in a short log
+FIELD_WIDTH = 8
+IDENTITY = "1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1"
+
+
+def matrix(x, y, z, yaw=0.0):
+    c, s = math.cos(yaw), math.sin(yaw)
+    return " ".join(f"{v:.4g}" for v in (c, s, 0, 0, -s, c, 0, 0, 0, 0, 1, 0, x, y, z, 1))
+
+
+def joint_matrix(player, joint):
+    ox, oy, oz = JOINT_OFFSETS[joint]
+    c, s = math.cos(player["yaw"]), math.sin(player["yaw"])
+    return matrix(player["x"] + c*ox - s*oy, player["y"] + s*ox + c*oy, 0.35 + oz, player["yaw"])
+
+
+def full_scene(ball, players, team_materials=False):
+    nodes = [f"(nd TRF (SLT {IDENTITY}) (nd Light (setDiffuse 1 1 1 1)))",
+             f"(nd TRF (SLT {matrix(*ball)}) (nd StaticMesh (load models/soccerball.obj) (sSc 0.042 0.042 0.042)"
+             f"(resetMaterials soccerball_rcs-soccerball.png)))"]
+    for player in players:
+        materials = "matTeam matTeam" if team_materials else f"matNum{player['num']} mat{player['side']}"
+        node = f"(nd TRF (SLT {matrix(player['x'], player['y'], 0.35, player['yaw'])}) (nd TRF (SLT {IDENTITY}) " \
+               f"(nd StaticMesh (load models/naobody.obj) (sSc 0.1 0.1 0.1)(resetMaterials {materials} naowhite naoblack)))"
+        for joint in JOINTS:
+            if joint == "head":
+                node += f"(nd TRF (SLT {joint_matrix(player, joint)}) (nd TRF (SLT {IDENTITY}) " \
+                        f"(nd StaticMesh (load models/naohead.obj) (resetMaterials naowhite))))"
+            else:
+                node += f"(nd TRF (SLT {joint_matrix(player, joint)}) (nd StaticMesh (load models/{joint}.obj) " \
+                        f"(resetMaterials naowhite)))"
+        nodes.append(node + ")")
+    return "(" + "".join(nodes) + ")"
+
+
+def delta_scene(ball, players, ball_changed, changed):
+    nodes = ["(nd(nd))", f"(nd (SLT {matrix(*ball)})(nd))" if ball_changed else "(nd(nd))"]
+    for k, player in enumerate(players):
+        if k in changed:
+            node = f"(nd (SLT {matrix(player['x'], player['y'], 0.35, player['yaw'])})(nd(nd))"
+            node += "".join(f"(nd (SLT {joint_matrix(player, joint)}){'(nd(nd))' if joint == 'head' else '(nd)'})"
+                            for joint in JOINTS)
+        else:
+            node = "(nd(nd(nd))" + "".join("(nd(nd(nd)))" if joint == "head" else "(nd(nd))" for joint in JOINTS)
+        nodes.append(node + ")")
+    return "(" + "".join(nodes) + ")"
+
+
+def write_match_log(out, n_frames=FIXTURE_FRAMES, seed=FIXTURE_SEED):
+    """Writes a match in the format of the sparkmonitor logs: the players closest to the ball run after it and
+    kick it towards the goal, the ball goes back to the center a second after leaving the field."""
+    rnd = random.Random(seed)
+    players = [{"num": num, "side": side, "x": sign * rnd.uniform(0.5, FIELD_LENGTH / 2 - 0.5),
+                "y": rnd.uniform(-FIELD_WIDTH / 2 + 0.5, FIELD_WIDTH / 2 - 0.5), "yaw": 0.0 if sign < 0 else math.pi}
+               for side, sign in (("Left", -1), ("Right", 1)) for num in range(1, 12)]
+    ball = [0.0, 0.0, 0.042]
+    out.write(f"((FieldLength {FIELD_LENGTH})(FieldWidth {FIELD_WIDTH})(FieldHeight 40)(GoalWidth 2.1)(GoalDepth 0.6)"
+              f"(GoalHeight 0.8)(BorderSize 0)(FreeKickDistance 2)(WaitBeforeKickOff 30)(AgentRadius 0.4)"
+              f"(BallRadius 0.042)(BallMass 0.026)(RuleGoalPauseTime 3)(RuleKickInPauseTime 1)(RuleHalfTime 300)"
+              f"(half 1)(score_left 0)(score_right 0)(play_modes {PLAY_MODES})(time 0)(play_mode 0))(RSG 0 1)"
+              + full_scene(ball, players, True) + "\n")
+    out.write("((time 0)(play_mode 0)(team_left Alpha)(team_right Beta))(RDS 0 1)"
+              + delta_scene(ball, players, False, ()) + "\n")
+    out.write("((time 0.02)(play_mode 0)(team_left Alpha)(team_right Beta))(RSG 0 1)" + full_scene(ball, players) + "\n")
+
+    velocity = [0.0, 0.0]
+    time = 0.02
+    mode = 0
+    pause = 0
+    for frame in range(n_frames):
+        time = round(time + 0.04, 2)
+        changed = set()
+        if frame == 5:
+            mode = 3
+        moving = abs(velocity[0]) + abs(velocity[1]) > 1e-4
+        if pause > 0:
+            pause -= 1
+            if pause == 0:
+                ball = [0.0, 0.0, 0.042]
+                moving = True
+                mode = 1
+        elif moving:
+            ball[0] += velocity[0]
+            ball[1] += velocity[1]
+            velocity = [v * 0.95 for v in velocity]
+            if abs(velocity[0]) + abs(velocity[1]) < 0.002:
+                velocity = [0.0, 0.0]
+            if abs(ball[0]) > FIELD_LENGTH / 2 or abs(ball[1]) > FIELD_WIDTH / 2:
+                if abs(ball[0]) > FIELD_LENGTH / 2 and abs(ball[1]) < 1.0:
+                    ball = [math.copysign(FIELD_LENGTH / 2 + 0.3, ball[0]), ball[1], 0.3]
+                    mode = 13 if ball[0] < 0 else 14
+                else:
+                    mode = 4
+                velocity = [0.0, 0.0]
+                pause = 30
+        if pause == 0:
+            near = sorted(range(len(players)),
+                          key=lambda k: (players[k]["x"] - ball[0])**2 + (players[k]["y"] - ball[1])**2)[:4]
+            for k in near:
+                player = players[k]
+                dx, dy = ball[0] - player["x"], ball[1] - player["y"]
+                distance = math.hypot(dx, dy)
+                if distance > 0.12:
+                    step = min(0.05, distance - 0.1)
+                    player["x"] += step * dx / distance
+                    player["y"] += step * dy / distance
+                    player["yaw"] = math.atan2(dy, dx)
+                    changed.add(k)
+                elif not moving and rnd.random() < 0.3:
+                    target = FIELD_LENGTH / 2 if player["side"] == "Left" else -FIELD_LENGTH / 2
+                    angle = math.atan2(rnd.uniform(-1.5, 1.5) - ball[1], target - ball[0]) + rnd.uniform(-0.5, 0.5)
+                    speed = rnd.uniform(0.08, 0.3)
+                    velocity = [speed * math.cos(angle), speed * math.sin(angle)]
+                    ball[0] += velocity[0] * 2
+                    ball[1] += velocity[1] * 2
+                    moving = True
+        out.write(f"((time {time})(play_mode {mode})(score_left 0)(score_right 0))(RDS 0 1)"
+                  + delta_scene(ball, players, moving or pause == 29, changed) + "\n")
+
+
+
+fixture_dir = None
+FIXTURE_LOG = None
+
+
+def setUpModule():
+    global fixture_dir, FIXTURE_LOG
+    global_var.createCache()
+    fixture_dir = tempfile.mkdtemp()
+    FIXTURE_LOG = os.path.join(fixture_dir, "match.log")
+    with open(FIXTURE_LOG, "w") as f:
+        write_match_log(f)
+
+
+def fixture_path(name):
+    return os.path.join(fixture_dir, name)
+
+
+def tearDownModule():
+    shutil.rmtree(fixture_dir, ignore_errors=True)
+
+
+def process_fixture(path=None, **kwargs):
+    with open(path or FIXTURE_LOG, "rb") as log:
+        return process_log(log, **kwargs)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedLog(io.BufferedReader):
+    """A log whose run is killed after reading `lines` lines."""
+    def __init__(self, path, lines):
+        super().__init__(io.FileIO(path))
+        self.lines = lines
+
+    def __next__(self):
+        if self.lines == 0:
+            raise Interrupted()
+        self.lines -= 1
+        return super().__next__()
+
+
+def result_json(result):
+    """The events, analytics, formations and teams of a result of process_log, as plain data."""
+    events, analytics, form, form_players, teams, _ = result
+    return [event.to_json() for event in events], analytics_to_json(analytics), form, form_players, teams
+
+
+def digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+class FixtureResultTestCase(TestCase):
+    """Compares other ways of processing the fixture log with a sequential process_log, whose own
+    result is pinned by BaselineResultTest."""
+    reference = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if FixtureResultTestCase.reference is None:
+            FixtureResultTestCase.reference = result_json(process_fixture())
+
+    def assertSameResult(self, result):
+        events, analytics, form, form_players, teams = result_json(result)
+        reference_events, reference_analytics, reference_form, reference_form_players, reference_teams = self.reference
+        self.assertEqual(events, reference_events)
+        self.assertEqual(analytics, reference_analytics)
+        self.assertEqual(form, reference_form)
+        self.assertEqual(form_players, reference_form_players)
+        self.assertEqual(teams, reference_teams)
+
+
+class BaselineResultTest(FixtureResultTestCase):
+    """The result of the fixture log, as the process_log that looped over the log four times gave it."""
+    EVENT_COUNTS = {"short_pass": 59, "intersect": 36, "defense": 36, "goal_shot": 36, "dribble": 30, "aggression": 4,
+                    "goal": 1, "kick_off": 1, "corner": 1, "corner_shot": 1}
+    EVENTS_DIGEST = "dc7a69362a957c8f21b6e422293d434e9df4c7a2"
+    ANALYTICS_DIGEST = "a521f216d944d5c16b39cdeaa793b0b9f5d2fee3"
+
+    def test_events(self):
+        events = self.reference[0]
+        self.assertEqual(Counter(event["event"] for event in events), self.EVENT_COUNTS)
+        self.assertEqual(events[0], {"event": "short_pass", "start": 0.9, "end": 1.3,
+                                     "args": {"from": {"id": "matNum8matRight", "team": True},
+                                              "to": {"id": "matNum11matRight", "team": True}}})
+        goal = [event for event in events if event["event"] == "goal"]
+        self.assertEqual(goal, [{"event": "goal", "start": 15.74, "end": 15.74, "args": {"team": "Left"}}])
+        aggressions = [(event["start"], event["end"]) for event in events if event["event"] == "aggression"]
+        self.assertEqual(aggressions, [(5.94, 11.42), (5.94, 11.58), (5.94, 18.86), (27.66, 28.58)])
+        self.assertEqual(digest(events), self.EVENTS_DIGEST)
+
+    def test_analytics(self):
+        analytics = self.reference[1]
+        self.assertEqual(len(analytics), 117)
+        self.assertEqual(digest({str(timestamp): entry for timestamp, entry in analytics.items()}),
+                         self.ANALYTICS_DIGEST)
+
+    def test_formation(self):
+        _, _, form, form_players, teams = self.reference
+        self.assertEqual(teams, ["Alpha", "Beta"])
+        self.assertEqual(form, ["10:1:0", "1:1:9"])
+        self.assertEqual(Counter(form_players.values()), {0: 11, 1: 2, 2: 9})
+        self.assertEqual(form_players["matNum7matRight"], 1)
+        self.assertEqual(form_players["matNum8matRight"], 0)
+
+
+class ProcessLogTest(FixtureResultTestCase):
+    def test_timings_are_logged(self):
+        with self.assertLogs("commentator_website_backend.business_logic.log_processing", "DEBUG") as logs:
+            process_fixture(adaptive=True)
+        messages = "\n".join(logs.output)
+        self.assertIn("Event detection in:", messages)
+        self.assertIn("Total processing time:", messages)
+        self.assertIn("Detectors ran in", messages)
+
+    def test_reports_are_only_built_for_debug(self):
+        logger = logging.getLogger("commentator_website_backend.business_logic.log_processing")
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        with mock.patch.object(DetectorRegistry, "report") as report:
+            process_fixture()
+        report.assert_not_called()
+
+
+class TokenizerTest(TestCase):
+    def read_fixture(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            return log.readlines()
+
+    def test_header_and_frames(self):
+        frames = tokenize_log(self.read_fixture())
+        header = next(frames)
+        self.assertIsInstance(header, LogHeader)
+        self.assertEqual(header.field, {"length": FIELD_LENGTH, "width": FIELD_WIDTH, "height": 40.0})
+        self.assertEqual(header.goal, {"width": 2.1, "depth": 0.6, "height": 0.8})
+        self.assertEqual(header.play_modes, PLAY_MODES.split(" "))
+        self.assertEqual(header.teams, ["Alpha", "Beta"])
+        self.assertEqual(header.replay["RuleHalfTime"], "300")
+
+        full_frame = next(frames)
+        self.assertTrue(full_frame.full)
+        self.assertEqual(full_frame.timestamp, 0.02)
+        rest = list(frames)
+        self.assertEqual(len(rest), FIXTURE_FRAMES)
+        self.assertTrue(all(isinstance(frame, Frame) and not frame.full for frame in rest))
+        self.assertEqual([frame.timestamp for frame in rest[:3]], [0.06, 0.1, 0.14])
+        self.assertEqual(rest[5].play_mode, 3)
+        self.assertEqual(len({len(frame.nodes) for frame in rest + [full_frame]}), 1)
+
+    def test_text_lines_are_the_same(self):
+        lines = self.read_fixture()
+        binary = list(tokenize_log(lines))[1:]
+        text = list(tokenize_log([line.decode() for line in lines]))[1:]
+        self.assertEqual([(frame.timestamp, frame.play_mode, frame.nodes) for frame in text],
+                         [(frame.timestamp, frame.play_mode, frame.nodes) for frame in binary])
+
+    def test_repeated_timestamps_are_dropped(self):
+        lines = self.read_fixture()
+        repeated = lines[:10] + [lines[9]] + lines[10:20]
+        frames = list(tokenize_log(repeated))[2:]
+        self.assertEqual(len(frames), 17)
+        timestamps = [frame.timestamp for frame in frames]
+        self.assertEqual(timestamps, sorted(set(timestamps)))
+
+    def test_no_full_frame(self):
+        self.assertEqual(list(tokenize_log(self.read_fixture()[:1])), [])
+
+
+def replay_frames(text, prefix1=REPLAY_PREFIX1, prefix2=REPLAY_PREFIX2):
+    """The frames a replay file adds after the prefixes: {timestamp: (play mode, entity lines)}."""
+    with open(prefix1) as f:
+        prefix1 = f.read()
+    with open(prefix2) as f:
+        prefix2 = f.read()
+    assert text.startswith(prefix1)
+    teams_line = text.index("\n", len(prefix1)) + 1
+    assert text.startswith(prefix2, teams_line)
+    frames = {}
+    # prefix2 doesn't end with a new line, the S line of the first frame is on its last line
+    for chunk in re.split(r"^S ", text[teams_line + len(prefix2):], flags=re.M)[1:]:
+        state, *lines = chunk.rstrip("\n").split("\n")
+        timestamp, play_mode = state.split(" ")[:2]
+        frames[timestamp] = (play_mode, lines)
+    return frames
+
+
+def replay_sum(lines):
+    """Sum of the absolute values of the numbers of replay lines. Signed zeros and the 0.01 degree
+    rounding ties of the joint angles move it by 0.01 at most per angle."""
+    total = 0.0
+    for line in lines:
+        for token in line.split(" ")[1:]:
+            try:
+                total += abs(float(token.strip("()")))
+            except ValueError:
+                pass  # flags and the (j of the joints
+    return total
+
+
+def write_replay(**prefixes):
+    """Frames of the replay process_log writes for the fixture log."""
+    cwd = os.getcwd()
+    os.chdir(fixture_dir)  # the replay is written to the working directory
+    try:
+        replayfile = process_fixture(createReplay=True, **prefixes)[5]
+        with open(replayfile.name) as f:
+            return replay_frames(f.read(), **prefixes)
+    finally:
+        os.chdir(cwd)
+
+
+def loop_euler_angles(links, references):
+    """euler_angles as it was computed before, with get_euler_angles and the inverse of each reference."""
+    return np.array([get_euler_angles(link, reference) for link, reference in zip(links, references)])
+
+
+class ReplayTest(TestCase):
+    # Sums of frames of the replay the process_log that looped over the log wrote for the fixture
+    FRAME_SUMS = {"0.1": 675.7, "5.02": 1074.45, "10.02": 1159.16, "15.74": 1425.68, "20.02": 2334.61,
+                  "26.1": 3168.35, "32.02": 3093.98}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.frames = write_replay()
+
+    def test_frames(self):
+        # The old loops also dropped the frame after the full frame, 0.06, and wrote FIXTURE_FRAMES - 1
+        self.assertEqual(len(self.frames), FIXTURE_FRAMES)
+        self.assertEqual(list(self.frames)[:3], ["0.06", "0.1", "0.14"])
+        self.assertEqual({len(lines) for _, lines in self.frames.values()}, {23})
+        self.assertEqual(self.frames["0.1"][0], "BeforeKickOff")
+        self.assertEqual(self.frames["0.26"][0], "PlayOn")
+
+    def test_same_values_as_the_old_replay(self):
+        for timestamp, expected in self.FRAME_SUMS.items():
+            with self.subTest(timestamp):
+                self.assertAlmostEqual(replay_sum(self.frames[timestamp][1]), expected, delta=0.05)
+
+    def test_prefixes_can_be_given(self):
+        prefixes = {"prefix1": fixture_path("prefix1.txt"), "prefix2": fixture_path("prefix2.txt")}
+        for name, path in prefixes.items():
+            with open(path, "w") as f:
+                f.write(f"{name} of the tests\n")
+        self.assertEqual(write_replay(**prefixes), self.frames)
+
+
+class FrameDecoderTest(TestCase):
+    def test_batch_is_the_same_as_each_node(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            frames = tokenize_log(log)
+            next(frames)
+            full_frame = next(frames)
+            batch = [next(frames) for _ in range(50)]
+        indices = [i for i, node in enumerate(full_frame.nodes) if b"(SLT" in node]
+        changed, matrices = decode_frames(batch, indices)
+        self.assertEqual(changed.shape, (len(batch), len(indices)))
+        self.assertEqual(matrices.shape, (len(batch), len(indices), MATRIX_SIZE))
+        self.assertTrue(changed.any() and not changed.all())
+        for frame, frame_changed, frame_matrices in zip(batch, changed, matrices):
+            for i, node_changed, matrix in zip(indices, frame_changed, frame_matrices):
+                self.assertEqual(node_changed, bool(frame.nodes[i]))
+                if node_changed:
+                    np.testing.assert_array_equal(matrix, decode_matrix(frame.nodes[i]))
+                else:
+                    self.assertTrue(np.isnan(matrix).all())
+
+    def test_lines_are_the_same_as_the_split_nodes(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            frames = tokenize_log(log)
+            next(frames)
+            batch = [next(frames) for _ in range(100)]
+        indices = get_schema(batch[0].nodes).tracked_nodes(createReplay=True)
+        changed, matrices = decode_lines([frame.line for frame in batch], indices)
+        expected_changed, expected_matrices = decode_rows([[frame.nodes[i] for i in indices] for frame in batch])
+        self.assertTrue(changed[0].all())  # the full frame
+        np.testing.assert_array_equal(changed, expected_changed)
+        np.testing.assert_array_equal(matrices, expected_matrices)
+
+    def test_parsers_of_the_benchmark_read_the_same(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            baseline, tokenizer = parser_benchmark.benchmark(log, repeat=1)
+        self.assertEqual(tokenizer.frames, baseline.frames)
+        self.assertEqual(tokenizer.changed, baseline.changed)
+        self.assertAlmostEqual(tokenizer.total, baseline.total, places=6)
+
+    def test_nodes_with_other_numbers(self):
+        slt = " ".join(str(v) for v in range(16)).encode()
+        chunks = [b" TRF (SLT " + slt + b") ", b" (SLT 1e-05 " + slt[2:] + b")(nd)",
+                  b" (SLT " + slt + b") (nd StaticMesh (sSc 0.1 0.1 0.1)"]
+        expected = np.array([decode_matrix(chunk) for chunk in chunks])
+        np.testing.assert_array_equal(decode_matrices(chunks), expected)
+        np.testing.assert_array_equal(decode_matrices(chunks[:2]), expected[:2])
+        self.assertEqual(expected[1, 0], 1e-05)
+        self.assertEqual(decode_matrices([]).shape, (0, MATRIX_SIZE))
+
+    def test_only_irregular_nodes_use_the_regex(self):
+        slt = " ".join(str(v) for v in range(16)).encode()
+        chunks = [b" (SLT " + slt + b")", b" (SLT " + slt + b" 16)", b" (SLT 0.5 " + slt[2:] + b")"]
+        expected = np.array([decode_matrix(chunk) for chunk in chunks])
+        with mock.patch("commentator_website_backend.business_logic.frame_decoder.decode_matrix",
+                        side_effect=decode_matrix) as regex:
+            np.testing.assert_array_equal(decode_matrices(chunks), expected)
+        regex.assert_called_once_with(chunks[1])
+
+    def test_lines_with_irregular_matrices(self):
+        slt = " ".join(str(v) for v in range(16)).encode()
+        lines = [b"((time 0.1)(play_mode 2))((nd (SLT " + slt + b"))(nd(nd (SLT " + slt + b" 16)))\n",
+                 b"((time 0.2)(play_mode 2))((nd(nd(nd (SLT 1e-05 " + slt[2:] + b")))\n"]
+        indices = [1, 3]
+        changed, matrices = decode_lines(lines, indices)
+        expected_changed, expected_matrices = decode_rows([[line.split(b"(nd")[i] for i in indices] for line in lines])
+        np.testing.assert_array_equal(changed, expected_changed)
+        np.testing.assert_array_equal(matrices, expected_matrices)
+
+    def test_packed_masks(self):
+        mask = np.random.default_rng(0).random(640) < 0.05
+        chars = np.where(mask, ord("S"), ord("n")).astype(np.uint8)
+        words = pack_equal(chars, ord("S"), np.empty(len(chars), dtype=bool))
+        np.testing.assert_array_equal(set_bits(words), np.flatnonzero(mask))
+        positions = np.array([0, 1, 63, 64, 65, 300, 639])
+        np.testing.assert_array_equal(count_before(words, positions), [mask[:p].sum() for p in positions])
+        self.assertEqual(len(set_bits(np.zeros(3, dtype=np.uint64))), 0)
+
+
+class TrajectoryStoreTest(TestCase):
+    def fill(self, store, n_frames=3000):
+        """Appends to and carries forward more tracks of the store than it starts with, returns the Positions
+        each one should have. Half of the tracks are carried forward in every frame, like the entities that
+        didn't move."""
+        rnd = random.Random(0)
+        tracks = [store.add_track() for _ in range(INITIAL_TRACKS + 1)]
+        expected = [[] for _ in tracks]
+        for frame in range(n_frames):
+            timestamp = frame * 0.04
+            moved = [track for track in tracks if rnd.random() < 0.5 or frame == 0]
+            for track in moved:
+                position = Position(rnd.uniform(-15, 15), rnd.uniform(-10, 10), rnd.uniform(0, 1), timestamp)
+                store.append(track, position)
+                expected[track].append(position)
+            still = [track for track in tracks if track not in moved]
+            store.carry_forward(still, timestamp)
+            for track in still:
+                last = expected[track][-1]
+                expected[track].append(Position(last.x, last.y, last.z, timestamp))
+        return tracks, expected
+
+    def assertSameTrack(self, view, positions):
+        self.assertEqual(len(view), len(positions))
+        self.assertEqual([(p.x, p.y, p.z, p.timestamp) for p in view],
+                         [(p.x, p.y, p.z, p.timestamp) for p in positions])
+        self.assertEqual(view[-1].timestamp, positions[-1].timestamp)
+        self.assertEqual(view[0].x, positions[0].x)
+        self.assertEqual([p.x for p in view[-POSITIONS_SIZE:]], [p.x for p in positions[-POSITIONS_SIZE:]])
+        np.testing.assert_array_equal(view.xs, [p.x for p in positions])
+        np.testing.assert_array_equal(view.times, [p.timestamp for p in positions])
+
+    def test_tracks_grow(self):
+        store = TrajectoryStore(capacity=16)
+        tracks, expected = self.fill(store)
+        for track in tracks:
+            self.assertSameTrack(store.view(track), expected[track])
+
+    def test_history_keeps_the_last_frames(self):
+        store = TrajectoryStore(history=100)
+        tracks, expected = self.fill(store)
+        self.assertEqual(store.time.shape[1], 100)
+        for track in tracks:
+            self.assertSameTrack(store.view(track), expected[track][-100:])
+            self.assertEqual(store.lengths[track], len(expected[track]))
+
+    def test_latest_is_built_when_read(self):
+        for history in (None, 2):
+            with self.subTest(history=history):
+                store = TrajectoryStore(capacity=2, history=history)
+                track, empty = store.add_track(), store.add_track()
+                position = Position(1.0, 2.0, 3.0, 0.0)
+                store.append(track, position)
+                self.assertIs(store.view(track)[-1], position)
+
+                store.carry_forward([track, empty], 0.04)  # an empty track has nothing to repeat
+                store.carry_forward([track, empty], 0.08)
+                self.assertEqual(store.lengths, [3, 0])
+                self.assertIsNone(store.last[track])
+                latest = store.view(track)[-1]
+                self.assertEqual((latest.x, latest.y, latest.z, latest.timestamp), (1.0, 2.0, 3.0, 0.08))
+                self.assertIs(store.latest(track), latest)
+                self.assertEqual(store.view(track).times.tolist(), [0.0, 0.04, 0.08][-store.size(track):])
+
+    def test_history_must_keep_a_frame(self):
+        with self.assertRaises(ValueError):
+            TrajectoryStore(history=0)
+
+
+class HistoryTest(FixtureResultTestCase):
+    def test_bounded_history_is_the_same(self):
+        self.assertSameResult(process_fixture(history=POSITIONS_SIZE))
+        self.assertSameResult(process_fixture(history=250))
+
+    def test_too_short_history(self):
+        with self.assertRaises(ValueError):
+            process_fixture(history=POSITIONS_SIZE - 1)
+        with self.assertRaises(ValueError):
+            process_fixture(history=250, batch=True)
+
+
+class SceneSchemaTest(TestCase):
+    def read_full_frame(self, seed=FIXTURE_SEED):
+        log = io.StringIO()
+        write_match_log(log, n_frames=10, seed=seed)
+        frames = tokenize_log(log.getvalue().splitlines(keepends=True))
+        return next(frames), next(frames)
+
+    def test_schema_of_the_full_frame(self):
+        _, full_frame = self.read_full_frame()
+        nodes = full_frame.nodes
+        schema = build_schema(nodes)
+        self.assertIn(b"soccerball.obj", nodes[schema.ball_index])
+        self.assertEqual(schema.ball, schema.ball_index - 1)
+        self.assertEqual([player.id for player in schema.players],
+                         [f"matNum{num}mat{side}" for side in ("Left", "Right") for num in range(1, 12)])
+        for k, player in enumerate(schema.players):
+            self.assertIn(b"naobody", nodes[player.index])
+            self.assertEqual(player.body, player.index - 2)
+            self.assertEqual(player.isTeamRight, k >= 11)
+            self.assertFalse(player.has_extra_foot)
+            self.assertEqual(list(player.joints), JOINTS)
+            for name, node in player.joints.items():
+                self.assertIn(b"(SLT", nodes[node])
+                self.assertIn(b"naohead" if name == "head" else name.encode() + b".obj",
+                              nodes[node + (2 if name == "head" else 1)])
+                self.assertEqual(schema.parts[node], (k + 1, name))
+            self.assertEqual(schema.parts[player.body], (k + 1, "body"))
+        self.assertEqual(len(schema.tracked_nodes()), 1 + 22 * 3)
+        self.assertEqual(len(schema.tracked_nodes(createReplay=True)), 1 + 22 * len(JOINTS) + 22)
+
+    def test_schema_is_cached_by_layout(self):
+        _, full_frame = self.read_full_frame()
+        schema = get_schema(full_frame.nodes)
+        self.assertIs(get_schema(full_frame.nodes), schema)
+
+        # Other positions, the same layout
+        _, other_frame = self.read_full_frame(FIXTURE_SEED + 1)
+        self.assertNotEqual(other_frame.nodes, full_frame.nodes)
+        self.assertIs(get_schema(other_frame.nodes), schema)
+
+        renamed = [node.replace(b"matNum11 matRight", b"matNum12 matRight") for node in full_frame.nodes]
+        renamed_schema = get_schema(renamed)
+        self.assertIsNot(renamed_schema, schema)
+        self.assertEqual(renamed_schema.players[-1].id, "matNum12matRight")
+
+
+class LogIndexTest(FixtureResultTestCase):
+    def test_window_from_the_start_is_the_whole_log(self):
+        with build_index(FIXTURE_LOG, keyframe_interval=100) as index:
+            self.assertEqual(len(index), FIXTURE_FRAMES + 1)
+            self.assertSameResult(process_log(list(index.window())))
+        self.assertIsNone(index.log)
+
+    def test_keyframes_have_the_state_of_the_log(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            frames = tokenize_log(log)
+            next(frames)
+            full_frame = next(frames)
+            tracked = get_schema(full_frame.nodes).tracked_nodes(createReplay=True)
+            state = list(full_frame.nodes)
+            states = [list(state)]
+            timestamps = [full_frame.timestamp]
+            for frame in frames:
+                for i in tracked:
+                    if frame.nodes[i]:
+                        state[i] = frame.nodes[i]
+                states.append(list(state))
+                timestamps.append(frame.timestamp)
+
+        with build_index(FIXTURE_LOG, keyframe_interval=100) as index:
+            np.testing.assert_array_equal(index.timestamps, timestamps)
+            self.assertEqual(index.keyframe_rows.tolist(), list(range(0, FIXTURE_FRAMES + 1, 100)))
+            for row, keyframe in zip(index.keyframe_rows, index.keyframes):
+                keyframe_frames = tokenize_log([keyframe])
+                next(keyframe_frames)
+                nodes = next(keyframe_frames).nodes
+                self.assertEqual([nodes[i] for i in tracked], [states[row][i] for i in tracked])
+
+            path = fixture_path("match.index.npz")
+            index.save(path)
+            with LogIndex.load(path, FIXTURE_LOG) as loaded:
+                self.assertEqual(loaded.keyframes, index.keyframes)
+                np.testing.assert_array_equal(loaded.offsets, index.offsets)
+                self.assertEqual(list(loaded.window(10.0, 12.0)), list(index.window(10.0, 12.0)))
+
+    def test_keyframe_rows_give_the_entities_of_the_log(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            match, _, _ = read_match(log)
+        with build_index(FIXTURE_LOG, keyframe_interval=100) as index:
+            self.assertEqual(len(index.keyframes), 9)
+            indexed, _, _ = read_match(index.rows(len(index) - 1, len(index)))
+        for entity, indexed_entity in zip(match.entities, indexed.entities):
+            self.assertEqual(indexed_entity.positions[-1].x, entity.positions[-1].x)
+            self.assertEqual(indexed_entity.positions[-1].y, entity.positions[-1].y)
+
+    def test_keyframes_have_the_schema_of_the_log(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            frames = tokenize_log(log)
+            next(frames)
+            schema = get_schema(next(frames).nodes)
+        with build_index(FIXTURE_LOG, keyframe_interval=100) as index:
+            for keyframe in index.keyframes[1:]:
+                frames = tokenize_log([keyframe])
+                next(frames)
+                self.assertIs(get_schema(next(frames).nodes), schema)
+
+
+class Unseekable():
+    """A stream that can only be read, like an upload being received."""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+class CompressedLogTest(FixtureResultTestCase):
+    COMPRESSIONS = {"gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(FIXTURE_LOG, "rb") as log:
+            data = log.read()
+        for extension, compress in cls.COMPRESSIONS.items():
+            # No extension in the name, the compression is found from the first bytes
+            with compress(fixture_path(f"match_{extension}"), "wb") as f:
+                f.write(data)
+
+    def test_compressed_logs(self):
+        for extension in self.COMPRESSIONS:
+            with self.subTest(extension):
+                self.assertSameResult(process_fixture(fixture_path(f"match_{extension}")))
+
+    def test_unseekable_logs(self):
+        for name in ["match.log", "match_gz"]:
+            with self.subTest(name), open(fixture_path(name), "rb") as log:
+                self.assertSameResult(process_log(Unseekable(log)))
+
+
+class WorkersTest(FixtureResultTestCase):
+    def test_decoding_in_workers_is_the_same(self):
+        self.assertSameResult(process_fixture(workers=2))
+        self.assertSameResult(process_fixture(workers=2, batch=True))
+
+
+class TrajectoryCacheTest(FixtureResultTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cache = TrajectoryCache()
+        cls.recorded = result_json(process_fixture(cache=cls.cache))
+
+    def test_recording_does_not_change_the_result(self):
+        self.assertEqual(self.recorded, self.reference)
+
+    def test_recorded_cache_is_the_same_as_the_log(self):
+        self.assertSameResult(process_log(self.cache))
+        self.assertSameResult(process_log(self.cache, batch=True))
+
+    def test_saved_cache_is_the_same_as_the_log(self):
+        path = fixture_path("match.cache")
+        self.cache.save(path)
+        self.assertFalse([name for name in os.listdir(fixture_dir) if name.startswith("match.cache.tmp")])
+        loaded = TrajectoryCache.load(path)
+        self.assertEqual(len(loaded), len(self.cache))
+        self.assertSameResult(process_log(loaded))
+        self.assertSameResult(process_log(loaded, batch=True))
+
+    def test_recorded_columns_are_on_disk(self):
+        columns = self.cache.columns()
+        self.assertIsInstance(columns["matrices"], np.memmap)
+        self.assertEqual(len(columns["timestamps"]), len(self.cache))
+
+    def test_matrices_that_are_not_affine(self):
+        nodes = self.cache.nodes
+        rnd = np.random.default_rng(0)
+        changed = rnd.random((2, 4, len(nodes))) < 0.5
+        matrices = np.tile(np.eye(4).ravel(), (2, 4, len(nodes), 1))
+        matrices[..., :3] = rnd.random(matrices[..., :3].shape)
+        matrices[1, changed[1]] = rnd.random((changed[1].sum(), MATRIX_SIZE))  # only the second batch isn't affine
+        frames = [[Frame(batch * 4 + i, 3, None) for i in range(4)] for batch in range(2)]
+
+        cache = TrajectoryCache(fixture_dir)
+        cache.start(self.cache.header, self.cache.schema, nodes, self.cache.first, 0.0)
+        for batch in range(2):
+            cache.add_batch(frames[batch], changed[batch], matrices[batch])
+        self.assertFalse(cache.affine)
+        path = fixture_path("projective.cache")
+        cache.save(path)
+        for loaded in [cache, TrajectoryCache.load(path)]:
+            (batch_frames, batch_changed, batch_matrices), = loaded.batches()
+            self.assertEqual([frame.timestamp for frame in batch_frames], list(range(8)))
+            np.testing.assert_array_equal(batch_changed, changed.reshape(8, -1))
+            np.testing.assert_array_equal(batch_matrices[batch_changed], matrices.reshape(8, -1, 16)[batch_changed])
+
+    def test_discarded_cache_leaves_nothing(self):
+        cache = TrajectoryCache(fixture_path("discarded"))
+        process_fixture(cache=cache)
+        self.assertTrue(os.listdir(fixture_path("discarded")))
+        cache.discard()
+        self.assertFalse(os.listdir(fixture_path("discarded")))
+
+    def test_frames_are_not_skipped_twice(self):
+        cache = TrajectoryCache(fixture_dir)
+        skipped = result_json(process_fixture(skip=3, skip_flg=True, cache=cache))
+        path = fixture_path("skipped.cache")
+        cache.save(path)
+        loaded = TrajectoryCache.load(path)
+        self.assertEqual((loaded.skip, loaded.skip_flg), (3, True))
+        for options in ({"skip": 3, "skip_flg": True}, {}):
+            with self.subTest(**options):
+                self.assertEqual(result_json(process_log(loaded, **options)), skipped)
+        with self.assertRaises(ValueError):
+            process_log(loaded, skip=2, skip_flg=True)
+
+    def test_failed_save_leaves_nothing(self):
+        path = fixture_path("failed.cache")
+        with mock.patch.object(TrajectoryCache, "_write", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.cache.save(path)
+        self.assertFalse([name for name in os.listdir(fixture_dir) if name.startswith("failed.cache")])
+
+
+class FrameGeometryTest(TestCase):
+    def test_same_as_the_entities(self):
+        """Against the min() of Ball.get_closest_player and Ball.get_distance_from. Positions are multiples of
+        1/4 around the ball, so many players are exactly as far from it and the ties have to go the same way."""
+        rnd = random.Random(0)
+        offsets = [-0.75, -0.5, -0.25, 0.25, 0.5, 0.75]
+        for _ in range(300):
+            store = TrajectoryStore()
+            ball = Ball("ball", 0, 1, store)
+            teamA = [Player(f"matNum{num}matLeft", num, 2, False, store) for num in range(1, 6)]
+            teamB = [Player(f"matNum{num}matRight", num, 2, True, store) for num in range(1, 6)]
+            bx, by = rnd.randint(-8, 8) / 4, rnd.randint(-8, 8) / 4
+            ball.add_position(Position(bx, by, 0.042, 0.0))
+            for player in teamA + teamB:
+                player.add_position(Position(bx + rnd.choice(offsets), by + rnd.choice(offsets), 0.35, 0.0))
+                player.add_position_rfoot(Position(bx + rnd.choice(offsets), by + rnd.choice(offsets), 0.05, 0.0))
+                player.add_position_lfoot(Position(bx + rnd.choice(offsets), by + rnd.choice(offsets), 0.05, 0.0))
+
+            geometry = FrameGeometry(ball, teamA, teamB)
+            players = teamA + teamB
+            self.assertIs(geometry.closest_player(), ball.get_closest_player(players))
+            self.assertEqual(geometry.closest_per_team(), (ball.get_closest_player(teamA),
+                                                           ball.get_closest_player(teamB)))
+            subset = players[3:8]
+            self.assertIs(geometry.closest_player(subset), ball.get_closest_player(subset))
+            for player in players:
+                self.assertEqual(geometry.distance_from(player), ball.get_distance_from(player))
+            for distance in (0.3, 0.6):
+                self.assertEqual(geometry.in_contact(distance),
+                                 [player for player in players if ball.get_distance_from(player) < distance])
+                self.assertEqual(geometry.in_contact(distance, teamB),
+                                 [player for player in teamB if ball.get_distance_from(player) < distance])
+                self.assertEqual(geometry.any_contact(distance, teamA),
+                                 any(ball.get_distance_from(player) < distance for player in teamA))
+
+
+def loop_aggressions(teamA, teamB, aggressions, geometry, distance_margin, n_positions, distance_to_ball):
+    """The per pair loop of detect_aggressions that AggressionTracker replaced, returns the
+    (player 1, player 2, start, end) of the aggressions it reports."""
+    for entity1 in teamA:
+        key = ""
+        for entity2 in teamB:
+            isNewTimeStamp = True
+            positions1 = entity1.positions[-n_positions:]
+            for i in range(len(positions1)):
+                pos1 = positions1[i]
+                pos2 = entity2.positions[-n_positions:][i]
+                distance = pos1.distance_between(pos2)
+                key = f"{entity1.id}_{entity2.id}"
+                if distance < distance_margin and (geometry.distance_from(entity1) < distance_to_ball
+                                                   or geometry.distance_from(entity2) < distance_to_ball):
+                    if aggressions.get(key) is None:
+                        aggressions[key] = []
+                    if len(aggressions[key]) == 0:
+                        aggressions[key].append({"start": pos1.timestamp, "end": -1, "has_been_printed": False})
+                    else:
+                        past = aggressions[key][-1]
+                        if past["end"] != -1 and past["end"] < pos1.timestamp:
+                            aggressions[key].append({"start": pos1.timestamp, "end": -1, "has_been_printed": False})
+                    if i == 0:
+                        oldest_aggression = aggressions[key][0]
+                        if oldest_aggression["end"] != -1 and oldest_aggression["end"] < pos1.timestamp:
+                            aggressions[key].pop(0)
+                    isNewTimeStamp = False
+                elif not isNewTimeStamp:
+                    isNewTimeStamp = True
+                    aggressions.get(key)[-1]["end"] = pos1.timestamp
+
+    reported = []
+    for k, v in aggressions.items():
+        for aggression in v:
+            if aggression["end"] != -1 and not aggression["has_been_printed"]:
+                id1, id2 = k.split("_")
+                aggression["has_been_printed"] = True
+                reported.append((id1, id2, aggression["start"], aggression["end"]))
+    return reported
+
+
+class AggressionTrackerTest(TestCase):
+    def run_match(self, seed, n_positions, history=None, n_frames=120):
+        """Random walks of 4 against 4 players around a ball, returns the aggressions the tracker and the
+        old loop report in each frame."""
+        rnd = random.Random(seed)
+        store = TrajectoryStore(history=history)
+        ball = Ball("ball", 0, 1, store)
+        teamA = [Player(f"matNum{num}matLeft", num, 2, False, store) for num in range(1, 5)]
+        teamB = [Player(f"matNum{num}matRight", num, 2, True, store) for num in range(1, 5)]
+        coordinates = {entity: [rnd.uniform(-1, 1), rnd.uniform(-1, 1)] for entity in [ball] + teamA + teamB}
+        tracker = AggressionTracker(teamA, teamB)
+        aggressions = {}
+        tracked, looped = [], []
+        for frame in range(n_frames):
+            timestamp = round(frame * 0.04, 2)
+            for entity, xy in coordinates.items():
+                if frame == 0 or rnd.random() < 0.7:
+                    xy[0] = min(max(xy[0] + rnd.uniform(-0.15, 0.15), -1.2), 1.2)
+                    xy[1] = min(max(xy[1] + rnd.uniform(-0.15, 0.15), -1.2), 1.2)
+                entity.add_position(Position(xy[0], xy[1], 0.042 if entity is ball else 0.35, timestamp))
+                if entity is not ball:
+                    entity.add_position_rfoot(Position(xy[0] + 0.05, xy[1], 0.05, timestamp))
+                    entity.add_position_lfoot(Position(xy[0] - 0.05, xy[1], 0.05, timestamp))
+
+            geometry = FrameGeometry(ball, teamA, teamB)
+            ended = tracker.update(store, geometry.near(0.6, teamA), geometry.near(0.6, teamB), 0.3, n_positions)
+            tracked.append([(teamA[a].id, teamB[b].id, start, end) for a, b, start, end in ended])
+            looped.append(loop_aggressions(teamA, teamB, aggressions, geometry, 0.3, n_positions, 0.6))
+        return tracked, looped
+
+    def test_same_aggressions_as_the_loop(self):
+        total = 0
+        for seed in range(14):
+            for n_positions in (1, 2, 3, 4):
+                for history in (None, 8):
+                    with self.subTest(seed=seed, n_positions=n_positions, history=history):
+                        tracked, looped = self.run_match(seed, n_positions, history)
+                        self.assertEqual(tracked, looped)
+                        total += sum(len(frame) for frame in looped)
+        self.assertGreater(total, 300)
+
+
+class BatchDetectionTest(FixtureResultTestCase):
+    def test_fixture_has_every_kind_of_event(self):
+        kinds = {event["event"] for event in self.reference[0]}
+        self.assertTrue({"short_pass", "dribble", "intersect", "aggression", "goal", "kick_off", "corner",
+                         "corner_shot", "goal_shot", "defense"} <= kinds, kinds)
+
+    def test_batch_detection_is_the_same_as_per_frame(self):
+        self.assertSameResult(process_fixture(batch=True))
+
+    def test_thresholds_change_both_detections(self):
+        previous = set_parameters({"CONTACT_DISTANCE": 0.25, "AGGRESSION_DISTANCE_MARGIN": 0.5, "MID_SIZE": 0.4})
+        try:
+            per_frame = result_json(process_fixture())
+            batch = result_json(process_fixture(batch=True))
+        finally:
+            set_parameters(previous)
+        self.assertNotEqual(per_frame[0], self.reference[0])
+        self.assertEqual(batch, per_frame)
+
+    def test_intervals(self):
+        intervals = Intervals(np.array([True, True, False, False, True, False, True]))
+        self.assertEqual((intervals.starts, intervals.ends), ([0, 4, 6], [2, 5, 7]))
+        self.assertEqual([intervals.next(frame) for frame in range(8)], [0, 1, 4, 4, 4, 6, 6, 7])
+        self.assertEqual(Intervals(np.zeros(3, dtype=bool)).next(0), 3)
+
+
+class DetectorRegistryTest(FixtureResultTestCase):
+    # calls and events of each detector on the fixture log, per frame
+    COUNTS = {"detect_kick_off": (801, 1), "detect_corner_shot": (801, 1), "detect_out_goal": (658, 2),
+              "detect_goal_shot": (658, 0), "detect_aggressions": (658, 4), "detect_pass_or_dribble": (658, 125),
+              "detect_defense": (658, 72), "update_formation": (658, 0)}
+    # in batch, only in the frames that can change the state of the events
+    BATCH_COUNTS = {"detect_kick_off": (507, 1), "detect_corner_shot": (507, 1), "detect_out_goal": (435, 2),
+                    "detect_goal_shot": (435, 0), "detect_aggressions": (1, 4), "detect_pass_or_dribble": (435, 125),
+                    "detect_defense": (435, 72), "update_formation": (1, 0)}
+
+    def test_calls_and_events(self):
+        for batch in (False, True):
+            with self.subTest(batch=batch):
+                detectors = DetectorRegistry()
+                self.assertSameResult(process_fixture(batch=batch, detectors=detectors))
+                counts = {name: (stats.calls, stats.events) for name, stats in detectors.stats.items()}
+                self.assertEqual(counts, self.BATCH_COUNTS if batch else self.COUNTS)
+
+    def test_disabled_detector(self):
+        for batch in (False, True):
+            with self.subTest(batch=batch):
+                detectors = DetectorRegistry(disabled=("detect_pass_or_dribble",))
+                events = result_json(process_fixture(batch=batch, detectors=detectors))[0]
+                kinds = Counter(event["event"] for event in events)
+                self.assertEqual(kinds["short_pass"] + kinds["dribble"] + kinds["intersect"], 0)
+                self.assertEqual(kinds["goal"], 1)
+                stats = detectors.stats["detect_pass_or_dribble"]
+                self.assertEqual((stats.calls, stats.events, stats.time), (0, 0, 0.0))
+                self.assertIn("disabled", detectors.report())
+
+    def test_unknown_detector(self):
+        with self.assertRaises(ValueError):
+            DetectorRegistry(disabled=("detect_offside",))
+
+    def test_goal_with_no_owner(self):
+        store = TrajectoryStore()
+        entities = [Ball("ball", 0, 1, store)]
+        entities += [Player(f"matNum{num}matLeft", num, 2, False, store) for num in range(1, 12)]
+        entities += [Player(f"matNum{num}matRight", num, 2, True, store) for num in range(1, 12)]
+        analytics_log = get_analytics([Kick_Off(15.02, None), Goal("Left", 20.0, 20.5)], entities)
+        self.assertEqual(list(analytics_log), [15.02, 20.5])
+        self.assertEqual(analytics_log[20.5]["teams"]["A"].goals, 0)
+
+
+class AdaptiveSamplingTest(FixtureResultTestCase):
+    def test_skipped_frames_do_not_change_the_result(self):
+        for batch in (False, True):
+            with self.subTest(batch=batch):
+                with self.assertLogs("commentator_website_backend.business_logic.log_processing", "DEBUG") as logs:
+                    self.assertSameResult(process_fixture(adaptive=True, batch=batch))
+                sampled, frames = map(int, re.search(r"Detectors ran in (\d+) of (\d+) frames",
+                                                     "\n".join(logs.output)).groups())
+                self.assertEqual(frames, FIXTURE_FRAMES)
+                self.assertLess(sampled, frames)
+
+
+class LiveMatchTest(FixtureResultTestCase):
+    def test_keeps_only_the_last_events_and_stats(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            messages = [line.rstrip(b"\n") for line in log]
+        detected = []
+        live = LiveMatch(messages, on_event=detected.append, max_lag=len(messages), window=5)
+        events = live.run()
+
+        reference_events = self.reference[0]
+        self.assertEqual([event.to_json() for event in detected], reference_events)
+        self.assertEqual([event.to_json() for event in events], reference_events[-5:])
+        self.assertEqual(live.stats, dict(list(self.reference[1].items())[-5:]))
+        self.assertEqual(live.analytics.log, {})
+        self.assertEqual((live.frames, live.lagged), (FIXTURE_FRAMES, 0))
+
+
+class StreamEventsTest(FixtureResultTestCase):
+    def test_same_events_stats_and_formation(self):
+        updates = list(stream_events(FIXTURE_LOG))
+        events, analytics, form, form_players, _ = self.reference
+        self.assertEqual([update.value.to_json() for update in updates if update.kind == EVENT], events)
+        self.assertEqual({update.timestamp: update.value for update in updates if update.kind == STATS}, analytics)
+        formations = [update.value for update in updates if update.kind == FORMATION]
+        self.assertEqual(formations[-1], (form, form_players))
+
+    def test_only_events(self):
+        with open(FIXTURE_LOG, "rb") as log:
+            updates = list(stream_events(log, stats=False, formation=False))
+        self.assertEqual({update.kind for update in updates}, {EVENT})
+        self.assertEqual([update.value.to_json() for update in updates], self.reference[0])
+
+    def test_closing_stops_the_stream(self):
+        updates = stream_events(FIXTURE_LOG)
+        next(updates)
+        updates.close()
+        self.assertEqual(list(updates), [])
+
+
+class CheckpointTest(FixtureResultTestCase):
+    def interrupted_run(self, path, lines, log=None):
+        with InterruptedLog(log or FIXTURE_LOG, lines) as interrupted:
+            with self.assertRaises(Interrupted):
+                process_log(interrupted, checkpoint=path, checkpoint_every=200)
+
+    def test_resumed_run_is_the_same(self):
+        path = fixture_path("resume.checkpoint")
+        self.interrupted_run(path, 500)
+        self.assertGreater(Checkpoint.load(path).index, 200)
+        self.assertSameResult(process_fixture(checkpoint=path, checkpoint_every=200))
+        self.assertFalse(os.path.exists(path))
+
+    def test_checkpoint_of_another_log_is_discarded(self):
+        path = fixture_path("other.checkpoint")
+        other_log = fixture_path("other.log")
+        with open(other_log, "w") as f:
+            write_match_log(f, seed=FIXTURE_SEED + 1)
+        self.interrupted_run(path, 500, other_log)
+        self.assertSameResult(process_fixture(checkpoint=path, checkpoint_every=200))
+
+    def test_unsupported_options(self):
+        path = fixture_path("unsupported.checkpoint")
+        for options in ({"batch": True}, {"createReplay": True}, {"cache": TrajectoryCache()}):
+            with self.subTest(options=list(options)):
+                with self.assertRaises(ValueError):
+                    process_fixture(checkpoint=path, **options)
+
+
+class ThresholdSweepTest(FixtureResultTestCase):
+    def test_sweep_is_the_same_as_process_log(self):
+        grid = parameter_grid(CONTACT_DISTANCE=[heuristics.CONTACT_DISTANCE, 0.25], MID_SIZE=[heuristics.MID_SIZE])
+        with open(FIXTURE_LOG, "rb") as log:
+            results = sweep(log, grid, workers=None)
+        with open(FIXTURE_LOG, "rb") as log:
+            pooled = sweep(log, grid, workers=2)
+
+        events, _, form, _, _ = self.reference
+        self.assertEqual([result.parameters for result in results], grid)
+        self.assertEqual(results[0].events, events)
+        self.assertEqual(results[0].formation, form)
+        self.assertNotEqual(results[1].events, events)
+        for result, pooled_result in zip(results, pooled):
+            self.assertEqual(pooled_result.events, result.events)
+            self.assertEqual(pooled_result.formation, result.formation)
+
+        previous = set_parameters(grid[1])
+        try:
+            self.assertEqual(results[1].events, result_json(process_fixture(batch=True))[0])
+        finally:
+            set_parameters(previous)
+        self.assertEqual(heuristics.CONTACT_DISTANCE, grid[0]["CONTACT_DISTANCE"])
+
+    def test_only_heuristics_parameters(self):
+        with self.assertRaises(ValueError):
+            parameter_grid(FIELD_LENGTH=[1.0])
+
+
+class ShardedDetectionTest(FixtureResultTestCase):
+    def test_shards_are_the_same_as_the_whole_log(self):
+        with build_index(FIXTURE_LOG, keyframe_interval=100) as index:
+            self.assertGreater(len(shard_rows(index.play_modes, 4)), 1)
+            for workers in (None, 2):
+                with self.subTest(workers=workers):
+                    with self.assertLogs("commentator_website_backend.business_logic.sharded_detection",
+                                         "DEBUG") as logs:
+                        self.assertSameResult(process_log_sharded(FIXTURE_LOG, workers, index=index))
+                    self.assertIn("Shards decoded again: 0", "\n".join(logs.output))
+
+    def test_without_an_index(self):
+        self.assertSameResult(process_log_sharded(FIXTURE_LOG, workers=None))
+
+
+def old_quaternion(arr):
+    """get_quaternion as it was before the batched version, one matrix at a time."""
+    r = np.array(arr).reshape(4, 4).T
+    u1 = r[1, 0:3] / np.linalg.norm(r[1, 0:3])
+    u2 = r[2, 0:3] / np.linalg.norm(r[2, 0:3])
+    r[0, 0:3] = np.cross(u1, u2)
+    r[1, 0:3] = u1
+    r[2, 0:3] = u2
+    V1 = np.array([[0, -1, 0, 0], [1, 0, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]) @ r
+    q = Rotation.from_matrix(V1[:3, :3]).as_quat()
+    return [-q[3], -q[1], q[0], -q[2]]
+
+
+class QuaternionTest(TestCase):
+    def random_matrices(self, n):
+        """Node matrices as they are in the log, rotations with a translation, read by columns."""
+        rng = np.random.default_rng(0)
+        matrices = np.zeros((n, 4, 4))
+        matrices[:, :3, :3] = Rotation.random(n, random_state=1).as_matrix()
+        matrices[:, :3, 3] = rng.uniform(-10, 10, (n, 3))
+        matrices[:, 3, 3] = 1
+        return [list(m.T.flatten()) for m in matrices]
+
+    def test_batch_is_the_same_as_each_matrix(self):
+        matrices = self.random_matrices(200)
+        quaternions = get_quaternions(matrices)
+        self.assertEqual(quaternions.shape, (200, 4))
+        for arr, quaternion in zip(matrices, quaternions):
+            np.testing.assert_array_equal(get_quaternion(arr), quaternion)
+            # The stacked matrix products can differ from the old ones in the last bit
+            np.testing.assert_allclose(old_quaternion(arr), quaternion, rtol=0, atol=1e-15)
+
+    def test_quaternion_is_computed_when_the_replay_is_written(self):
+        store = TrajectoryStore()
+        ball = Ball("ball", 0, 1, store)
+        arr = self.random_matrices(1)[0]
+        ball.update(arr, 0.0)
+        self.assertIsNone(ball.quartenion)
+        line = ball.to_replay()
+        np.testing.assert_array_equal(ball.quartenion, get_quaternion(arr))
+        ball.update(arr, 0.04)
+        self.assertIsNone(ball.quartenion)
+        self.assertEqual(ball.to_replay(), line)
+
+
+class JointAnglesTest(TestCase):
+    def test_same_as_get_euler_angles(self):
+        rng = np.random.default_rng(0)
+        links = np.zeros((300, 4, 4))
+        references = np.zeros((300, 4, 4))
+        for matrices, seed in ((links, 1), (references, 2)):
+            matrices[:, :3, :3] = Rotation.random(300, random_state=seed).as_matrix()
+            matrices[:, :3, 3] = rng.uniform(-10, 10, (300, 3))
+            matrices[:, 3, 3] = 1
+        links = [list(m.T.flatten()) for m in links]
+        references = [list(m.T.flatten()) for m in references]
+        np.testing.assert_allclose(euler_angles(links, references), loop_euler_angles(links, references),
+                                   rtol=0, atol=1e-9)
+
+    def test_replay_is_the_same_as_one_joint_at_a_time(self):
+        """The transpose and inv() can round an angle to the other side of a 0.01 degree tie, or of 0."""
+        batched = write_replay()
+        with mock.patch("commentator_website_backend.business_logic.joint_angles.euler_angles", loop_euler_angles):
+            looped = write_replay()
+        self.assertEqual(len(batched), FIXTURE_FRAMES)
+        self.assertEqual(list(batched), list(looped))
+        differences = 0
+        for timestamp, (play_mode, lines) in batched.items():
+            self.assertEqual(play_mode, looped[timestamp][0])
+            self.assertEqual(len(lines), len(looped[timestamp][1]))
+            for line, looped_line in zip(lines, looped[timestamp][1]):
+                tokens, looped_tokens = line.split(" "), looped_line.split(" ")
+                self.assertEqual(len(tokens), len(looped_tokens))
+                for token, looped_token in zip(tokens, looped_tokens):
+                    try:
+                        value, looped_value = float(token.strip("()")), float(looped_token.strip("()"))
+                    except ValueError:
+                        self.assertEqual(token, looped_token)
+                        continue
+                    self.assertLessEqual(abs(value - looped_value), 0.01 + 1e-9, (timestamp, line, looped_line))
+                    differences += value != looped_value  # -0.0 == 0.0
+        self.assertLessEqual(differences, 10)  # 6 rounding ties on the fixture
+
+
+class ThighAnglesTest(TestCase):
+    def test_batch_is_the_same_as_each_frame(self):
+        euler = np.random.default_rng(0).uniform(-np.pi, np.pi, (200, 3))
+        for isRight in (True, False):
+            with self.subTest(isRight=isRight):
+                expected = np.array([np.ravel(body2thigh_analytic.get_thighs(e, isRight)) for e in euler])
+                np.testing.assert_array_equal(body2thigh_analytic.get_thighs_batch(euler, isRight), expected)
+        sides = np.arange(len(euler)) % 2 == 0
+        expected = np.array([np.ravel(body2thigh_analytic.get_thighs(e, isRight)) for e, isRight in zip(euler, sides)])
+        np.testing.assert_array_equal(body2thigh_analytic.get_thighs_batch(euler, sides), expected)
+
+    def test_newton_solver(self):
+        results = thigh_benchmark.benchmark(50, solvers=[body2thig.NEWTON])
+        self.assertTrue(results[0].deterministic)
+        self.assertLess(results[0].max_error, 1e-10)
+        self.assertLess(results[0].max_angle_error, 1e-5)
+
+    def test_unknown_solver(self):
+        with self.assertRaises(ValueError):
+            body2thig.get_thighs(np.zeros(3), np.zeros(3), solver="simplex")
+
+
+class AngleTableTest(TestCase):
+    def setUp(self):
+        self.previous = global_var.angle_table
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        global_var.angle_table = self.previous
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_same_values_as_a_dict_of_rounded_angles(self):
+        rng = np.random.default_rng(0)
+        angles = np.concatenate([rng.uniform(-10, 10, 2000),
+                                 np.arange(-31416, 31417, 37) / 10**global_var.PRECISION,  # exact rows
+                                 (np.arange(-3000, 3000, 7) + 0.5) / 10**global_var.PRECISION,  # halfway
+                                 [-np.pi, np.pi, 0.0, -0.0]])
+        for a in angles:
+            key = round((a+np.pi) % (2*np.pi) - np.pi, global_var.PRECISION)
+            self.assertEqual(global_var.cos(a), np.cos(key), a)
+            self.assertEqual(global_var.sin(a), np.sin(key), a)
+            self.assertEqual(global_var.cos(np.array([a])), np.cos(key), a)
+
+    def test_lookup_is_the_same_as_cos_and_sin(self):
+        angles = np.random.default_rng(1).uniform(-4, 4, 1000)
+        cos, sin = global_var.lookup(angles)
+        np.testing.assert_array_equal(cos, [global_var.cos(a) for a in angles])
+        np.testing.assert_array_equal(sin, [global_var.sin(a) for a in angles])
+
+    def test_load_table_saves_and_maps_it(self):
+        path = os.path.join(self.directory, "angles.npy")
+        global_var.load_table(path)
+        self.assertEqual(os.listdir(self.directory), ["angles.npy"])
+        table = global_var.load_table(path)
+        self.assertIsInstance(table, np.memmap)
+        np.testing.assert_array_equal(table, global_var.build_table())
+
+    def test_load_table_removes_its_temporary_file_on_failure(self):
+        path = os.path.join(self.directory, "angles.npy")
+        with mock.patch.object(global_var, "build_table", side_effect=MemoryError):
+            with self.assertRaises(MemoryError):
+                global_var.load_table(path)
+        self.assertEqual(os.listdir(self.directory), [])
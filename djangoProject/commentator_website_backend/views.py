@@ -3,11 +3,17 @@ from django.contrib.auth import authenticate
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.files import File
+from django.conf import settings
 import json
+import logging
+import os
 
 from djangoProject.permissions import IsOwnerOrIsAdmin
 from .business_logic.log_processing import process_log
+from .business_logic.trajectory_cache import TrajectoryCache
+from .business_logic.analytics import analytics_to_json
 from .business_logic.nl_processing import generate_script
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -17,6 +23,23 @@ from .models import Game
 from .serializers import GameSerializer, UserSerializer
 
 NUMBER_OF_GAMES_BY_USER = 19
+TRAJECTORIES_DIR = "trajectories"
+
+logger = logging.getLogger(__name__)
+
+
+def trajectory_cache_path(game_id):
+    return os.path.join(settings.MEDIA_ROOT, TRAJECTORIES_DIR, str(game_id))
+
+
+def build_processed_data(events, analytics, form, form_players, teams):
+    json_response = {"events": [], "form": form, "form_players": form_players, "teams": teams}
+
+    for event in events:
+        json_response["events"].append(event.to_json())
+
+    json_response["stats"] = analytics_to_json(analytics)
+    return json_response
 
 
 @csrf_exempt
@@ -128,40 +151,40 @@ def file_upload(request):
     if len(user_games) >= NUMBER_OF_GAMES_BY_USER:
         return JsonResponse({"error": "Reached number of games by given user."})
 
+    # Recorded next to the saved caches, so saving it only renames its directory
+    cache = TrajectoryCache(os.path.join(settings.MEDIA_ROOT, TRAJECTORIES_DIR)) if getattr(settings, "TRAJECTORY_CACHE", True) else None
     try:
-        events, analytics, form, form_players, teams, rep_file = process_log(log_file, createReplay=not has_replay)
-    except AssertionError:
-        return JsonResponse({"error": "Processing Failed"})
-
-    json_response = {"events": [], "form": form, "form_players": form_players, "teams": teams}
-
-    # if len(events) < 10:
-    #     print("ERROR 3")
-    #     return Response({"error": "Processing Failed"})
-
-    for event in events:
-        json_response["events"].append(event.to_json())
-
-    for timestamp in analytics:
-        for team in analytics[timestamp]["teams"]:
-            analytics[timestamp]["teams"][team] = analytics[timestamp]["teams"][team].to_json()
-        for player in analytics[timestamp]["players"]:
-            analytics[timestamp]["players"][player] = analytics[timestamp]["players"][player].to_json()
-    json_response["stats"] = analytics
-
-    if hasReplay:
-        replay_file = request.FILES['replayFile']
-    else:
-        replay_file = File( open("replayfile.replay", "r"))
-        
-        
-
-
-    game = Game(replay_file=replay_file, title=title, description=description, user=user,
-                is_public=is_public, league=league, year=year, round=roud, match_group=match_group,
-                processed_data=json_response)
-
-    game.save()
+        try:
+            events, analytics, form, form_players, teams, rep_file = process_log(log_file, createReplay=not has_replay, workers=getattr(settings, "PROCESS_LOG_WORKERS", None), cache=cache)
+        except AssertionError:
+            if cache is not None:
+                cache.discard()
+            return JsonResponse({"error": "Processing Failed"})
+
+        json_response = build_processed_data(events, analytics, form, form_players, teams)
+
+        if hasReplay:
+            replay_file = request.FILES['replayFile']
+        else:
+            replay_file = File( open("replayfile.replay", "r"))
+
+        game = Game(replay_file=replay_file, title=title, description=description, user=user,
+                    is_public=is_public, league=league, year=year, round=roud, match_group=match_group,
+                    processed_data=json_response)
+
+        game.save()
+        if cache is not None:
+            try:
+                cache.save(trajectory_cache_path(game.id))
+            except OSError:
+                # The game is stored, it just can't be reprocessed
+                logger.exception("Trajectory cache of game %s not saved", game.id)
+                cache.discard()
+    except BaseException:
+        # The temporary directory of the cache isn't left in MEDIA_ROOT until the cache is collected
+        if cache is not None:
+            cache.discard()
+        raise
 
     if not hasReplay:
         replay_file.close()
@@ -170,3 +193,29 @@ def file_upload(request):
     serializer = GameSerializer(game)
     print("ID", serializer.data['id'])
     return Response({'game_id': serializer.data['id']})
+
+
+@csrf_exempt
+@api_view(['POST'])
+def game_reprocess(request, i):
+    """Detects the events of a game again from its trajectory cache, without the log."""
+    try:
+        game = Game.objects.get(id=i)
+    except (Game.DoesNotExist, ValidationError):  # no game, or not a UUID
+        return JsonResponse({"detail": "Not found."}, status=404)
+    user = request.user
+    if user.is_anonymous or (game.user != user and not user.is_superuser):
+        return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+    path = trajectory_cache_path(game.id)
+    if not os.path.isdir(path):
+        return JsonResponse({"error": "Game has no trajectory cache"})
+
+    try:
+        events, analytics, form, form_players, teams, _ = process_log(TrajectoryCache.load(path))
+    except AssertionError:
+        return JsonResponse({"error": "Processing Failed"})
+
+    game.processed_data = build_processed_data(events, analytics, form, form_players, teams)
+    game.save()
+    return Response({'game_id': str(game.id)})
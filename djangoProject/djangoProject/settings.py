@@ -144,6 +144,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 600000000 # dear god
 
+# Keep a trajectory cache of each uploaded log in MEDIA_ROOT, so the game can be reprocessed without it.
+# It's written to disk while the log is processed
+TRAJECTORY_CACHE = True
+
+# Processes that decode the frames of an uploaded log, for each upload. None decodes them in the web worker
+PROCESS_LOG_WORKERS = None
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -33,6 +33,7 @@ urlpatterns = [
     path('users/register/', views.new_register),
     path('generate_script/<str:i>', views.game_generate_script),
     path('file_upload/', views.file_upload),
+    path('reprocess/<str:i>', views.game_reprocess),
     path('', include(router.urls)),
     path('api-auth/', include('rest_framework.urls')),
 ]